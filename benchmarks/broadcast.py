@@ -0,0 +1,101 @@
+"""Measure the serialization work of one server tick.
+
+Every player has a connection, all acknowledged at the same snapshot,
+and a tenth of the players move between ticks. The players are spread
+out, so clients are only sent the players in their area of interest.
+This is compared with encoding every player for every connection.
+
+Run from the repository root:
+
+    python -m benchmarks.broadcast --players 10 50 200
+"""
+import sys
+import time
+
+from argparse import ArgumentParser, Namespace
+from benchmarks.codec import make_players
+from network import codec
+from server.connection import Connection
+from server.server import Server
+from unittest.mock import Mock
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark the broadcast cache.')
+    parser.add_argument(
+        '--players',
+        type=int,
+        nargs='+',
+        default=[10, 50, 200],
+        help='The number of connected players.',
+    )
+    parser.add_argument(
+        '--ticks',
+        type=int,
+        default=200,
+    )
+    return parser.parse_args(args)
+
+
+def measure(count: int, ticks: int) -> dict:
+    server = Server(host='127.0.0.1', port=5555)
+    players = make_players(count)
+    for player_id, attributes in players.items():
+        server._add_player(player_id, attributes['username'])
+        server._update_player(player_id, attributes)
+        server._add_connection(
+            Connection(player_id, Mock(), server.snapshot_cache)
+        )
+
+    uncached = 0.0
+    uncached_bytes = 0
+    for tick in range(ticks):
+        for player_id in range(0, count, 10):
+            players[player_id]['x'] += 1
+            server._update_player(player_id, players[player_id])
+        server.tick()
+        for connection in server.connections.values():
+            connection.flush()
+            connection.deltas.acknowledge(server.snapshots.seq)
+
+            # What the tick cost before the cache.
+            started = time.perf_counter()
+            uncached_bytes += len(codec.encode_snapshot(
+                server.snapshots.seq,
+                server.snapshots.seq - 1,
+                server.snapshots.get(server.snapshots.seq - 1) or {},
+                server.snapshots.latest
+            ))
+            uncached += time.perf_counter() - started
+
+    sent_bytes = sum(
+        len(call.args[0])
+        for connection in server.connections.values()
+        for call in connection.send.call_args_list
+    )
+    cache = server.snapshot_cache
+    return {
+        'sent KB/tick': sent_bytes / 1024 / ticks,
+        'all KB/tick': uncached_bytes / 1024 / ticks,
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'cached ms/tick': cache.serialize_time * 1000 / ticks,
+        'all ms/tick': uncached * 1000 / ticks,
+    }
+
+
+def main(args: Namespace) -> None:
+    columns = None
+    for count in args.players:
+        result = measure(count, args.ticks)
+        if columns is None:
+            columns = list(result)
+            print(f'{"players":>8}' + ''.join(f'{c:>18}' for c in columns))
+        print(
+            f'{count:>8}'
+            + ''.join(f'{result[column]:>18.2f}' for column in columns)
+        )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
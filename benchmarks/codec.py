@@ -0,0 +1,113 @@
+"""Compare the binary codec against pickling the player attributes.
+
+Reports the bytes per player of a keyframe holding every player and of
+a delta where a tenth of the players moved, and the encode/decode time
+of a keyframe. The bytes a client sends upstream each time, as its
+state or as an input command, are printed first.
+
+Run from the repository root:
+
+    python -m benchmarks.codec --players 1 10 50 200
+"""
+import pickle
+import sys
+import timeit
+
+from argparse import ArgumentParser, Namespace
+from copy import copy
+from enums.base import Network_
+from network import codec
+from network.snapshots import SnapshotHistory
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark the wire codec.')
+    parser.add_argument(
+        '--players',
+        type=int,
+        nargs='+',
+        default=[1, 10, 50, 200],
+        help='The number of players in the snapshot.',
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=2000,
+    )
+    return parser.parse_args(args)
+
+
+def make_players(count: int) -> dict:
+    players = {}
+    for player_id in range(count):
+        attributes = copy(Network_.PLAYER_ATTRIBUTES.value)
+        attributes.update(
+            id=player_id,
+            x=player_id * 10.5 % 320,
+            y=player_id * 3.25 % 380,
+            standing=player_id % 2 == 0,
+            username=f'player_{player_id}',
+        )
+        players[player_id] = attributes
+    return players
+
+
+def _microseconds(statement, repeat: int) -> float:
+    best = min(timeit.repeat(statement, number=repeat, repeat=3))
+    return best / repeat * 1e6
+
+
+def measure(count: int, repeat: int) -> dict:
+    players = make_players(count)
+    baseline = codec.snapshot_fields(players)
+    for player_id in range(0, count, 10):
+        players[player_id]['x'] += 10
+    moved = codec.snapshot_fields(players)
+
+    pickled = pickle.dumps(players)
+    keyframe = codec.encode_snapshot(1, 0, {}, moved)
+    delta = codec.encode_snapshot(2, 1, baseline, moved)
+
+    return {
+        'pickle B/player': len(pickled) / count,
+        'keyframe B/player': len(keyframe) / count,
+        'delta B/player': len(delta) / count,
+        'pickle enc us': _microseconds(
+            lambda: pickle.dumps(players), repeat
+        ),
+        'codec enc us': _microseconds(
+            lambda: codec.encode_snapshot(
+                1, 0, {}, codec.snapshot_fields(players)
+            ),
+            repeat
+        ),
+        'pickle dec us': _microseconds(
+            lambda: pickle.loads(pickled), repeat
+        ),
+        'codec dec us': _microseconds(
+            lambda: codec.decode_snapshot(keyframe, SnapshotHistory()),
+            repeat
+        ),
+    }
+
+
+def main(args: Namespace) -> None:
+    state = codec.encode_state(1, make_players(1)[0])
+    # The commands of three frames at 60 FPS, one send at 20 Hz.
+    keys = codec.encode_input(1, 1, [(codec.LEFT_KEY, 16)] * 3)
+    print(f'upstream state B {len(state)}, input B {len(keys)}')
+
+    columns = None
+    for count in args.players:
+        result = measure(count, args.repeat)
+        if columns is None:
+            columns = list(result)
+            print(f'{"players":>8}' + ''.join(f'{c:>18}' for c in columns))
+        print(
+            f'{count:>8}'
+            + ''.join(f'{result[column]:>18.1f}' for column in columns)
+        )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,136 @@
+"""Measure the bytes saved by compressing snapshots and what it costs.
+
+Every player has a connection which negotiated compression, at each
+zlib level given (0 is no compression at all), and a tenth of the
+players move between ticks, as in `benchmarks.broadcast`. Reported per
+tick are the bytes sent, how they compare with not compressing, the
+time the sender threads spend compressing and the time the clients
+spend decompressing.
+
+Run from the repository root:
+
+    python -m benchmarks.compression --players 10 50 200 --levels 0 1 6 9
+"""
+import sys
+import time
+
+from argparse import ArgumentParser, Namespace
+from functools import partial
+from benchmarks.codec import make_players
+from network import codec
+from network.compression import (
+    COMPRESSION_THRESHOLD, Compressor, Decompressor
+)
+from network.framing import HEADER
+from server.connection import Connection
+from server.server import Server
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark snapshot compression.')
+    parser.add_argument(
+        '--players',
+        type=int,
+        nargs='+',
+        default=[10, 50, 200],
+        help='The number of connected players.',
+    )
+    parser.add_argument(
+        '--levels',
+        type=int,
+        nargs='+',
+        default=[0, 1, 6, 9],
+        help='The zlib levels to compare, 0 for no compression.',
+    )
+    parser.add_argument(
+        '--threshold',
+        type=int,
+        default=COMPRESSION_THRESHOLD,
+        help='Messages smaller than this many bytes are not compressed.',
+    )
+    parser.add_argument(
+        '--ticks',
+        type=int,
+        default=200,
+    )
+    return parser.parse_args(args)
+
+
+def measure(count: int, level: int, threshold: int, ticks: int) -> dict:
+    server = Server(host='127.0.0.1', port=5555)
+    players = make_players(count)
+    sent = {}  # Player id: the message last sent to the player.
+    decompressors = {}
+    for player_id, attributes in players.items():
+        server._add_player(player_id, attributes['username'])
+        server._update_player(player_id, attributes)
+        connection = server._add_connection(
+            Connection(
+                player_id, partial(sent.__setitem__, player_id),
+                server.snapshot_cache
+            )
+        )
+        if level:
+            connection.compressor = Compressor(
+                level=level, threshold=threshold
+            )
+            decompressors[player_id] = Decompressor()
+
+    raw_bytes = 0
+    sent_bytes = 0
+    send_time = 0.0
+    receive_time = 0.0
+    for tick in range(ticks):
+        for player_id in range(0, count, 10):
+            players[player_id]['x'] += 1
+            server._update_player(player_id, players[player_id])
+        server.tick()
+        for connection in server.connections.values():
+            message = connection.outbox.pending
+            if message is None:
+                continue
+            started = time.perf_counter()
+            connection.flush()
+            send_time += time.perf_counter() - started
+
+            data = sent[connection.player_id]
+            raw_bytes += len(message)
+            sent_bytes += len(data)
+            if data is not message:
+                started = time.perf_counter()
+                method, payload = codec.decode_compressed(
+                    data[HEADER.size:]
+                )
+                decompressors[connection.player_id].decompress(payload)
+                receive_time += time.perf_counter() - started
+            connection.deltas.acknowledge(server.snapshots.seq)
+            connection.last_received = time.monotonic()
+
+    return {
+        'raw KB/tick': raw_bytes / 1024 / ticks,
+        'sent KB/tick': sent_bytes / 1024 / ticks,
+        'sent %': sent_bytes * 100 / raw_bytes,
+        'send ms/tick': send_time * 1000 / ticks,
+        'receive ms/tick': receive_time * 1000 / ticks,
+    }
+
+
+def main(args: Namespace) -> None:
+    columns = None
+    for count in args.players:
+        for level in args.levels:
+            result = measure(count, level, args.threshold, args.ticks)
+            if columns is None:
+                columns = list(result)
+                print(
+                    f'{"players":>8}{"level":>6}'
+                    + ''.join(f'{c:>16}' for c in columns)
+                )
+            print(
+                f'{count:>8}{level:>6}'
+                + ''.join(f'{result[column]:>16.2f}' for column in columns)
+            )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,143 @@
+"""Compare drawing the other players as full `Player`s against
+`RemotePlayer`s.
+
+Reports the time to create a player as it joins, the time to update it
+from a snapshot, and the bytes each player holds: its attributes and
+the pixels of its sprites, which the remote players of a colour share.
+
+Run from the repository root, without a window or sound:
+
+    SDL_VIDEODRIVER=dummy SDL_AUDIODRIVER=dummy \
+        python -m benchmarks.remote_players --players 10 100
+"""
+import sys
+import time
+
+import pygame
+
+from argparse import ArgumentParser, Namespace
+from enums.base import Network_
+from game.player import Player
+from game.remote_player import RemotePlayer
+from network import codec
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark the remote players.')
+    parser.add_argument(
+        '--players',
+        type=int,
+        nargs='+',
+        default=[10, 100],
+    )
+    parser.add_argument(
+        '--updates',
+        type=int,
+        default=100,
+        help='Snapshots applied to every player.',
+    )
+    return parser.parse_args(args)
+
+
+def snapshot(count: int, x: int = 0) -> dict:
+    attributes = dict(Network_.PLAYER_ATTRIBUTES.value, username='player')
+    return codec.snapshot_fields({
+        player_id: dict(attributes, x=x + player_id, y=player_id)
+        for player_id in range(count)
+    })
+
+
+def _surfaces(values) -> dict:
+    """The surfaces among values, and the lists and tuples of them, by
+    id."""
+    surfaces = {}
+    for value in values:
+        if isinstance(value, pygame.Surface):
+            surfaces[id(value)] = value
+        elif isinstance(value, (list, tuple)):
+            surfaces.update(_surfaces(value))
+    return surfaces
+
+
+def _pixels(surfaces: dict) -> int:
+    return sum(
+        surface.get_width() * surface.get_height() * surface.get_bytesize()
+        for surface in surfaces.values()
+    )
+
+
+def _set_attributes(player: Player, attributes: dict) -> None:
+    """How a full Player was updated from a snapshot."""
+    for attribute, value in attributes.items():
+        if attribute == '_current_step':
+            setattr(player, 'walk_count', value)
+        else:
+            setattr(player, attribute, value)
+
+
+def measure(count: int, args: Namespace) -> dict:
+    players = snapshot(count)
+    started = time.perf_counter()
+    full = [Player((0, 0), player_id) for player_id in players]
+    full_create = time.perf_counter() - started
+
+    started = time.perf_counter()
+    remote = [
+        RemotePlayer(player_id, fields)
+        for player_id, fields in players.items()
+    ]
+    remote_create = time.perf_counter() - started
+
+    full_update = remote_update = 0.0
+    for update in range(args.updates):
+        moved = snapshot(count, update)
+        started = time.perf_counter()
+        for player in full:
+            _set_attributes(player, codec.fields_to_attributes(
+                player.id, moved[player.id]
+            ))
+        stepped = time.perf_counter()
+        for player in remote:
+            player.update(moved[player.id])
+        full_update += stepped - started
+        remote_update += time.perf_counter() - stepped
+
+    # The sprites of the remote players are shared by colour.
+    shared = {}
+    for player in remote:
+        shared.update(_surfaces(player.sprites.frames.values()))
+    return {
+        'Player create us': full_create / count * 1e6,
+        'Remote create us': remote_create / count * 1e6,
+        'Player update us': full_update / args.updates / count * 1e6,
+        'Remote update us': remote_update / args.updates / count * 1e6,
+        'Player B': sum(
+            sys.getsizeof(player) + sys.getsizeof(vars(player))
+            + _pixels(_surfaces(vars(player).values()))
+            for player in full
+        ) / count,
+        'Remote B': (
+            sum(sys.getsizeof(player) for player in remote)
+            + _pixels(shared)
+        ) / count,
+    }
+
+
+def main(args: Namespace) -> None:
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    pygame.mixer.init()
+    columns = None
+    for count in args.players:
+        result = measure(count, args)
+        if columns is None:
+            columns = list(result)
+            print(f'{"players":>8}' + ''.join(f'{c:>18}' for c in columns))
+        print(
+            f'{count:>8}'
+            + ''.join(f'{result[column]:>18.1f}' for column in columns)
+        )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
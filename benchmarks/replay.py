@@ -0,0 +1,103 @@
+"""Replay a recorded session into a server, without sockets.
+
+Record the traffic of a server with ``start_server.py --record DIR``,
+then replay a room's log at its recorded pace, faster, or as fast as
+possible to measure the cost of the server's message handling and tick:
+
+    python -m benchmarks.replay recordings/lobby-20240101-120000.rec
+    python -m benchmarks.replay <log> --speed 10
+    python -m benchmarks.replay <log> --speed max --profile
+
+The snapshots the server sends are compared with the recorded ones.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from server.replay import Replayer
+from server.server import Server
+from server.simulation import Simulation, Terrain
+from typing import Optional
+
+
+def speed(value: str) -> Optional[float]:
+    if value == 'max':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ArgumentTypeError('The speed must be a number or "max".')
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Replay a recorded session.')
+    parser.add_argument(
+        'log',
+        type=str,
+        help='The recording of a room, from start_server.py --record.',
+    )
+    parser.add_argument(
+        '--speed',
+        type=speed,
+        default=1.0,
+        help='How many times faster than recorded, or "max".',
+    )
+    parser.add_argument(
+        '--map',
+        type=str,
+        default=None,
+        help='The map of the room, by default the start of the log name.',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print the functions the replay spent the most time in.',
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='127.0.0.1',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=5555,
+        help='Only given to the server, nothing listens on it.',
+    )
+    return parser.parse_args(args)
+
+
+def main(args: Namespace) -> None:
+    # The players sending inputs are moved on the room's map.
+    map_name = args.map or os.path.basename(args.log).rsplit('-', 2)[0]
+    server = Server(
+        host=args.host,
+        port=args.port,
+        simulation=Simulation(Terrain.load(map_name))
+    )
+    replayer = Replayer(server, args.speed)
+    profile = cProfile.Profile() if args.profile else None
+
+    started = time.perf_counter()
+    if profile is not None:
+        profile.enable()
+    replayer.replay(args.log)
+    if profile is not None:
+        profile.disable()
+    elapsed = time.perf_counter() - started
+
+    stats = replayer.stats
+    print(f'{"elapsed s":<12}{elapsed:>12.2f}')
+    print(f'{"records/s":<12}{stats["records"] / elapsed:>12.0f}')
+    for name, value in stats.items():
+        print(f'{name:<12}{value:>12.2f}')
+
+    if profile is not None:
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
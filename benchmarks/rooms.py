@@ -0,0 +1,144 @@
+"""Load test the room sharding across worker processes.
+
+For every worker count a fresh server is started with
+``start_server.py --workers N`` and the players are spread evenly over
+the rooms (one per map in maps/). The number of players is doubled
+until the p99 round trip time goes over the budget, and the largest
+number of players served within it is reported. Each room's players
+are simulated in their own process so the load generator is not the
+bottleneck.
+
+With enough rooms, the capacity should grow with the worker count up
+to the number of cores. Run from the repository root (Linux only):
+
+    python -m benchmarks.rooms --workers 1 2 4
+"""
+import asyncio
+import os
+import sys
+
+from argparse import ArgumentParser, Namespace
+from benchmarks.server_modes import (
+    MAX_CONNECTIONS, SimulatedClient, start_server
+)
+from bots.stats import percentile
+from multiprocessing import Pool
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Load test the room workers.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        nargs='+',
+        default=sorted({1, 2, os.cpu_count() or 1}),
+        help='The worker counts to run the server with.',
+    )
+    parser.add_argument(
+        '--rooms',
+        type=str,
+        nargs='+',
+        default=sorted(
+            name[:-len('.pkl')] for name in os.listdir('maps')
+            if name.endswith('.pkl')
+        ),
+    )
+    parser.add_argument(
+        '--start',
+        type=int,
+        default=20,
+        help='Players per room in the first round.',
+    )
+    parser.add_argument(
+        '--max-players',
+        type=int,
+        default=5000,
+    )
+    parser.add_argument(
+        '--budget-ms',
+        type=float,
+        default=150,
+        help='The p99 round trip time the players must be served within.',
+    )
+    parser.add_argument(
+        '--rounds',
+        type=int,
+        default=10,
+        help='Round trips made by every player.',
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='127.0.0.1',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=5700,
+        help='First port to use, every run gets its own port.',
+    )
+    return parser.parse_args(args)
+
+
+async def _play(
+    host: str, port: int, room: str, count: int, rounds: int
+) -> list:
+    clients = [
+        SimulatedClient(host, port, f'{room}{i}', room) for i in range(count)
+    ]
+    limit = asyncio.Semaphore(MAX_CONNECTIONS)
+    await asyncio.gather(*(client.connect(limit) for client in clients))
+    await asyncio.gather(*(client.play(rounds) for client in clients))
+    for client in clients:
+        client.close()
+
+    return [rtt for client in clients for rtt in client.rtts]
+
+
+def play_room(job: tuple) -> list:
+    """Simulate the players of one room, in a pool process."""
+    return asyncio.run(_play(*job))
+
+
+def p99_rtt_ms(args: Namespace, port: int, per_room: int) -> float:
+    jobs = [
+        (args.host, port, room, per_room, args.rounds) for room in args.rooms
+    ]
+    with Pool(len(jobs)) as pool:
+        rtts = [rtt for room in pool.map(play_room, jobs) for rtt in room]
+    return percentile(rtts, 99) * 1000
+
+
+def capacity(args: Namespace, workers: int, port: int) -> tuple:
+    """Return the most players served within budget, the p99 round trip
+    time at that load and the next free port."""
+    served, served_p99 = 0, 0.0
+    per_room = args.start
+    while per_room * len(args.rooms) <= args.max_players:
+        process = start_server(args.host, port, '--workers', str(workers))
+        try:
+            p99 = p99_rtt_ms(args, port, per_room)
+        finally:
+            process.kill()
+            process.wait()
+        port += 1
+
+        if p99 > args.budget_ms:
+            break
+        served, served_p99 = per_room * len(args.rooms), p99
+        per_room *= 2
+
+    return served, served_p99, port
+
+
+def main(args: Namespace) -> None:
+    port = args.port
+    print(f'{len(args.rooms)} rooms, p99 budget {args.budget_ms:.0f} ms')
+    print(f'{"workers":>8}{"players":>10}{"p99 rtt ms":>12}')
+    for workers in args.workers:
+        players, p99, port = capacity(args, workers, port)
+        print(f'{workers:>8}{players:>10}{p99:>12.2f}')
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
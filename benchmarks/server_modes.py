@@ -0,0 +1,213 @@
+"""Compare the threaded and asyncio server modes.
+
+For every mode and client count a fresh server is started with
+``start_server.py``, the simulated clients connect and then move one
+step at a time. The round trip time of a step is measured from sending
+the new position until it comes back in a snapshot pushed by the
+server tick.
+
+Run from the repository root (Linux only, RSS is read from /proc):
+
+    python -m benchmarks.server_modes --clients 50 200 1000
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser, Namespace
+from bots.stats import percentile
+from copy import copy
+from enums.base import Network_, Server_
+from network import codec
+from network.framing import frame, read_frame
+from network.snapshots import SnapshotHistory
+
+MODES = ('threaded', 'asyncio')
+MAX_CONNECTIONS = Server_.MAX_CONNECTIONS.value
+SERVER_START_TIMEOUT = 10
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark the server modes.')
+    parser.add_argument(
+        '--clients',
+        type=int,
+        nargs='+',
+        default=[50, 200, 1000],
+        help='The number of simulated clients to run against each mode.',
+    )
+    parser.add_argument(
+        '--rounds',
+        type=int,
+        default=20,
+        help='Round trips made by every client.',
+    )
+    parser.add_argument(
+        '--tick-rate',
+        type=int,
+        default=Server_.TICK_RATE.value,
+        help='Tick rate of the servers under test.',
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='127.0.0.1',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=5600,
+        help='First port to use, every run gets its own port.',
+    )
+    return parser.parse_args(args)
+
+
+def server_rss_kb(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def start_server(host: str, port: int, *options: str) -> subprocess.Popen:
+    """Start start_server.py with the options and wait until it
+    accepts connections."""
+    env = dict(os.environ, HOST=host, PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, 'start_server.py', *options],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            # A throwaway connection drops before joining a room,
+            # which is harmless for the measurements.
+            socket.create_connection((host, port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+
+    process.kill()
+    raise RuntimeError(f'Server did not start on port {port}.')
+
+
+class SimulatedClient:
+    def __init__(
+        self, host: str, port: int, username: str, room: str = 'lobby'
+    ):
+        self.host = host
+        self.port = port
+        self.room = room
+        self.attributes = copy(Network_.PLAYER_ATTRIBUTES.value)
+        self.attributes['username'] = username
+        self.snapshots = SnapshotHistory()
+        self.ack = 0
+        self.rtts = []
+
+    async def connect(self, limit: asyncio.Semaphore) -> None:
+        async with limit:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+            self.writer.write(frame(codec.encode_hello(
+                self.attributes['username'], self.room
+            )))
+            self.attributes['id'], _, _ = codec.decode_welcome(
+                await read_frame(self.reader)
+            )
+
+    def _own_x(self) -> float:
+        snapshot = self.snapshots.get(self.ack) or {}
+        fields = snapshot.get(self.attributes['id'])
+        return None if fields is None else fields[0]
+
+    async def play(self, rounds: int) -> None:
+        for step in range(rounds):
+            self.attributes['x'] = step
+            started = time.perf_counter()
+            self.writer.write(
+                frame(codec.encode_state(self.ack, self.attributes))
+            )
+            await self.writer.drain()
+
+            # Snapshots keep arriving from the tick; wait for the one
+            # which holds the new position.
+            while self._own_x() != step:
+                data = await read_frame(self.reader)
+                if codec.message_type(data) == codec.HEARTBEAT:
+                    continue
+                self.ack = codec.decode_snapshot(data, self.snapshots) or 0
+                if self.ack == 0:
+                    # Ask for a keyframe.
+                    self.writer.write(
+                        frame(codec.encode_state(0, self.attributes))
+                    )
+            self.rtts.append(time.perf_counter() - started)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+async def run_clients(
+    args: Namespace, port: int, count: int, pid: int
+) -> dict:
+    clients = [
+        SimulatedClient(args.host, port, f'bot{i}') for i in range(count)
+    ]
+    # Don't overflow the listen backlog of the server.
+    limit = asyncio.Semaphore(MAX_CONNECTIONS)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client.connect(limit) for client in clients))
+    connect_time = time.perf_counter() - started
+
+    await asyncio.gather(*(client.play(args.rounds) for client in clients))
+    rtts = [rtt for client in clients for rtt in client.rtts]
+
+    result = {
+        'connections/s': count / connect_time,
+        'p99 rtt ms': percentile(rtts, 99) * 1000,
+        'rss MB': server_rss_kb(pid) / 1024,
+    }
+    for client in clients:
+        client.close()
+
+    return result
+
+
+def main(args: Namespace) -> None:
+    port = args.port
+    print(
+        f'{"mode":<10}{"clients":>8}{"connections/s":>15}'
+        f'{"p99 rtt ms":>12}{"rss MB":>9}'
+    )
+    for mode in MODES:
+        for count in args.clients:
+            process = start_server(
+                args.host, port,
+                '--mode', mode, '--tick-rate', str(args.tick_rate)
+            )
+            try:
+                result = asyncio.run(
+                    run_clients(args, port, count, process.pid)
+                )
+            finally:
+                process.kill()
+                process.wait()
+            port += 1
+
+            print(
+                f'{mode:<10}{count:>8}{result["connections/s"]:>15.0f}'
+                f'{result["p99 rtt ms"]:>12.2f}{result["rss MB"]:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,116 @@
+"""Measure the contention on the session table of a room.
+
+Client threads update their player as fast as they can while the tick
+thread snapshots and serializes the players at the tick rate. The
+registry, which only holds its lock to update the table, is compared
+with holding the same lock while serializing the snapshot.
+
+Run from the repository root:
+
+    python -m benchmarks.sessions --clients 10 100 1000
+"""
+import sys
+import threading
+import time
+
+from argparse import ArgumentParser, Namespace
+from network import codec
+from server.sessions import SessionRegistry
+
+MODES = ('registry', 'locked')
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark the session table.')
+    parser.add_argument(
+        '--clients',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000],
+        help='The number of client threads.',
+    )
+    parser.add_argument(
+        '--seconds',
+        type=float,
+        default=2,
+    )
+    parser.add_argument(
+        '--tick-rate',
+        type=int,
+        default=20,
+    )
+    return parser.parse_args(args)
+
+
+def measure(mode: str, count: int, args: Namespace) -> dict:
+    sessions = SessionRegistry()
+    for _ in range(count):
+        player_id = sessions.allocate()
+        sessions.add(player_id, f'player_{player_id}')
+
+    running = True
+    updates = [0] * count
+
+    def client(player_id: int) -> None:
+        x = 0
+        while running:
+            # Walk back and forth across the screen, staying in the
+            # range positions are sent in.
+            x = (x + 1) % 500
+            sessions.update(player_id, {'x': x})
+            updates[player_id] += 1
+            # Let the other threads run, like a socket read would.
+            time.sleep(0)
+
+    def tick() -> None:
+        while running:
+            if mode == 'registry':
+                codec.encode_snapshot(
+                    1, 0, {}, codec.snapshot_fields(sessions.snapshot())
+                )
+            else:
+                with sessions.lock:
+                    codec.encode_snapshot(
+                        1, 0, {}, codec.snapshot_fields(sessions._players)
+                    )
+            time.sleep(1 / args.tick_rate)
+
+    threads = [threading.Thread(target=tick)] + [
+        threading.Thread(target=client, args=(player_id,))
+        for player_id in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    running = False
+    for thread in threads:
+        thread.join()
+
+    stats = sessions.lock.stats
+    return {
+        'updates/s': sum(updates) / args.seconds,
+        'mean wait us': stats['mean_wait_us'],
+        'max wait us': stats['max_wait_us'],
+        'max hold us': stats['max_hold_us'],
+    }
+
+
+def main(args: Namespace) -> None:
+    columns = None
+    for count in args.clients:
+        for mode in MODES:
+            result = measure(mode, count, args)
+            if columns is None:
+                columns = list(result)
+                print(
+                    f'{"mode":<10}{"clients":>8}'
+                    + ''.join(f'{c:>14}' for c in columns)
+                )
+            print(
+                f'{mode:<10}{count:>8}'
+                + ''.join(f'{result[column]:>14.1f}' for column in columns)
+            )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
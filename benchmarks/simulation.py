@@ -0,0 +1,106 @@
+"""Measure the server's simulation of the players who send their inputs.
+
+Every player starts on a random cell of the map and sends a command a
+tick, changing the keys it holds now and then. Reports the time of a
+simulation step and of a whole tick of the room, which also writes the
+players moved back to the session table and serializes the snapshot.
+
+Run from the repository root:
+
+    python -m benchmarks.simulation --players 100 500 2000
+"""
+import random
+import sys
+import time
+
+from argparse import ArgumentParser, Namespace
+from server.server import Server
+from server.simulation import DIRECTION_KEYS, Simulation, Terrain
+
+KEYS = (0, *DIRECTION_KEYS)  # Standing still, or walking a way.
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Benchmark the simulation.')
+    parser.add_argument(
+        '--players',
+        type=int,
+        nargs='+',
+        default=[100, 500, 2000],
+    )
+    parser.add_argument(
+        '--ticks',
+        type=int,
+        default=200,
+    )
+    parser.add_argument(
+        '--map',
+        type=str,
+        default='lobby',
+    )
+    parser.add_argument(
+        '--turn-chance',
+        type=float,
+        default=0.1,
+        help='Chance of a player changing its keys each tick.',
+    )
+    return parser.parse_args(args)
+
+
+def measure(count: int, args: Namespace) -> dict:
+    random.seed(count)
+    terrain = Terrain.load(args.map)
+    nodes = sorted(terrain.nodes)
+    server = Server(
+        host='127.0.0.1', port=5555, simulation=Simulation(terrain)
+    )
+    for player_id in range(count):
+        server._add_player(player_id, f'player_{player_id}')
+        x, y = random.choice(nodes)
+        server._update_player(player_id, {'x': x, 'y': y})
+
+    held = [0] * count
+    ms = int(server.tick_interval * 1000)
+    step_time = tick_time = 0.0
+    moved = 0
+    for seq in range(1, args.ticks + 1):
+        for player_id in range(count):
+            if random.random() < args.turn_chance:
+                held[player_id] = random.choice(KEYS)
+            server.simulation.input(
+                player_id, seq, [(held[player_id], ms)]
+            )
+        started = time.perf_counter()
+        players = server.simulation.step(
+            server.sessions.snapshot(), server.tick_interval
+        )
+        stepped = time.perf_counter()
+        server.sessions.update_many(players)
+        server._update_snapshot()
+        step_time += stepped - started
+        tick_time += time.perf_counter() - started
+        moved += len(players)
+
+    return {
+        'step us': step_time / args.ticks * 1e6,
+        'step us/player': step_time / args.ticks / count * 1e6,
+        'tick us': tick_time / args.ticks * 1e6,
+        'moved/tick': moved / args.ticks,
+    }
+
+
+def main(args: Namespace) -> None:
+    columns = None
+    for count in args.players:
+        result = measure(count, args)
+        if columns is None:
+            columns = list(result)
+            print(f'{"players":>8}' + ''.join(f'{c:>16}' for c in columns))
+        print(
+            f'{count:>8}'
+            + ''.join(f'{result[column]:>16.1f}' for column in columns)
+        )
+
+
+if __name__ == '__main__':
+    main(parse_args(sys.argv[1:]))
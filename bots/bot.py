@@ -0,0 +1,299 @@
+"""Headless clients which play the game to put load on the server.
+
+A bot speaks the same protocol as `network.Network`: it joins a room,
+walks from node to node of the room's map and now and then posts a chat
+message to Redis. The round trip time of a move is measured from
+sending the new position until the server pushes it back in a snapshot.
+"""
+import asyncio
+import math
+import random
+import redis
+import select
+import time
+
+from collections import Counter
+from copy import copy
+from enums.base import Bots, Chat, Network_
+from game.errors import ServerError
+from game.redis import RedisClient
+from game.utils import check_os_config, get_config
+from network import codec
+from network.framing import frame, read_frame
+from network.network import Network
+from network.snapshots import SnapshotHistory
+from typing import Optional, Set
+
+GRID_SPACING = get_config()['GRID_SPACING']
+SEND_RATE = Network_.SEND_RATE.value
+TURN_CHANCE = Bots.TURN_CHANCE.value
+CHAT_INTERVAL = Bots.CHAT_INTERVAL.value
+FONT_SIZE = Chat.FONT_SIZE.value
+
+X = codec.NUMBER_FIELDS.index('x')
+Y = codec.NUMBER_FIELDS.index('y')
+DIRECTIONS = {
+    'left': (-GRID_SPACING, 0),
+    'right': (GRID_SPACING, 0),
+    'up': (0, -GRID_SPACING),
+    'down': (0, GRID_SPACING),
+}
+OPPOSITE = {'left': 'right', 'right': 'left', 'up': 'down', 'down': 'up'}
+WALK_STEPS = 4  # Sprites in a walk cycle.
+
+
+class BotStats:
+    """What a bot measured, merged over every bot for the report."""
+
+    def __init__(self):
+        self.rtts = []
+        self.sent = 0  # States sent.
+        self.received = 0  # Snapshots applied.
+        self.chats = 0
+        self.errors = Counter()
+
+    def merge(self, other: 'BotStats') -> None:
+        self.rtts += other.rtts
+        self.sent += other.sent
+        self.received += other.received
+        self.chats += other.chats
+        self.errors += other.errors
+
+
+class Bot:
+    """A player walking around a map, picking a new direction at
+    random now and then, and chatting every chat_interval seconds on
+    average.
+
+    Play over a blocking `network.Network` connection on the calling
+    thread with `play`, or as a coroutine with `async_play`.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        nodes: Set[tuple],
+        chat: Optional[RedisClient] = None,
+        chat_interval: float = CHAT_INTERVAL,
+        seed: int = None
+    ):
+        self.random = random.Random(seed)
+        self.nodes = nodes
+        self.attributes = copy(Network_.PLAYER_ATTRIBUTES.value)
+        self.attributes['username'] = username
+        self.attributes['x'], self.attributes['y'] = self.random.choice(
+            tuple(nodes)
+        )
+        self.direction = 'down'
+        self.chat = chat
+        self.chat_interval = chat_interval
+        self.next_chat = time.monotonic() + self._chat_delay()
+        # The positions sent and when, until the server echoes them.
+        self.in_flight = []
+        self.snapshots = SnapshotHistory()
+        self.ack = 0
+        self.stats = BotStats()
+
+    @property
+    def username(self) -> str:
+        return self.attributes['username']
+
+    @property
+    def position(self) -> tuple:
+        return self.attributes['x'], self.attributes['y']
+
+    def step(self) -> None:
+        """Walk to a neighbouring node, keeping the same direction unless
+        blocked or turning at random. Never turns back unless stuck."""
+        x, y = self.position
+        options = [
+            direction for direction, (dx, dy) in DIRECTIONS.items()
+            if (x + dx, y + dy) in self.nodes
+        ]
+        forward = [
+            direction for direction in options
+            if direction != OPPOSITE[self.direction]
+        ]
+        if not options:
+            self.attributes['standing'] = True
+            return
+
+        if self.direction not in forward or (
+            self.random.random() < TURN_CHANCE
+        ):
+            self.direction = self.random.choice(forward or options)
+
+        dx, dy = DIRECTIONS[self.direction]
+        for direction in DIRECTIONS:
+            self.attributes[direction] = direction == self.direction
+        self.attributes['x'] = x + dx
+        self.attributes['y'] = y + dy
+        self.attributes['standing'] = False
+        self.attributes['_current_step'] = (
+            self.attributes['_current_step'] + 1
+        ) % WALK_STEPS
+
+    def sent(self, now: float) -> None:
+        self.in_flight.append((self.position, now))
+        self.stats.sent += 1
+
+    def observe(self, snapshot: dict, now: float) -> None:
+        """Time the moves the snapshot shows the server has applied."""
+        self.stats.received += 1
+        fields = snapshot.get(self.attributes['id'])
+        if fields is None:
+            return
+
+        position = (fields[X], fields[Y])
+        for i, (sent_position, sent_at) in enumerate(self.in_flight):
+            if sent_position == position:
+                self.stats.rtts.append(now - sent_at)
+                # Earlier moves were overtaken by this one.
+                del self.in_flight[:i + 1]
+                break
+
+    def maybe_chat(self, now: float) -> None:
+        """Post a chat message through Redis if one is due."""
+        if self.chat is None or now < self.next_chat:
+            return
+
+        self.next_chat = now + self._chat_delay()
+        text = f'Hello from {self.username}!'
+        try:
+            self.chat.save_message({
+                'username': self.username,
+                'text': text,
+                'username_rect': self._rect(self.username),
+                'text_rect': self._rect(text),
+                'player_id': self.attributes['id'],
+            })
+        except redis.exceptions.RedisError:
+            self.stats.errors['chat'] += 1
+        else:
+            self.stats.chats += 1
+
+    def _chat_delay(self) -> float:
+        if not self.chat_interval:
+            return math.inf
+        return self.random.expovariate(1 / self.chat_interval)
+
+    def _rect(self, text: str) -> dict:
+        """Roughly the rect the chat box would render the text in."""
+        return {
+            'x': 0,
+            'y': 0,
+            'width': len(text) * FONT_SIZE // 2,
+            'height': FONT_SIZE,
+        }
+
+    def play(
+        self, room: str, duration: float, send_rate: int = SEND_RATE
+    ) -> BotStats:
+        """Play for duration seconds, blocking the calling thread."""
+        try:
+            net = Network(self.username, room, send_rate)
+        except ServerError:
+            self.stats.errors['connect'] += 1
+            return self.stats
+
+        self.attributes['id'] = net.player_id
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline:
+                self._play_once(net)
+                select.select(
+                    [net.client], [], [],
+                    max(0, net.last_due + net.send_interval
+                        - time.monotonic())
+                )
+        except (ServerError, OSError):
+            self.stats.errors['disconnected'] += 1
+        finally:
+            net.client.close()
+
+        return self.stats
+
+    def _play_once(self, net: Network) -> None:
+        """Send the next move if due and apply the snapshots received."""
+        last_due, last_sent, ack = net.last_due, net.last_sent, net.ack
+        net._send(self.attributes)
+        now = time.monotonic()
+        if net.ack != ack:
+            if net.ack:
+                self.observe(net.players, now)
+            else:
+                self.stats.errors['resync'] += 1
+        if net.last_sent != last_sent:
+            self.sent(net.last_sent)
+        # A move unchanged, standing stuck, is due but not sent.
+        if net.last_due != last_due:
+            self.step()
+        self.maybe_chat(now)
+
+    async def async_play(
+        self,
+        room: str,
+        duration: float,
+        send_rate: int = SEND_RATE,
+        host: str = None,
+        port: int = None
+    ) -> BotStats:
+        """Play for duration seconds as a coroutine."""
+        try:
+            reader, writer = await asyncio.open_connection(
+                check_os_config('HOST', host), check_os_config('PORT', port)
+            )
+            writer.write(frame(codec.encode_hello(self.username, room)))
+            self.attributes['id'], _, _ = codec.decode_welcome(
+                await read_frame(reader)
+            )
+        except (OSError, EOFError):
+            self.stats.errors['connect'] += 1
+            return self.stats
+
+        receiver = asyncio.create_task(self._async_receive(reader))
+        interval = 1 / send_rate
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline and not receiver.done():
+                writer.write(
+                    frame(codec.encode_state(self.ack, self.attributes))
+                )
+                await writer.drain()
+                now = time.monotonic()
+                self.sent(now)
+                self.step()
+                if self.chat is not None and now >= self.next_chat:
+                    # Redis is blocking, keep it off the event loop.
+                    await asyncio.to_thread(self.maybe_chat, now)
+                await asyncio.sleep(interval)
+        except ConnectionError:
+            self.stats.errors['disconnected'] += 1
+        else:
+            if receiver.done():
+                self.stats.errors['disconnected'] += 1
+        finally:
+            receiver.cancel()
+            writer.close()
+
+        return self.stats
+
+    async def _async_receive(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                data = await read_frame(reader)
+                if codec.message_type(data) != codec.SNAPSHOT:
+                    # Heartbeats, and the chat and input acks of the
+                    # players, as `Network._receive` skips them.
+                    continue
+                seq = codec.decode_snapshot(data, self.snapshots)
+                if seq is None:
+                    # Acknowledging nothing makes the server send a
+                    # keyframe.
+                    self.ack = 0
+                    self.stats.errors['resync'] += 1
+                else:
+                    self.ack = seq
+                    self.observe(self.snapshots.get(seq), time.monotonic())
+        except (EOFError, ConnectionError):
+            pass
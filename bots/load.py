@@ -0,0 +1,137 @@
+"""Run many bots against a server, as threads, asyncio tasks or
+processes, and summarise what they measured."""
+import asyncio
+import threading
+import time
+
+from argparse import Namespace
+from bots.bot import Bot, BotStats
+from bots.stats import percentile
+from game.map import Map
+from game.redis import RedisClient
+from multiprocessing import get_context
+from typing import Optional
+
+MODES = ('threads', 'tasks', 'processes')
+SPAWN = get_context('spawn')
+
+
+def chat_client(args: Namespace) -> Optional[RedisClient]:
+    """The Redis the bots chat through, None if they don't chat."""
+    if not args.chat_interval:
+        return None
+    if args.fake_redis:
+        # fakeredis is a dev dependency, only needed without a Redis
+        # server to chat through.
+        from fakeredis import FakeStrictRedis
+        return RedisClient(FakeStrictRedis(decode_responses=True))
+    return RedisClient()
+
+
+def make_bot(args: Namespace, i: int, chat: Optional[RedisClient]) -> Bot:
+    return Bot(
+        f'{args.prefix}{i}',
+        Map.nodes,
+        chat,
+        args.chat_interval,
+        seed=None if args.seed is None else args.seed + i
+    )
+
+
+def start_delay(args: Namespace, i: int) -> float:
+    """Seconds to wait before bot i joins, to ramp up the load."""
+    return args.ramp_up * i / args.bots
+
+
+def run_threads(args: Namespace) -> BotStats:
+    Map.load(args.room)
+    chat = chat_client(args)
+    bots = [make_bot(args, i, chat) for i in range(args.bots)]
+    threads = [
+        threading.Thread(
+            target=bot.play, args=(args.room, args.duration, args.send_rate)
+        )
+        for bot in bots
+    ]
+
+    started = time.monotonic()
+    for i, thread in enumerate(threads):
+        time.sleep(max(0, started + start_delay(args, i) - time.monotonic()))
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return _merge(bot.stats for bot in bots)
+
+
+async def _run_tasks(args: Namespace) -> BotStats:
+    Map.load(args.room)
+    chat = chat_client(args)
+    bots = [make_bot(args, i, chat) for i in range(args.bots)]
+
+    async def play(i: int, bot: Bot) -> BotStats:
+        await asyncio.sleep(start_delay(args, i))
+        return await bot.async_play(args.room, args.duration, args.send_rate)
+
+    return _merge(await asyncio.gather(
+        *(play(i, bot) for i, bot in enumerate(bots))
+    ))
+
+
+def run_tasks(args: Namespace) -> BotStats:
+    return asyncio.run(_run_tasks(args))
+
+
+def play_in_process(job: tuple) -> BotStats:
+    """Play a single bot, in a pool process."""
+    args, i = job
+    time.sleep(start_delay(args, i))
+    Map.load(args.room)
+    bot = make_bot(args, i, chat_client(args))
+    return bot.play(args.room, args.duration, args.send_rate)
+
+
+def run_processes(args: Namespace) -> BotStats:
+    with SPAWN.Pool(args.bots) as pool:
+        return _merge(pool.map(
+            play_in_process, [(args, i) for i in range(args.bots)]
+        ))
+
+
+RUNNERS = {
+    'threads': run_threads,
+    'tasks': run_tasks,
+    'processes': run_processes,
+}
+
+
+def _merge(all_stats) -> BotStats:
+    merged = BotStats()
+    for stats in all_stats:
+        merged.merge(stats)
+    return merged
+
+
+def report(stats: BotStats, bots: int, elapsed: float) -> dict:
+    """Summarise the bots' round trip times, throughput and error
+    rates."""
+    rtts = stats.rtts or [float('nan')]
+    chats = stats.chats + stats.errors['chat']
+    return {
+        'rtt p50 ms': percentile(rtts, 50) * 1000,
+        'rtt p90 ms': percentile(rtts, 90) * 1000,
+        'rtt p99 ms': percentile(rtts, 99) * 1000,
+        'states/s': stats.sent / elapsed,
+        'snapshots/s': stats.received / elapsed,
+        'chats/s': stats.chats / elapsed,
+        'connect errors %': 100 * stats.errors['connect'] / bots,
+        'disconnects %': 100 * stats.errors['disconnected'] / bots,
+        'chat errors %': 100 * stats.errors['chat'] / max(1, chats),
+        'resyncs/s': stats.errors['resync'] / elapsed,
+    }
+
+
+def run(args: Namespace) -> dict:
+    started = time.monotonic()
+    stats = RUNNERS[args.mode](args)
+    return report(stats, args.bots, time.monotonic() - started)
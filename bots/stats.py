@@ -0,0 +1,8 @@
+"""Statistics of the round trip times, shared by the load bots and the
+benchmarks."""
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * len(ordered))))
+    return ordered[index]
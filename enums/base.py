@@ -30,11 +30,60 @@ class Network_(Enum):
         'id': -1,
         'username': None,
     }
-    BUFFER_SIZE = 2048
+    BUFFER_SIZE = 2048  # Initial size of the reusable receive buffer.
+    MAX_FRAME_SIZE = 16 * 1024 * 1024
+    SNAPSHOT_HISTORY = 32  # Snapshots kept to apply deltas against.
+    SEND_RATE = 20  # Player updates sent to the server per second.
+    # Seconds between updates sent while the player does not change,
+    # which keep acknowledging the snapshots received: well within the
+    # SNAPSHOT_HISTORY the server encodes deltas against, at its default
+    # tick rate.
+    KEEPALIVE_INTERVAL = 1
+    # Seconds the network thread waits on the server at most before
+    # picking up what the game loop left for it.
+    POLL_INTERVAL = 0.005
+    # Seconds in the past the remote players are drawn at, between the
+    # snapshots received around then, and how long they carry on past
+    # the last snapshot when the next one is late.
+    INTERPOLATION_DELAY = 0.1
+    MAX_EXTRAPOLATION = 0.1
+    JITTER_BUFFER_SIZE = 32  # Positions kept per remote player.
+    # Input commands of the local player kept until the server applies
+    # them, a few seconds of frames.
+    PENDING_INPUTS = 256
+    # Messages from the server smaller than this are never compressed.
+    COMPRESSION_THRESHOLD = 128
+    COMPRESSION_LEVEL = 1  # zlib level, fast over small.
+    # Positions are sent as int16 in steps of 1 / POSITION_SCALE pixel.
+    POSITION_SCALE = 16
 
 
 class Server_(Enum):
     MAX_CONNECTIONS = 50
+    TICK_RATE = 20  # Snapshots pushed to the clients per second.
+    # Snapshots sent to a client before it is sent a full keyframe.
+    KEYFRAME_INTERVAL = 100
+    HELLO_TIMEOUT = 5  # Seconds a new connection has to name its room.
+    # Grid cells around the screen a client is sent players from.
+    AOI_MARGIN = 5
+    # Seconds a client may wait on a snapshot before it is disconnected.
+    SLOW_CONSUMER_TIMEOUT = 5
+    # Seconds without sending a client anything before sending it a
+    # heartbeat.
+    HEARTBEAT_INTERVAL = 2
+    # Seconds without hearing from a client before it is disconnected.
+    IDLE_TIMEOUT = 10
+    # Seconds a player whose connection dropped is kept for, standing,
+    # to resume their session.
+    RESUME_GRACE = 30
+    # Seconds of input commands a player may have applied ahead of the
+    # time gone by, as commands arrive in bursts.
+    INPUT_BUDGET = 0.5
+    # Bytes each room keeps the positions of its players at its last
+    # ticks in, to look up where they were at a past time.
+    HISTORY_BYTES = 1024 * 1024
+    # Ticks between logging the snapshot cache counters.
+    STATS_INTERVAL = 1200
 
 
 class Window(Enum):
@@ -56,5 +105,28 @@ class Chat(Enum):
 
 
 class Redis(Enum):
+    PORT = 6379
     SOCKET_CONNECT_TIMEOUT = 15
     MSG_LIFETIME_SECONDS = 5
+    # Chat messages waiting to be saved by the server before new ones are
+    # dropped.
+    MAX_PENDING_MESSAGES = 1000
+
+
+class Cluster(Enum):
+    CHANNEL_PREFIX = 'lobby:room:'  # Followed by the room name.
+    # Each node hands out player ids from its own block of this size.
+    PLAYER_IDS_PER_NODE = 1000
+    # Ticks between the full snapshots a node publishes, which also tell
+    # the other nodes it is alive.
+    KEYFRAME_INTERVAL = 20
+    NODE_TIMEOUT = 5  # Seconds before a silent node's players are dropped.
+    # Seconds between the Redis errors a room logs while Redis is down.
+    ERROR_LOG_INTERVAL = 10
+
+
+class Bots(Enum):
+    TURN_CHANCE = 0.2  # Chance of a bot turning at each step.
+    CHAT_INTERVAL = 10  # Mean seconds between a bot's chat messages.
+    DURATION = 30  # Seconds each bot plays for.
+    RAMP_UP = 5  # Seconds over which the bots join.
@@ -8,6 +8,8 @@ from game.redis import RedisClient
 from game.typing import Event, Sprite
 from game.utils import get_config
 from logger import get_logger
+from network.network import Network
+from typing import Optional
 
 log = get_logger(__name__)
 config = get_config()
@@ -31,11 +33,11 @@ class ChatMixin:
 
 
 class ChatBox(ChatMixin):
-    def __init__(self, username: str):
+    def __init__(self, username: str, net: Optional[Network] = None):
         self.colour = CHAT_BOX_COLOUR
         self.box = pygame.Surface((self.width, self.height))
         self.box.fill(self.colour)
-        self.text_input = TextInput(username)
+        self.text_input = TextInput(username, net)
 
     def draw(self, window: Sprite) -> None:
         """Draw chat box at bottom of screen."""
@@ -43,7 +45,13 @@ class ChatBox(ChatMixin):
 
 
 class TextInput(ChatMixin):
-    def __init__(self, username: str):
+    """The chat input, and the messages said.
+
+    Messages are said and received through Redis, or through the game
+    server if given its connection, net.
+    """
+
+    def __init__(self, username: str, net: Optional[Network] = None):
         self.colour = TEXT_COLOUR
         self.username_colour = USERNAME_COLOUR
         self.text = ''
@@ -51,7 +59,8 @@ class TextInput(ChatMixin):
         self.username = username
         self._setup_imgs()
         self._setup_rects()
-        self.redis = RedisClient()
+        self.net = net
+        self.redis = RedisClient() if net is None else None
         self.msgs = Messages()
 
     def _setup_imgs(self) -> None:
@@ -73,12 +82,21 @@ class TextInput(ChatMixin):
         )
 
     def get_new_messages(self, hover_messages: HoverMessages) -> None:
-        """Check redis for any new messages and update the list of
-        previous messages and hover-messages with any new ones found.
+        """Check redis, or the messages received from the server, for
+        any new messages and update the list of previous messages and
+        hover-messages with any new ones found.
         """
-        messages = self.redis.get_all_messages(cache=self.msgs.cache)
+        if self.net is not None:
+            messages = self.net.take_chat()
+        else:
+            messages = self.redis.get_all_messages(cache=self.msgs.cache)
         if messages:
-            sorted_messages = self.redis.sort_messages_by_expiry(messages)
+            if self.net is not None:
+                sorted_messages = messages
+            else:
+                sorted_messages = self.redis.sort_messages_by_expiry(
+                    messages
+                )
 
             for message in sorted_messages:
                 self.msgs.add_new_message(message)
@@ -111,8 +129,12 @@ class TextInput(ChatMixin):
         message duplication in the chat. Check whether the message
         is present in redis, and if not, remove it from the previous
         messages cache as the message has expired.
+
+        The server sends every message once, so none are kept.
         """
-        if len(self.msgs.cache) > 1:
+        if self.net is not None:
+            self.msgs.cache.clear()
+        elif len(self.msgs.cache) > 1:
             log.debug('Clearing old message ids.')
 
             for message_id in list(self.msgs.cache):
@@ -154,7 +176,8 @@ class TextInput(ChatMixin):
         return self.font.render(text, True, colour)
 
     def save_message(self, window: Sprite, player_id: int) -> None:
-        """Save entered messages to redis."""
+        """Save entered messages to redis, or say them through the
+        server."""
         if self.text_img.get_width():
             username_rect = self._create_rect_dict('username_rect')
             text_rect = self._create_rect_dict('text_rect')
@@ -166,7 +189,10 @@ class TextInput(ChatMixin):
                 'text_rect': text_rect,
                 'player_id': player_id
             }
-            self.redis.save_message(data)
+            if self.net is not None:
+                self.net.say(data)
+            else:
+                self.redis.save_message(data)
 
             if len(self.msgs):
                 self._update_messages()
@@ -27,7 +27,13 @@ class NewGame:
     # Dict to hold id:attributes for all the other players on the network.
     other_players = {}
 
-    def __init__(self, game_window: Sprite, net: Network, username: str):
+    def __init__(
+        self,
+        game_window: Sprite,
+        net: Network,
+        username: str,
+        server_chat: bool = False
+    ):
         self.background = pygame.image.load(BACKGROUND).convert()
         self.window = game_window
         self.net = net
@@ -35,7 +41,10 @@ class NewGame:
         self.menu = False
         self.grid = False
         self.is_typing = False
-        self.chat_box = ChatBox(self.username)
+        # Chat through the game server instead of Redis.
+        self.chat_box = ChatBox(
+            self.username, self.net if server_chat else None
+        )
         self.hover_messages = HoverMessages(game_window)
         self.player = Player(
             xy=random_xy(Map.nodes),
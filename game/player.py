@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import List, Optional, Union
 
 import pygame
 
@@ -14,8 +14,9 @@ from game.utils import (
     network_data
 )
 from logger import get_logger
+from network import codec
 from functools import partial
-from random import randint
+from operator import attrgetter
 from typing import Callable
 
 log = get_logger(__name__)
@@ -34,6 +35,15 @@ MUSHROOM_SOUND = config['MUSHROOM_SOUND']
 
 DOOR_POS = Base.HOTEL_DOOR_POSITIONS.value
 
+# The keys sent to the server in an input command, and their bits.
+INPUT_KEYS = (
+    (pygame.K_LEFT, codec.LEFT_KEY),
+    (pygame.K_RIGHT, codec.RIGHT_KEY),
+    (pygame.K_UP, codec.UP_KEY),
+    (pygame.K_DOWN, codec.DOWN_KEY),
+    (pygame.K_s, codec.STRAFE_KEY),
+)
+
 
 class Player:
     """Create a new player object."""
@@ -75,22 +85,24 @@ class Player:
 
     @property
     def attributes(self) -> dict:
-        """Attributes to send to/from the client and server."""
-        for attribute in self.base_attributes.keys():
-            self.base_attributes[attribute] = getattr(self, attribute)
+        """Attributes to send to/from the client and server.
+
+        Read in one go, and only written to the dict when one of them
+        changed since the last read.
+        """
+        values = self._network_values(self)
+        if values != self._last_values:
+            self.base_attributes.update(zip(self.base_attributes, values))
+            self._last_values = values
 
         return self.base_attributes
 
     def _set_player_img_id(self) -> int:
         """Set the image id (which will determine the players colour)
-        based on the players' id.
+        based on the players' id, as the other clients draw it (see
+        `RemotePlayer`).
         """
-        if self.id < Base.PLAYER_COLOURS.value:
-            img_id = self.id
-        else:
-            img_id = randint(0, Base.PLAYER_COLOURS.value - 1)
-
-        setattr(self, 'img_id', img_id)
+        setattr(self, 'img_id', self.id % Base.PLAYER_COLOURS.value)
 
     def _load_player_img(self, img: str) -> Callable:
         return partial(
@@ -153,6 +165,8 @@ class Player:
         self.mushroom_sound = sound(MUSHROOM_SOUND)
 
     def _setup_network_attributes(self) -> None:
+        self._network_values = attrgetter(*self.base_attributes)
+        self._last_values = None
         for expected_attr in self.base_attributes.keys():
             try:
                 getattr(self, expected_attr)
@@ -307,16 +321,27 @@ class Player:
         else:
             self.vel = PLAYER_VEL
 
-    def move(self, dt: float) -> None:
-        """Move the player with the arrow keys."""
-        keys = pygame.key.get_pressed()
+    def update(self, dt: float, keys: Optional[int] = None) -> None:
+        """Move and animate the player for a frame of dt, holding the
+        arrow keys, or keys as in an input command."""
+        self.check_collisions(Map.blocked_nodes, Map.reduced_speed_nodes)
+        self.move(dt, keys)
+        self.animation_loop()
+        self.animate(dt)
+        self.prevent_movement_beyond_screen(dt)
+
+    def move(self, dt: float, keys: Optional[int] = None) -> None:
+        """Move the player with the arrow keys, or the keys of an input
+        command (a mask of the codec.*_KEY bits) if given."""
+        if keys is None:
+            keys = self.input_keys()
 
         if self.hit_wall:
             self._prevent_movement_into_wall(dt)
         else:
-            self.strafe = True if keys[pygame.K_s] else False
+            self.strafe = True if keys & codec.STRAFE_KEY else False
 
-            if keys[pygame.K_LEFT]:
+            if keys & codec.LEFT_KEY:
                 if self.up and self.strafe:
                     self._set_directions("up")
                 elif self.down and self.strafe:
@@ -325,7 +350,7 @@ class Player:
                     self._set_directions("left")
                 self.x -= self.vel * dt
 
-            elif keys[pygame.K_RIGHT]:
+            elif keys & codec.RIGHT_KEY:
                 if self.up and self.strafe:
                     self._set_directions("up")
                 elif self.down and self.strafe:
@@ -334,7 +359,7 @@ class Player:
                     self._set_directions("right")
                 self.x += self.vel * dt
 
-            elif keys[pygame.K_UP]:
+            elif keys & codec.UP_KEY:
                 if self.left and self.strafe:
                     self._set_directions("left")
                 elif self.right and self.strafe:
@@ -343,7 +368,7 @@ class Player:
                     self._set_directions("up")
                 self.y -= self.vel * dt
 
-            elif keys[pygame.K_DOWN]:
+            elif keys & codec.DOWN_KEY:
                 if self.left and self.strafe:
                     self._set_directions("left")
                 elif self.right and self.strafe:
@@ -356,6 +381,16 @@ class Player:
                 self.standing = True
                 self.walk_count = 0
 
+    def input_keys(self) -> int:
+        """The keys held, as sent in an input command, the bike
+        counting as held while the player rides it."""
+        keys = pygame.key.get_pressed()
+        held = codec.BIKE_KEY if self.bike else 0
+        for key, bit in INPUT_KEYS:
+            if keys[key]:
+                held |= bit
+        return held
+
     def _prevent_movement_into_wall(self, dt) -> None:
         if self.standing:
             log.debug('Frozen on a wall. Reassigning (x,y) position.')
@@ -390,7 +425,7 @@ class Player:
             self.x -= self.vel * dt
         elif self.x < 0:
             self.x += self.vel * dt
-        elif self.y < 0:
+        if self.y < 0:
             self.y += self.vel * dt
         elif self.y > WINDOW_HEIGHT - self.height:
             self.y -= self.vel * dt
@@ -14,8 +14,8 @@ MSG_LIFETIME_SECONDS = Redis.MSG_LIFETIME_SECONDS.value
 
 
 class RedisClient:
-    def __init__(self):
-        self.redis = redis.StrictRedis(
+    def __init__(self, redis_client: redis.Redis = None):
+        self.redis = redis_client or redis.StrictRedis(
             host=check_os_config('HOST'),
             port=6379,
             decode_responses=True,
@@ -32,8 +32,13 @@ class RedisClient:
         message = self.redis.hgetall(message_id)
         return message
 
-    def save_message(self, client_payload: dict) -> str:
-        message_id = uuid4().hex
+    def save_message(
+        self,
+        client_payload: dict,
+        message_id: str = None
+    ) -> str:
+        if message_id is None:
+            message_id = uuid4().hex
         payload = {
             'data': json.dumps(client_payload),
         }
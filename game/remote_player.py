@@ -0,0 +1,106 @@
+"""The other players in the room, as the client draws them.
+
+A remote player is only ever moved by the snapshots the server sends,
+so it holds nothing but the fields of its latest snapshot (see
+`codec.snapshot_fields`) and the sprites of its colour. The sprites are
+loaded once per colour and shared by every remote player of it.
+"""
+from enums.base import Base, Player_
+from functools import partial
+from game.typing import Sprite
+from game.utils import load_player_img, sync_value_with_grid
+from network import codec
+
+PLAYER_WIDTH = Player_.WIDTH.value
+PLAYER_HEIGHT = Player_.HEIGHT.value
+PLAYER_COLOURS = Base.PLAYER_COLOURS.value
+
+# The fields of a player in a snapshot, by index.
+X = codec.NUMBER_FIELDS.index('x')
+Y = codec.NUMBER_FIELDS.index('y')
+STEP = codec.NUMBER_FIELDS.index('_current_step')
+FLAGS = len(codec.NUMBER_FIELDS)
+USERNAME = FLAGS + 1
+
+# The flags, by index, and the directions in the order a player facing
+# several ways is drawn.
+DIRECTIONS = tuple(
+    (codec.FLAG_FIELDS.index(direction), direction)
+    for direction in ('right', 'left', 'up', 'down')
+)
+STANDING = codec.FLAG_FIELDS.index('standing')
+IN_SLOW_AREA = codec.FLAG_FIELDS.index('in_slow_area')
+BIKE = codec.FLAG_FIELDS.index('bike')
+
+_sprites = {}  # Image id: PlayerSprites.
+
+
+class PlayerSprites:
+    """The sprites of a player colour: by direction and whether on the
+    bike, the sprite standing and the sprites walking."""
+
+    def __init__(self, img_id: int):
+        load = partial(load_player_img, img_id=img_id)
+        self.frames = {}
+        for _, direction in DIRECTIONS:
+            for bike, prefix in ((False, ''), (True, 'bike_')):
+                self.frames[direction, bike] = (
+                    load(f'{prefix}{direction}1'),
+                    [load(f'{prefix}{direction}2'),
+                     load(f'{prefix}{direction}3')]
+                )
+
+
+def sprites(img_id: int) -> PlayerSprites:
+    """The sprites of a player colour, loaded the first time."""
+    colour = _sprites.get(img_id)
+    if colour is None:
+        colour = _sprites[img_id] = PlayerSprites(img_id)
+    return colour
+
+
+class RemotePlayer:
+    """Another player in the room, updated in place from the fields of
+    each snapshot it changed in."""
+
+    __slots__ = ('id', 'username', 'x', 'y', 'walk_count', 'flags', 'sprites')
+
+    def __init__(self, player_id: int, fields: tuple):
+        self.id = player_id
+        self.sprites = sprites(player_id % PLAYER_COLOURS)
+        self.update(fields)
+
+    def update(self, fields: tuple) -> None:
+        self.x = fields[X]
+        self.y = fields[Y]
+        self.walk_count = fields[STEP]
+        self.flags = codec.FLAG_VALUES[fields[FLAGS]]
+        self.username = fields[USERNAME]
+
+    def draw(self, win: Sprite, dt: float) -> None:
+        """Draw the player facing its direction, standing or walking, on
+        the bike or not, as `Player.draw` does."""
+        flags = self.flags
+        for index, direction in DIRECTIONS:
+            if flags[index]:
+                break
+        else:
+            return
+
+        stand, walk = self.sprites.frames[direction, flags[BIKE]]
+        if flags[STANDING]:
+            img = stand
+        else:
+            # A walk count of 4 is drawn as the first step again.
+            img = walk[int(self.walk_count // 2) % len(walk)]
+
+        if flags[IN_SLOW_AREA]:
+            # In grass or water.
+            win.blit(
+                img,
+                (self.x, self.y),
+                (0, 0, sync_value_with_grid(PLAYER_WIDTH),
+                    PLAYER_HEIGHT - PLAYER_HEIGHT // 4)
+            )
+        else:
+            win.blit(img, (self.x, self.y))
@@ -2,7 +2,7 @@ import pygame
 import sys
 
 from argparse import ArgumentParser, Namespace
-from enums.base import Base
+from enums.base import Base, Network_
 from game.map import Map
 from game.new_game import NewGame
 from game.typing import Sprite
@@ -19,6 +19,7 @@ WINDOW_HEIGHT = config['WINDOW_HEIGHT']
 CHAT_WINDOW_HEIGHT = config['CHAT_WINDOW_HEIGHT']
 GRID_SPACING = config['GRID_SPACING']
 GAME_MAP = config['MAP']
+SEND_RATE = Network_.SEND_RATE.value
 
 if GRID_SPACING != 10:
     raise NotImplementedError('Do not adjust the grid spacing.')
@@ -40,11 +41,35 @@ def parse_args(args) -> Namespace:
         default=None,
         help='The random seed to use for map generation.',
     )
+    parser.add_argument(
+        '--server-chat',
+        action='store_true',
+        help='Chat through the game server instead of Redis.',
+    )
+    parser.add_argument(
+        '--send-inputs',
+        action='store_true',
+        help='Send the keys held for the server to move the player.',
+    )
+    parser.add_argument(
+        '--send-rate',
+        type=int,
+        default=SEND_RATE,
+        help=(
+            'Player updates sent to the server per second, whatever the'
+            ' frame rate.'
+        ),
+    )
     args = parser.parse_args()
     return args
 
 
-def setup_pygame(**kwargs) -> None:
+def setup_pygame(
+    server_chat: bool = False,
+    send_inputs: bool = False,
+    send_rate: int = SEND_RATE,
+    **kwargs
+) -> None:
     pygame.init()
     pygame.display.set_caption('Lobby')
     game_window = pygame.display.set_mode(
@@ -54,15 +79,26 @@ def setup_pygame(**kwargs) -> None:
     if kwargs:
         Map(**kwargs)
     else:
-        _game_loop(game_window)
+        _game_loop(game_window, server_chat, send_inputs, send_rate)
 
 
-def _game_loop(game_window: Sprite) -> None:
+def _game_loop(
+    game_window: Sprite,
+    server_chat: bool = False,
+    send_inputs: bool = False,
+    send_rate: int = SEND_RATE
+) -> None:
     game_is_running = True
     clock = pygame.time.Clock()
 
     Map.load(GAME_MAP)
-    game = NewGame(game_window, _setup_network(), _get_username())
+    username = _get_username()
+    game = NewGame(
+        game_window,
+        _setup_network(username, send_inputs, send_rate),
+        username,
+        server_chat
+    )
     while game_is_running:
         for event in pygame.event.get():
             game.check_keyboard_input(event)
@@ -72,11 +108,12 @@ def _game_loop(game_window: Sprite) -> None:
                 game_is_running = False
 
         # Time diff to determine frame rate based on game clock.
-        dt = clock.tick() * TIME_DIFF_MULTIPLYER
+        ms = clock.tick()
+        dt = ms * TIME_DIFF_MULTIPLYER
 
         game.fetch_player_data()
 
-        _player_methods(game, dt)
+        _player_methods(game, ms)
         game.draw_game_objects(dt)
 
         _chat_box_methods(game, game_window)
@@ -88,13 +125,20 @@ def _game_loop(game_window: Sprite) -> None:
 
         pygame.display.update()
 
+    game.net.stop()
+    log.info(
+        f'updates sent: {game.net.updates_sent}, '
+        f'skipped: {game.net.updates_skipped}.'
+    )
 
-def _player_methods(game: NewGame, dt: int) -> None:
-    game.player.check_collisions(Map.blocked_nodes, Map.reduced_speed_nodes)
-    game.player.move(dt)
-    game.player.animation_loop()
-    game.player.animate(dt)
-    game.player.prevent_movement_beyond_screen(dt)
+
+def _player_methods(game: NewGame, ms: int) -> None:
+    keys = game.player.input_keys()
+    if game.net.send_inputs:
+        # Played now, and again on top of each state the server sends
+        # until it has applied it too.
+        _, keys, ms = game.net.command(keys, ms)
+    game.player.update(ms * TIME_DIFF_MULTIPLYER, keys)
 
 
 def _chat_box_methods(game: NewGame, game_window: Sprite) -> None:
@@ -108,13 +152,21 @@ def _get_username() -> str:
     return 'testUser'
 
 
-def _setup_network() -> Network:
-    net = Network()
+def _setup_network(
+    username: str,
+    send_inputs: bool = False,
+    send_rate: int = SEND_RATE
+) -> Network:
+    net = Network(
+        username, GAME_MAP, send_rate=send_rate, send_inputs=send_inputs
+    )
 
     if net.data is None:
         log.info('cannot connect to server.')
     else:
         log.info('successfully connected to server.')
+        # The game loop never waits on the server.
+        net.start()
 
     return net
 
@@ -124,4 +176,8 @@ if __name__ == '__main__':
     if args.map:
         setup_pygame(seed_=args.seed, map_name=args.map)
     else:
-        setup_pygame()
+        setup_pygame(
+            server_chat=args.server_chat,
+            send_inputs=args.send_inputs,
+            send_rate=args.send_rate
+        )
@@ -0,0 +1,558 @@
+"""Compact binary encoding of the messages sent between the client and
+the server.
+
+The layout of a player record is derived from
+`Network_.PLAYER_ATTRIBUTES`: numeric attributes are packed as fixed
+width fields and the boolean attributes share a single bitfield byte.
+Positions are quantized to int16 steps of 1 / `Network_.POSITION_SCALE`
+pixel, the animation step to a whole byte.
+
+Snapshots are delta compressed: each one is encoded against a baseline
+snapshot the client has acknowledged, and only the players and fields
+which changed since are sent. A baseline of 0 marks a keyframe, which
+holds every player. Usernames are therefore only sent when a player is
+new to the client.
+
+Clients either send their state, or only the keys they hold as input
+commands for the server to move their player with (see
+`server.simulation`): each command is the keys held over one of the
+client's frames and how long that frame lasted. The server answers with
+the last command it applied and the state it left the player in, for
+the client to correct its prediction of its own player (see
+`network.prediction`).
+
+Every message starts with the codec version and the message type.
+Large messages from the server can be compressed (see
+`network.compression`).
+"""
+import struct
+
+from enums.base import Network_
+from game.errors import ServerError
+from network.snapshots import SnapshotHistory
+from operator import itemgetter
+from typing import Callable, Optional
+
+VERSION = 7
+
+# Message types.
+# Client -> server: the username, room and resume token, sent first.
+HELLO = 1
+# Server -> client: the id of the player and the session's resume token.
+WELCOME = 2
+STATE = 3     # Client -> server: the player's attributes and last ack.
+SNAPSHOT = 4  # Server -> client: the players which changed.
+HEARTBEAT = 5  # Either way: still connected, with nothing else to send.
+# Client -> server: the compression methods the client supports.
+COMPRESSION = 6
+# Server -> client: a message compressed with the method chosen.
+COMPRESSED = 7
+SAY = 8  # Client -> server: a chat message, as JSON.
+CHAT = 9  # Server -> client: a chat message said in the room, and its id.
+# Client -> server: numbered input commands, and the last ack.
+INPUT = 10
+# Server -> client: the last input command applied and the player's
+# state after it.
+INPUT_ACK = 11
+
+# The bits of the keys held in an input command.
+LEFT_KEY = 1 << 0
+RIGHT_KEY = 1 << 1
+UP_KEY = 1 << 2
+DOWN_KEY = 1 << 3
+STRAFE_KEY = 1 << 4
+BIKE_KEY = 1 << 5
+INPUT_SEQUENCE_MASK = 0xFFFF  # Input sequence numbers wrap at 16 bits.
+MAX_COMMAND_MS = 0xFF  # The longest an input command lasts.
+MAX_COMMANDS = 0xFF  # Input commands sent in a single message.
+
+SCHEMA = Network_.PLAYER_ATTRIBUTES.value
+FLAG_FIELDS = tuple(
+    attribute for attribute, default in SCHEMA.items()
+    if isinstance(default, bool)
+)
+NUMBER_FIELDS = tuple(
+    attribute for attribute, default in SCHEMA.items()
+    if type(default) is int and attribute != 'id'
+)
+
+if len(FLAG_FIELDS) > 8:
+    raise ServerError('Player flags must fit in a single byte.')
+
+POSITION_SCALE = Network_.POSITION_SCALE.value
+# The wire format of each numeric attribute, 'h' for a position.
+NUMBER_FORMATS = {'x': 'h', 'y': 'h', '_current_step': 'B'}
+# What each fixed width field of a record is multiplied by on the wire,
+# the flags byte being the last.
+SCALES = tuple(
+    POSITION_SCALE if NUMBER_FORMATS[attribute] == 'h' else 1
+    for attribute in NUMBER_FIELDS
+) + (1,)
+POSITIONS = frozenset(
+    i for i, attribute in enumerate(NUMBER_FIELDS)
+    if NUMBER_FORMATS[attribute] == 'h'
+)
+
+FLAG_BITS = tuple(
+    (attribute, 1 << bit) for bit, attribute in enumerate(FLAG_FIELDS)
+)
+# Every possible flags byte unpacked, so decoding is a single lookup,
+# and the reverse for encoding.
+FLAG_VALUES = tuple(
+    tuple(bool(flags & bit) for _, bit in FLAG_BITS) for flags in range(256)
+)
+FLAG_BYTES = {
+    values: flags
+    for flags, values in enumerate(FLAG_VALUES[:1 << len(FLAG_FIELDS)])
+}
+get_flags = itemgetter(*FLAG_FIELDS)
+get_numbers = itemgetter(*NUMBER_FIELDS)
+
+# The fields of a player in a snapshot, in order. Each one has a bit in
+# the field mask of a delta record.
+SNAPSHOT_FIELDS = NUMBER_FIELDS + ('flags', 'username')
+FIXED_FORMATS = ''.join(NUMBER_FORMATS[f] for f in NUMBER_FIELDS) + 'B'
+FIXED_MASK = (1 << len(FIXED_FORMATS)) - 1
+# The range of each fixed width field on the wire, values out of it being
+# clamped to it.
+FIXED_RANGES = tuple(
+    (-(1 << 8 * size - 1), (1 << 8 * size - 1) - 1) if fmt.islower()
+    else (0, (1 << 8 * size) - 1)
+    for fmt, size in (
+        (fmt, struct.calcsize(fmt)) for fmt in FIXED_FORMATS
+    )
+)
+USERNAME_BIT = 1 << len(FIXED_FORMATS)
+FULL_MASK = FIXED_MASK | USERNAME_BIT
+# The struct for the fixed width fields present in each field mask.
+RECORD_FIELDS = tuple(
+    struct.Struct('!' + ''.join(
+        fmt for bit, fmt in enumerate(FIXED_FORMATS) if mask & (1 << bit)
+    ))
+    for mask in range(FIXED_MASK + 1)
+)
+FIXED_COUNT = len(FIXED_FORMATS)
+RECORD_INDEXES = tuple(
+    tuple(i for i in range(FIXED_COUNT) if mask & (1 << i))
+    for mask in range(FIXED_MASK + 1)
+)
+
+MESSAGE_HEADER = struct.Struct('!BB')
+PLAYER = struct.Struct(f'!H{FIXED_FORMATS}')
+RECORD_HEADER = struct.Struct('!HB')
+PLAYER_ID = struct.Struct('!H')
+SEQUENCE = struct.Struct('!I')
+COUNT = struct.Struct('!H')
+STRING_LENGTH = struct.Struct('!B')
+TEXT_LENGTH = struct.Struct('!H')
+METHOD = struct.Struct('!B')
+FLAG = struct.Struct('!?')
+# The last ack, the sequence number of the first command and the
+# number of commands, followed by the keys held and milliseconds of each.
+INPUT_HEADER = struct.Struct('!IHB')
+INPUT_COMMAND = struct.Struct('!BB')
+INPUT_ACK_STATE = struct.Struct(f'!H{FIXED_FORMATS}')
+
+
+def _header(message_type: int) -> bytes:
+    return MESSAGE_HEADER.pack(VERSION, message_type)
+
+
+def message_type(data: bytes) -> int:
+    """Return the type of the message, checking its version."""
+    version, received_type = MESSAGE_HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ServerError(
+            f'Unsupported codec version {version}, expected {VERSION}.'
+        )
+    return received_type
+
+
+def _check_header(data: bytes, expected: int) -> int:
+    """Return the offset of the message body."""
+    received_type = message_type(data)
+    if received_type != expected:
+        raise ServerError(
+            f'Unexpected message type {received_type},'
+            f' expected {expected}.'
+        )
+    return MESSAGE_HEADER.size
+
+
+def _pack_flags(attributes: dict) -> int:
+    return FLAG_BYTES[get_flags(attributes)]
+
+
+def _quantize(numbers: tuple) -> list:
+    return [
+        min(max(int(value * scale), low), high)
+        for value, scale, (low, high) in zip(numbers, SCALES, FIXED_RANGES)
+    ]
+
+
+def _dequantize(numbers: tuple) -> list:
+    return [
+        value / SCALES[i] if i in POSITIONS else value
+        for i, value in enumerate(numbers)
+    ]
+
+
+def _pack_string(text: str, prefix: struct.Struct = STRING_LENGTH) -> bytes:
+    encoded = text.encode('utf-8')
+    limit = (1 << 8 * prefix.size) - 1
+    if len(encoded) > limit:
+        raise ServerError(
+            f'String of {len(encoded)} bytes exceeds the limit of {limit}.'
+        )
+    return prefix.pack(len(encoded)) + encoded
+
+
+def _unpack_string(
+    data: bytes,
+    offset: int,
+    prefix: struct.Struct = STRING_LENGTH
+) -> tuple:
+    """Return the string and the offset just past it."""
+    (length,) = prefix.unpack_from(data, offset)
+    offset += prefix.size
+    try:
+        text = bytes(data[offset:offset + length]).decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise ServerError(f'Malformed string: {e}.')
+    return text, offset + length
+
+
+def snapshot_fields(players: dict) -> dict:
+    """Build a snapshot of player id: fields from the players table.
+
+    Players who have not sent their username yet, or whose x position
+    is None as they have disconnected, are left out.
+    """
+    return {
+        player_id: (
+            *get_numbers(attributes),
+            FLAG_BYTES[get_flags(attributes)],
+            attributes['username']
+        )
+        for player_id, attributes in players.items()
+        if attributes['x'] is not None and attributes['username'] is not None
+    }
+
+
+def fields_to_attributes(player_id: int, fields: tuple) -> dict:
+    """Turn the fields of a player in a snapshot back into the player
+    attributes."""
+    *numbers, flags, username = fields
+
+    attributes = dict(zip(NUMBER_FIELDS, numbers))
+    attributes.update(zip(FLAG_FIELDS, FLAG_VALUES[flags]))
+    attributes['id'] = player_id
+    attributes['username'] = username
+
+    return attributes
+
+
+def encode_hello(username: str, room: str, token: str = '') -> bytes:
+    """token resumes the session it was issued for, if any."""
+    return (
+        _header(HELLO)
+        + _pack_string(username)
+        + _pack_string(room)
+        + _pack_string(token)
+    )
+
+
+def decode_hello(data: bytes) -> tuple:
+    """Return the username, the name of the room to join and the
+    resume token, empty for a new session."""
+    username, offset = _unpack_string(data, _check_header(data, HELLO))
+    room, offset = _unpack_string(data, offset)
+    token, _ = _unpack_string(data, offset)
+    return username, room, token
+
+
+def encode_welcome(
+    player_id: int,
+    token: str = '',
+    resumed: bool = False
+) -> bytes:
+    return (
+        _header(WELCOME)
+        + PLAYER_ID.pack(player_id)
+        + FLAG.pack(resumed)
+        + _pack_string(token)
+    )
+
+
+def decode_welcome(data: bytes) -> tuple:
+    """Return the id of the player, the token to resume the session
+    with and whether the session was resumed."""
+    offset = _check_header(data, WELCOME)
+    (player_id,) = PLAYER_ID.unpack_from(data, offset)
+    offset += PLAYER_ID.size
+    (resumed,) = FLAG.unpack_from(data, offset)
+    token, _ = _unpack_string(data, offset + FLAG.size)
+    return player_id, token, resumed
+
+
+def encode_heartbeat() -> bytes:
+    return _header(HEARTBEAT)
+
+
+def encode_compression(methods: tuple) -> bytes:
+    return b''.join((
+        _header(COMPRESSION), STRING_LENGTH.pack(len(methods)), bytes(methods)
+    ))
+
+
+def decode_compression(data: bytes) -> tuple:
+    """Return the compression methods offered, in order of
+    preference."""
+    offset = _check_header(data, COMPRESSION)
+    (count,) = STRING_LENGTH.unpack_from(data, offset)
+    offset += STRING_LENGTH.size
+    return tuple(data[offset:offset + count])
+
+
+def encode_compressed(method: int, payload: bytes) -> bytes:
+    return _header(COMPRESSED) + METHOD.pack(method) + payload
+
+
+def decode_compressed(data: bytes) -> tuple:
+    """Return the compression method and the compressed message."""
+    offset = _check_header(data, COMPRESSED)
+    (method,) = METHOD.unpack_from(data, offset)
+    return method, memoryview(data)[offset + METHOD.size:]
+
+
+def encode_say(data: str) -> bytes:
+    return _header(SAY) + _pack_string(data, TEXT_LENGTH)
+
+
+def decode_say(data: bytes) -> str:
+    text, _ = _unpack_string(data, _check_header(data, SAY), TEXT_LENGTH)
+    return text
+
+
+def encode_chat(message_id: str, data: str) -> bytes:
+    return (
+        _header(CHAT)
+        + _pack_string(message_id)
+        + _pack_string(data, TEXT_LENGTH)
+    )
+
+
+def decode_chat(data: bytes) -> tuple:
+    """Return the id of the message and the message, as JSON."""
+    message_id, offset = _unpack_string(data, _check_header(data, CHAT))
+    text, _ = _unpack_string(data, offset, TEXT_LENGTH)
+    return message_id, text
+
+
+def encode_state(ack: int, attributes: dict) -> bytes:
+    """Encode the player's attributes (all but the username) together
+    with the sequence number of the last snapshot received."""
+    return b''.join((
+        _header(STATE),
+        SEQUENCE.pack(ack),
+        PLAYER.pack(
+            attributes['id'],
+            *_quantize(get_numbers(attributes)),
+            _pack_flags(attributes)
+        )
+    ))
+
+
+def state_fields(data: bytes) -> bytes:
+    """Return the player's fields of an encoded state, without the ack,
+    to tell whether the player changed between two states."""
+    return data[MESSAGE_HEADER.size + SEQUENCE.size:]
+
+
+def decode_state(data: bytes) -> tuple:
+    """Return the acknowledged sequence number and the attributes."""
+    offset = _check_header(data, STATE)
+    (ack,) = SEQUENCE.unpack_from(data, offset)
+    player_id, *numbers, flags = PLAYER.unpack_from(
+        data, offset + SEQUENCE.size
+    )
+
+    attributes = dict(zip(NUMBER_FIELDS, _dequantize(numbers)))
+    attributes.update(zip(FLAG_FIELDS, FLAG_VALUES[flags]))
+    attributes['id'] = player_id
+
+    return ack, attributes
+
+
+def encode_input(ack: int, seq: int, commands: list) -> bytes:
+    """Encode input commands, the keys held (a mask of the *_KEY bits)
+    and for how many milliseconds, numbered from seq, with the last
+    snapshot received."""
+    if len(commands) > MAX_COMMANDS:
+        raise ServerError(
+            f'Too many input commands ({len(commands)}) for a message.'
+        )
+    return b''.join((
+        _header(INPUT),
+        INPUT_HEADER.pack(ack, seq & INPUT_SEQUENCE_MASK, len(commands)),
+        *(
+            INPUT_COMMAND.pack(keys, min(ms, MAX_COMMAND_MS))
+            for keys, ms in commands
+        )
+    ))
+
+
+def decode_input(data: bytes) -> tuple:
+    """Return the acknowledged sequence number, the sequence number of
+    the first command and the keys held and milliseconds of each."""
+    offset = _check_header(data, INPUT)
+    ack, seq, count = INPUT_HEADER.unpack_from(data, offset)
+    offset += INPUT_HEADER.size
+    if len(data) < offset + count * INPUT_COMMAND.size:
+        raise ServerError('Truncated input commands.')
+    commands = [
+        INPUT_COMMAND.unpack_from(data, offset + i * INPUT_COMMAND.size)
+        for i in range(count)
+    ]
+    return ack, seq, commands
+
+
+def encode_input_ack(seq: int, fields: tuple) -> bytes:
+    """Encode the sequence number of the last input command applied
+    and the fields of the player after it, as in a snapshot."""
+    return _header(INPUT_ACK) + INPUT_ACK_STATE.pack(
+        seq & INPUT_SEQUENCE_MASK, *_quantize(fields[:FIXED_COUNT])
+    )
+
+
+def decode_input_ack(data: bytes) -> tuple:
+    """Return the sequence number of the last input command applied
+    and the fixed width fields of the player after it."""
+    seq, *fields = INPUT_ACK_STATE.unpack_from(
+        data, _check_header(data, INPUT_ACK)
+    )
+    return seq, tuple(_dequantize(fields))
+
+
+def _field_mask(previous: tuple, fields: tuple) -> int:
+    mask = 0
+    for bit, (old, new) in enumerate(zip(previous, fields)):
+        if old != new:
+            mask |= 1 << bit
+    return mask
+
+
+def _pack_fields(player_id: int, mask: int, fields: tuple) -> bytes:
+    fixed_mask = mask & FIXED_MASK
+    indexes = RECORD_INDEXES[fixed_mask]
+    values = [int(fields[i] * SCALES[i]) for i in indexes]
+    try:
+        packed = RECORD_FIELDS[fixed_mask].pack(*values)
+    except struct.error:
+        # Only clamped when out of range, off the common path.
+        packed = RECORD_FIELDS[fixed_mask].pack(*(
+            min(max(value, FIXED_RANGES[i][0]), FIXED_RANGES[i][1])
+            for i, value in zip(indexes, values)
+        ))
+    record = RECORD_HEADER.pack(player_id, mask) + packed
+
+    if mask & USERNAME_BIT:
+        record += _pack_string(fields[-1])
+
+    return record
+
+
+def pack_record(
+    player_id: int,
+    previous: Optional[tuple],
+    fields: tuple
+) -> bytes:
+    """Pack the fields of a player which differ from previous, or
+    every field if the player is new to the baseline."""
+    if previous is None:
+        return _pack_fields(player_id, FULL_MASK, fields)
+    return _pack_fields(player_id, _field_mask(previous, fields), fields)
+
+
+def encode_snapshot(
+    seq: int,
+    baseline_seq: int,
+    baseline: dict,
+    snapshot: dict,
+    pack: Callable[[int, Optional[tuple], tuple], bytes] = pack_record
+) -> bytes:
+    """Encode a snapshot as the difference from a baseline snapshot.
+
+    Pass a baseline_seq of 0 and an empty baseline for a keyframe.
+    Players in the baseline but not in the snapshot are sent as
+    removed. pack is called for every player which changed, so the
+    records can be memoized.
+    """
+    records = []
+    for player_id, fields in snapshot.items():
+        previous = baseline.get(player_id)
+        if previous != fields:
+            records.append(pack(player_id, previous, fields))
+
+    removed = [
+        PLAYER_ID.pack(player_id)
+        for player_id in baseline if player_id not in snapshot
+    ]
+
+    return b''.join((
+        _header(SNAPSHOT),
+        SEQUENCE.pack(seq),
+        SEQUENCE.pack(baseline_seq),
+        COUNT.pack(len(records)),
+        *records,
+        COUNT.pack(len(removed)),
+        *removed
+    ))
+
+
+def decode_snapshot(data: bytes, history: SnapshotHistory) -> Optional[int]:
+    """Apply a snapshot to its baseline and add the result to history.
+
+    Returns the sequence number of the snapshot, or None if the baseline
+    is no longer in history, in which case a keyframe is needed.
+    """
+    offset = _check_header(data, SNAPSHOT)
+    (seq,) = SEQUENCE.unpack_from(data, offset)
+    (baseline_seq,) = SEQUENCE.unpack_from(data, offset + SEQUENCE.size)
+    offset += 2 * SEQUENCE.size
+
+    if baseline_seq == 0:
+        snapshot = {}
+    elif baseline_seq in history:
+        snapshot = dict(history.get(baseline_seq))
+    else:
+        return None
+
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    for _ in range(count):
+        player_id, mask = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+
+        fixed_mask = mask & FIXED_MASK
+        values = RECORD_FIELDS[fixed_mask].unpack_from(data, offset)
+        offset += RECORD_FIELDS[fixed_mask].size
+
+        fields = list(snapshot.get(player_id, (None,) * len(SNAPSHOT_FIELDS)))
+        for i, value in zip(RECORD_INDEXES[fixed_mask], values):
+            fields[i] = value / SCALES[i] if i in POSITIONS else value
+        if mask & USERNAME_BIT:
+            fields[-1], offset = _unpack_string(data, offset)
+
+        snapshot[player_id] = tuple(fields)
+
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    for _ in range(count):
+        (player_id,) = PLAYER_ID.unpack_from(data, offset)
+        offset += PLAYER_ID.size
+        snapshot.pop(player_id, None)
+
+    history.put(seq, snapshot)
+
+    return seq
@@ -0,0 +1,106 @@
+"""Compression of the large messages the server sends.
+
+Right after the welcome a client offers the methods it supports, in a
+COMPRESSION message, and the server picks the first one it supports too.
+From then on the server's messages of at least COMPRESSION_THRESHOLD
+bytes are sent as COMPRESSED messages, and smaller ones as they are.
+
+Each connection compresses its messages as a single stream, so a
+snapshot is also compressed against the ones sent before it: the
+usernames and positions repeat from one snapshot to the next. The
+client must therefore decompress every COMPRESSED message, in order,
+even the ones it skips.
+"""
+import zlib
+
+from enums.base import Network_
+from game.errors import ServerError
+from typing import Optional
+
+COMPRESSION_THRESHOLD = Network_.COMPRESSION_THRESHOLD.value
+COMPRESSION_LEVEL = Network_.COMPRESSION_LEVEL.value
+MAX_FRAME_SIZE = Network_.MAX_FRAME_SIZE.value
+
+# Compression methods.
+ZLIB = 1
+METHODS = (ZLIB,)  # Supported, in order of preference.
+
+# Raw deflate with a 4 KB window, a few snapshots, to keep the memory of
+# a stream per connection low.
+WBITS = -12
+MEM_LEVEL = 6
+# Every message is ended with a sync flush, so the client can decompress
+# it whole. The flush always ends with these bytes, which are left out.
+SYNC_TAIL = b'\x00\x00\xff\xff'
+
+
+def choose(offered: tuple) -> Optional[int]:
+    """Return the first offered method which is supported, None if
+    there is none."""
+    for method in offered:
+        if method in METHODS:
+            return method
+    return None
+
+
+def _check_method(method: int) -> None:
+    if method not in METHODS:
+        raise ServerError(f'Unsupported compression method {method}.')
+
+
+class Compressor:
+    """The compression stream of the messages sent to one client."""
+
+    def __init__(
+        self,
+        method: int = ZLIB,
+        level: int = COMPRESSION_LEVEL,
+        threshold: int = COMPRESSION_THRESHOLD
+    ):
+        _check_method(method)
+        self.method = method
+        self.threshold = threshold
+        self.stream = zlib.compressobj(
+            level, zlib.DEFLATED, WBITS, MEM_LEVEL
+        )
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def compress(self, data: bytes) -> bytes:
+        compressed = (
+            self.stream.compress(data) + self.stream.flush(zlib.Z_SYNC_FLUSH)
+        )[:-len(SYNC_TAIL)]
+        self.raw_bytes += len(data)
+        self.compressed_bytes += len(compressed)
+        return compressed
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'raw': self.raw_bytes,
+            'compressed': self.compressed_bytes,
+            'ratio': self.compressed_bytes / max(1, self.raw_bytes),
+        }
+
+
+class Decompressor:
+    """The client's end of a `Compressor` stream."""
+
+    def __init__(self, method: int = ZLIB):
+        _check_method(method)
+        self.method = method
+        self.stream = zlib.decompressobj(WBITS)
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            message = self.stream.decompress(
+                bytes(data) + SYNC_TAIL, MAX_FRAME_SIZE
+            )
+        except zlib.error as e:
+            raise ServerError(f'Could not decompress message. Error: {e}.')
+        if self.stream.unconsumed_tail:
+            raise ServerError(
+                'Decompressed message exceeds the maximum frame size of'
+                f' {MAX_FRAME_SIZE} bytes.'
+            )
+        return message
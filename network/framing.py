@@ -0,0 +1,84 @@
+"""Length-prefixed framing used by both the client and the server.
+
+Every message is sent as a fixed-size header holding the length of the
+payload, followed by the payload itself, so a message of any size is
+always received whole and never glued to the next one.
+"""
+import asyncio
+import socket
+import struct
+
+from enums.base import Network_
+from game.errors import ServerError
+
+BUFFER_SIZE = Network_.BUFFER_SIZE.value
+MAX_FRAME_SIZE = Network_.MAX_FRAME_SIZE.value
+
+HEADER = struct.Struct('!I')
+
+
+def frame(payload: bytes) -> bytes:
+    """Prefix the payload with its length."""
+    return HEADER.pack(len(payload)) + payload
+
+
+def send_frame(conn: socket.socket, payload: bytes) -> None:
+    conn.sendall(frame(payload))
+
+
+def _check_length(length: int) -> None:
+    if length > MAX_FRAME_SIZE:
+        raise ServerError(
+            f'Frame of {length} bytes exceeds the maximum frame size of'
+            f' {MAX_FRAME_SIZE} bytes.'
+        )
+
+
+class FrameReader:
+    """Read whole frames from a blocking socket.
+
+    Frames are received straight into a preallocated buffer which only
+    grows when a larger frame arrives, so reading a frame never
+    allocates. The returned memoryview is only valid until the next
+    call to `read`.
+    """
+
+    def __init__(self, conn: socket.socket, buffer_size: int = BUFFER_SIZE):
+        self.conn = conn
+        self.header = bytearray(HEADER.size)
+        self.buffer = bytearray(buffer_size)
+
+    def recv_exact(self, view: memoryview) -> None:
+        """Fill the view completely, however many reads it takes."""
+        received = 0
+        size = len(view)
+        while received < size:
+            n_bytes = self.conn.recv_into(view[received:], size - received)
+            if not n_bytes:
+                raise EOFError('Connection closed by peer.')
+            received += n_bytes
+
+    def read(self) -> memoryview:
+        self.recv_exact(memoryview(self.header))
+        (length,) = HEADER.unpack(self.header)
+        _check_length(length)
+
+        if length > len(self.buffer):
+            self.buffer = bytearray(length)
+
+        view = memoryview(self.buffer)[:length]
+        self.recv_exact(view)
+
+        return view
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """Read a whole frame from an asyncio stream."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        _check_length(length)
+
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise EOFError('Connection closed by peer.')
@@ -0,0 +1,103 @@
+"""Smooth movement of the remote players between the snapshots.
+
+Snapshots arrive at the server's tick rate, give or take the network's
+jitter. Drawing the remote players where the latest snapshot put them
+would move them in jumps following the network's timing, so each
+remote player's positions are kept with the time they were received at
+and the player is drawn INTERPOLATION_DELAY in the past, between the two
+positions received around that time. When the next snapshot is late the
+player carries on for at most MAX_EXTRAPOLATION past the last one.
+"""
+from collections import deque
+from enums.base import Network_
+from network import codec
+from typing import Optional
+
+INTERPOLATION_DELAY = Network_.INTERPOLATION_DELAY.value
+MAX_EXTRAPOLATION = Network_.MAX_EXTRAPOLATION.value
+JITTER_BUFFER_SIZE = Network_.JITTER_BUFFER_SIZE.value
+
+FLAGS = len(codec.NUMBER_FIELDS)  # The flags in the fields of a player.
+STANDING = codec.FLAG_FIELDS.index('standing')
+
+
+class JitterBuffer:
+    """The latest positions of a remote player, oldest first, with the
+    time they were received at and whether the player was walking."""
+
+    def __init__(self, size: int = JITTER_BUFFER_SIZE):
+        self.samples = deque(maxlen=size)
+
+    def add(self, timestamp: float, x: float, y: float, walking: bool) -> None:
+        self.samples.append((timestamp, x, y, walking))
+
+    def sample(self, render_time: float) -> tuple:
+        """Return where the player was at render_time."""
+        newest = self.samples[-1]
+        if render_time >= newest[0]:
+            return self._extrapolate(render_time)
+
+        later = newest
+        for earlier in reversed(self.samples):
+            if earlier[0] <= render_time:
+                fraction = (render_time - earlier[0]) / (
+                    later[0] - earlier[0]
+                )
+                return (
+                    earlier[1] + (later[1] - earlier[1]) * fraction,
+                    earlier[2] + (later[2] - earlier[2]) * fraction
+                )
+            later = earlier
+        # Older than anything kept.
+        return later[1], later[2]
+
+    def _extrapolate(self, render_time: float) -> tuple:
+        """Carry on at the last velocity received, for at most
+        MAX_EXTRAPOLATION, if the player was walking."""
+        timestamp, x, y, walking = self.samples[-1]
+        if not walking or len(self.samples) < 2:
+            return x, y
+
+        previous = self.samples[-2]
+        elapsed = min(render_time - timestamp, MAX_EXTRAPOLATION)
+        scale = elapsed / (timestamp - previous[0])
+        return x + (x - previous[1]) * scale, y + (y - previous[2]) * scale
+
+
+class Interpolation:
+    """The jitter buffers of the remote players, fed with the snapshots
+    the client receives and read on every frame by `position`."""
+
+    def __init__(self, delay: float = INTERPOLATION_DELAY):
+        self.delay = delay
+        self.buffers = {}  # Player id: JitterBuffer.
+        self.latest = None  # The time of the last snapshot added.
+
+    def add(self, timestamp: float, snapshot: dict) -> None:
+        """Add the positions of a snapshot (see `codec.snapshot_fields`)
+        received at timestamp. Snapshots no later than the last one are
+        ignored, so the same snapshot can be given on every frame."""
+        if self.latest is not None and timestamp <= self.latest:
+            return
+        self.latest = timestamp
+
+        for player_id in self.buffers.keys() - snapshot.keys():
+            del self.buffers[player_id]
+        for player_id, fields in snapshot.items():
+            buffer = self.buffers.get(player_id)
+            if buffer is None:
+                buffer = self.buffers[player_id] = JitterBuffer()
+            buffer.add(
+                timestamp,
+                fields[0],
+                fields[1],
+                not codec.FLAG_VALUES[fields[FLAGS]][STANDING]
+            )
+
+    def position(self, player_id: int, now: float) -> Optional[tuple]:
+        """Return where to draw a remote player at now, None for a
+        player not received yet."""
+        buffer = self.buffers.get(player_id)
+        if buffer is None:
+            return None
+        return buffer.sample(now - self.delay)
@@ -0,0 +1,27 @@
+"""Hand values over between the game loop and the network thread."""
+from collections import deque
+from typing import Any
+
+
+class Mailbox:
+    """Holds the latest value put by one thread until another takes it.
+
+    A value put before the previous one was taken replaces it, so the
+    reader only ever sees the newest and neither side waits on the
+    other. No lock is taken: appending to and popping from a deque are
+    atomic.
+    """
+
+    def __init__(self):
+        self.slot = deque(maxlen=1)
+
+    def put(self, value: Any) -> None:
+        self.slot.append(value)
+
+    def take(self, default: Any = None) -> Any:
+        """Return the latest value and empty the mailbox, default if it
+        is empty."""
+        try:
+            return self.slot.popleft()
+        except IndexError:
+            return default
@@ -1,17 +1,100 @@
-import pickle
+import json
+import select
 import socket
+import threading
+import time
 
+from collections import deque
 from enums.base import Network_
 from game.player import Player
+from game.remote_player import USERNAME, RemotePlayer
 from game.errors import ServerError
-from game.utils import check_os_config
+from game.utils import check_os_config, get_config
+from network import codec, compression
+from network.compression import Decompressor
+from network.framing import FrameReader, send_frame
+from network.interpolation import Interpolation
+from network.mailbox import Mailbox
+from network.prediction import Prediction
+from network.snapshots import SnapshotHistory
 
-
-BUFFER_SIZE = Network_.BUFFER_SIZE.value
+SEND_RATE = Network_.SEND_RATE.value
+KEEPALIVE_INTERVAL = Network_.KEEPALIVE_INTERVAL.value
+POLL_INTERVAL = Network_.POLL_INTERVAL.value
+ROOM = get_config()['MAP']
 
 
 class Network:
-    def __init__(self):
+    """The client's connection to the game server.
+
+    The game loop exchanges with the server either itself, through
+    `_send`, or, once `start` is called, through `exchange` with a
+    network thread doing the sending and receiving, so that rendering
+    never waits on the socket.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        room: str = ROOM,
+        send_rate: int = SEND_RATE,
+        compress: bool = True,
+        send_inputs: bool = False
+    ):
+        self.username = username
+        self.room = room  # The map being played.
+        # Offer the server to compress what it sends.
+        self.compress = compress
+        # Send the keys held for the server to move the player, instead
+        # of the player's state, once the server has the state to start
+        # from.
+        self.send_inputs = send_inputs
+        self.synced = False
+        # The local player's input commands, kept until acknowledged by
+        # the game loop, and the commands still to send: given by the
+        # game loop, which only appends to commands, and taken off it by
+        # whichever sends them into unsent, which only it reads.
+        self.prediction = Prediction()
+        self.commands = deque()
+        self.unsent = deque()
+        self.keys = None  # The keys of the last command sent.
+        # The server's latest acknowledgement of the commands.
+        self.acks = Mailbox()
+        self.decompressor = None
+        self.send_interval = 1 / send_rate
+        self.last_due = 0  # When an update was last due.
+        self.last_sent = 0
+        # The player's fields last sent, updates being skipped until they
+        # change or KEEPALIVE_INTERVAL has gone by, and how many were.
+        self.sent_state = None
+        self.updates_sent = 0
+        self.updates_skipped = 0
+        self.posted = None  # The attributes last left for the thread.
+        # Snapshots are sent as deltas against the last one acknowledged.
+        self.snapshots = SnapshotHistory()
+        self.ack = 0
+        self.players = {}  # The latest snapshot applied.
+        # Chat messages received since the last `take_chat`.
+        self.chat = deque()
+        # The network thread and what it exchanges with the game loop:
+        # the latest player attributes to send, the latest snapshot
+        # received, the chat messages to send and the error which
+        # stopped it.
+        self.thread = None
+        self.running = False
+        self.outbox = Mailbox()
+        self.inbox = Mailbox()
+        self.said = deque()
+        self.error = None
+        # The snapshot the game loop was last given, and the time it was
+        # received at.
+        self.shown = {}
+        self.shown_at = 0.0
+        # Where to draw the remote players, read by the game loop only.
+        self.interpolation = Interpolation()
+        # Resumes the session on a new connection, see `reconnect`.
+        self.token = ''
+        self.resumed = False
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.HOST = check_os_config('HOST')
         self.PORT = check_os_config('PORT')
@@ -21,76 +104,373 @@ class Network:
     def _connect(self) -> bool:
         try:
             self.client.connect(self.addr)
-            self.player_id = pickle.loads(self.client.recv(BUFFER_SIZE))
+            send_frame(
+                self.client,
+                codec.encode_hello(self.username, self.room, self.token)
+            )
+            self.frames = FrameReader(self.client)
+            self.player_id, self.token, self.resumed = codec.decode_welcome(
+                self.frames.read()
+            )
+            # Each connection has its own compression stream.
+            self.decompressor = None
+            self.synced = False
+            self.keys = None
+            self.sent_state = None
+            if self.compress:
+                send_frame(
+                    self.client,
+                    codec.encode_compression(compression.METHODS)
+                )
             return True
-        except socket.error as e:
+        except (socket.error, EOFError) as e:
             raise ServerError(f'Could not connect to server. Error: {e}.')
 
+    def reconnect(self) -> None:
+        """Connect again after the connection dropped.
+
+        The session is resumed, keeping the player id and the player as
+        the other clients see it, if the server still holds it. Else
+        this is a new player, with a new player_id.
+        """
+        self.client.close()
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # The server starts the new connection with a keyframe.
+        self.ack = 0
+        self.data = self._connect()
+
     def _send(self, player_attributes: dict) -> dict:
+        """Send the player's attributes, at most send_rate times a
+        second and only if they changed since last sent, else every
+        KEEPALIVE_INTERVAL, and apply any snapshots pushed by the server
+        since the last call.
+
+        When sending inputs, once synced, the commands given to
+        `command` are sent instead: as soon as the keys held change, and
+        else at the send rate, or every KEEPALIVE_INTERVAL while no keys
+        are held.
+        """
         try:
-            self.client.send(pickle.dumps(player_attributes))
-            return pickle.loads(self.client.recv(BUFFER_SIZE))
-        except EOFError as e:
+            now = time.monotonic()
+            self._send_update(player_attributes, now)
+            changed = self._receive()
+            if self.players is not self.shown:
+                self.shown, self.shown_at = self.players, now
+            return changed
+        except (EOFError, OSError) as e:
+            self._recover(e)
+            return {}
+
+    def start(self) -> None:
+        """Exchange with the server on a thread of its own from now on,
+        the game loop calling `exchange` instead of `_send`."""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def exchange(self, player_attributes: dict) -> dict:
+        """Leave the player's attributes for the network thread to send
+        as `_send` would, and return the fields of the players which
+        changed since the last call, as `_apply_snapshot` does. Never
+        waits on the network."""
+        if self.error is not None:
+            raise self.error
+
+        if player_attributes != self.posted:
+            self.posted = dict(player_attributes)
+            self.outbox.put(self.posted)
+        received = self.inbox.take()
+        if received is None:
+            return {}
+        received_at, snapshot = received
+        changed = _changes(self.shown, snapshot)
+        self.shown, self.shown_at = snapshot, received_at
+        return changed
+
+    def _run(self) -> None:
+        """Send the latest update from the game loop and hand it the
+        latest snapshot, until stopped or the server is lost."""
+        update = None
+        posted = self.players
+        while self.running:
+            update = self.outbox.take(update)
+            try:
+                while self.said:
+                    send_frame(self.client, self.said.popleft())
+                if update is not None:
+                    self._send_update(update, time.monotonic())
+                self._receive()
+                if self.players is not posted:
+                    posted = self.players
+                    self.inbox.put((time.monotonic(), posted))
+                self._ready(POLL_INTERVAL)
+            except (EOFError, OSError) as e:
+                try:
+                    self._recover(e)
+                except ServerError as error:
+                    self.error = error
+                    self.running = False
+            except Exception as error:
+                # Raised to the game loop by `exchange`, rather than
+                # leaving it without a network.
+                self.error = error
+                self.running = False
+
+    def command(self, keys: int, ms: int) -> tuple:
+        """Number the input command of a frame, keys held for ms, to
+        send to the server and predict the player with (see
+        `network.prediction`), and return it."""
+        command = self.prediction.command(keys, ms)
+        self.commands.append(command)
+        return command
+
+    def _send_update(self, player_attributes: dict, now: float) -> None:
+        if self.send_inputs and self.synced:
+            self._send_inputs(now)
+        elif now - self.last_due >= self.send_interval:
+            self.last_due = now
+            message = codec.encode_state(self.ack, player_attributes)
+            state = codec.state_fields(message)
+            if (
+                state == self.sent_state
+                and now - self.last_sent < KEEPALIVE_INTERVAL
+            ):
+                self.updates_skipped += 1
+                return
+            send_frame(self.client, message)
+            self.sent_state = state
+            self.last_sent = now
+            self.updates_sent += 1
+            self.synced = True
+            # The state sent is where the commands so far left the player.
+            self._take_commands()
+            self.unsent.clear()
+
+    def _recover(self, error: Exception) -> None:
+        """Reconnect after the connection dropped with error."""
+        try:
+            self.reconnect()
+        except ServerError:
             raise ServerError(
-                f'Could not receive data from server. Error: {e}.'
+                f'Could not receive data from server. Error: {error}.'
             )
 
+    def _take_commands(self) -> None:
+        """Move the commands given so far to unsent, popping them one
+        at a time as the game loop may be appending."""
+        while self.commands:
+            self.unsent.append(self.commands.popleft())
+
+    def _send_inputs(self, now: float) -> None:
+        self._take_commands()
+        unsent = self.unsent
+        if self.keys == 0:
+            # No keys held, as the server already has it: the commands
+            # standing still change nothing, but the latest is kept to
+            # send as a keepalive.
+            while len(unsent) > 1 and unsent[0][1] == 0:
+                unsent.popleft()
+        if not unsent:
+            return
+        if all(keys == self.keys for _, keys, _ in unsent):
+            if now - self.last_due < self.send_interval:
+                return
+            self.last_due = now
+            if self.keys == 0 and now - self.last_sent < KEEPALIVE_INTERVAL:
+                self.updates_skipped += 1
+                return
+        while unsent:
+            commands = []
+            while unsent and len(commands) < codec.MAX_COMMANDS:
+                commands.append(unsent.popleft())
+            send_frame(self.client, codec.encode_input(
+                self.ack,
+                commands[0][0],
+                [(keys, ms) for _, keys, ms in commands]
+            ))
+        self.keys = commands[-1][1]
+        self.last_sent = self.last_due = now
+        self.updates_sent += 1
+
+    def say(self, payload: dict) -> None:
+        """Send a chat message to the players in the room through the
+        server."""
+        message = codec.encode_say(json.dumps(payload))
+        if self.thread is not None:
+            # Only the network thread writes to the socket.
+            self.said.append(message)
+            return None
+        try:
+            send_frame(self.client, message)
+        except OSError as e:
+            raise ServerError(f'Could not send chat message. Error: {e}.')
+
+    def take_chat(self) -> list:
+        """Return the chat messages received since the last call, in
+        the order they were said."""
+        messages = []
+        while self.chat:
+            messages.append(self.chat.popleft())
+        return messages
+
+    def _ready(self, timeout: float = 0) -> bool:
+        """Whether data from the server is waiting to be read, or
+        arrives within timeout seconds."""
+        readable, _, _ = select.select([self.client], [], [], timeout)
+        return bool(readable)
+
+    def _receive(self) -> dict:
+        """Read every snapshot waiting on the socket without blocking
+        and apply the latest one."""
+        data = None
+        while self._ready():
+            message = self.frames.read()
+            received_type = codec.message_type(message)
+            if received_type == codec.COMPRESSED:
+                # Decompressed even if skipped, to follow the stream.
+                message = self._decompress(message)
+                received_type = codec.message_type(message)
+            if received_type == codec.HEARTBEAT:
+                continue
+            if received_type == codec.INPUT_ACK:
+                self.acks.put(codec.decode_input_ack(message))
+                continue
+            if received_type == codec.CHAT:
+                message_id, text = codec.decode_chat(message)
+                self.chat.append({'id': message_id, 'data': text})
+                continue
+            # Each delta is against a snapshot we acknowledged, so
+            # older snapshots can be skipped.
+            data = bytes(message)
+
+        if data is None:
+            return {}
+
+        return self._apply_snapshot(data)
+
+    def _decompress(self, message: bytes) -> bytes:
+        method, payload = codec.decode_compressed(message)
+        if self.decompressor is None:
+            self.decompressor = Decompressor(method)
+        return self.decompressor.decompress(payload)
+
+    def _apply_snapshot(self, data: bytes) -> dict:
+        """Apply a snapshot from the server and return the fields of the
+        players which changed since the last one (see
+        `codec.snapshot_fields`), None for the players removed."""
+        seq = codec.decode_snapshot(data, self.snapshots)
+        if seq is None:
+            # The baseline has dropped out of our history, acknowledging
+            # nothing makes the server send a keyframe.
+            self.ack = 0
+            return {}
+
+        snapshot = self.snapshots.get(seq)
+        changed = _changes(self.players, snapshot)
+        self.players = snapshot
+        self.ack = seq
+
+        return changed
+
 
 def fetch_player_data(
     this_player: Player,
-    other_players: dict[int, Player],
+    other_players: dict[int, RemotePlayer],
     net: Network
 ) -> None:
     """Send and receive player data from the server."""
 
-    response = net._send(this_player.attributes)
+    if net.thread is None:
+        response = net._send(this_player.attributes)
+    else:
+        response = net.exchange(this_player.attributes)
+    # The server started a new session after a reconnect.
+    this_player.id = net.player_id
+
+    acknowledged = net.acks.take()
+    if acknowledged is not None:
+        net.prediction.reconcile(this_player, *acknowledged)
 
-    for data in response.values():
-        if data['id'] == this_player.id:
+    for player_id, fields in response.items():
+        if player_id == this_player.id:
+            continue
+        # Gone from the snapshot, this player has disconnected.
+        if fields is None:
+            _delete_player(other_players, player_id)
             continue
         # No players have connected yet.
-        if data['username'] is None:
-            return None
-        # Xpos was set to None, so this player has disconnected.
-        if data['x'] is None:
-            _delete_player(other_players, data)
-            return None
+        if fields[USERNAME] is None:
+            continue
+
+        _update_player(other_players, player_id, fields)
+
+    net.interpolation.add(net.shown_at, net.shown)
+    _interpolate(other_players, net.interpolation, time.monotonic())
+
+
+def _interpolate(
+    other_players: dict[int, RemotePlayer],
+    interpolation: Interpolation,
+    now: float
+) -> None:
+    """Move the remote players to where they are drawn at now."""
+    for player_id, player in other_players.items():
+        position = interpolation.position(player_id, now)
+        if position is not None:
+            player.x, player.y = position
 
-        _update_player(other_players, data)
 
+def _changes(old: dict, new: dict) -> dict:
+    """Return the fields of the players which changed between two
+    snapshots, None for those removed."""
+    changed = {
+        player_id: fields
+        for player_id, fields in new.items()
+        if old.get(player_id) != fields
+    }
+    for player_id in old.keys() - new.keys():
+        changed[player_id] = None
+    return changed
 
-def _delete_player(other_players: dict[int, Player], data: dict) -> None:
+
+def _delete_player(
+    other_players: dict[int, RemotePlayer],
+    player_id: int
+) -> None:
     try:
-        del other_players[data['id']]
+        player = other_players.pop(player_id)
     except KeyError as e:
-        print(
-            f'Could not delete player ({data["username"]},'
-            f' id: {data["id"]}). Error: {e}.'
-        )
+        print(f'Could not delete player (id: {player_id}). Error: {e}.')
     else:
-        print(f'Deleted player with id {data["id"]}.')
-        print(f'{data["username"]} disconnected.')
+        print(f'Deleted player with id {player_id}.')
+        print(f'{player.username} disconnected.')
 
 
-def _update_player(other_players: dict[int, Player], data: dict) -> None:
+def _update_player(
+    other_players: dict[int, RemotePlayer],
+    player_id: int,
+    fields: tuple
+) -> None:
     """Update player data from the server if player has been created,
     otherwise create the player."""
     try:
-        player = other_players[data['id']]
+        player = other_players[player_id]
     except KeyError:
-        _create_player(other_players, data)
-        print(f'{data["username"]} connected.')
+        _create_player(other_players, player_id, fields)
+        print(f'{fields[USERNAME]} connected.')
     else:
-        for attribute, value in data.items():
-            if attribute == '_current_step':
-                setattr(player, 'walk_count', value)
-            else:
-                setattr(player, attribute, value)
-
-
-def _create_player(other_players: dict[int, Player], data: dict) -> None:
-    other_players[data['id']] = Player(
-        (data['x'], data['y']),
-        data['id'],
-        data['username']
-    )
+        player.update(fields)
+
+
+def _create_player(
+    other_players: dict[int, RemotePlayer],
+    player_id: int,
+    fields: tuple
+) -> None:
+    other_players[player_id] = RemotePlayer(player_id, fields)
@@ -0,0 +1,81 @@
+"""Client side prediction of the local player, when the server moves it
+from the keys held (see `codec.INPUT`).
+
+The local player is moved on every frame right away, and the frame is
+kept as a numbered input command until the server acknowledges it. The
+server answers with the last command it applied and the player's state
+after it: the player is put back in that state, and the commands the
+server has not applied yet are replayed on top, through the same
+`Player.update` as when they were first played. If the server moved the
+player as predicted, nothing shows; if not, the player is corrected.
+"""
+from collections import deque
+from enums.base import Base, Network_
+from game.player import Player
+from network import codec
+
+PENDING_INPUTS = Network_.PENDING_INPUTS.value
+TIME_DIFF_MULTIPLYER = Base.TIME_DIFF_MULTIPLYER.value
+
+FLAGS = len(codec.NUMBER_FIELDS)  # The flags in the fixed fields.
+# The attributes the server has the last word on, restored from its
+# acknowledgement. The animation is left to the client.
+CORRECTED_FLAGS = tuple(
+    (i, attribute) for i, attribute in enumerate(codec.FLAG_FIELDS)
+    if attribute in ('left', 'right', 'up', 'down', 'standing')
+)
+
+
+class Prediction:
+    """The input commands the server has not acknowledged yet, oldest
+    first, as (sequence number, keys held, milliseconds).
+
+    Only the last PENDING_INPUTS commands are kept: if the server falls
+    further behind, the oldest ones are not replayed.
+    """
+
+    def __init__(self, size: int = PENDING_INPUTS):
+        self.pending = deque(maxlen=size)
+        self.seq = 0  # The last command numbered.
+        self.corrections = 0  # Acknowledgements which moved the player.
+
+    def command(self, keys: int, ms: int) -> tuple:
+        """Number the command of a frame, held keys for ms, and keep it
+        until acknowledged."""
+        self.seq = (self.seq + 1) & codec.INPUT_SEQUENCE_MASK
+        command = (self.seq, keys, min(ms, codec.MAX_COMMAND_MS))
+        self.pending.append(command)
+        return command
+
+    def acknowledge(self, seq: int) -> None:
+        """Forget the commands up to seq, which the server applied."""
+        while self.pending and not _later(self.pending[0][0], seq):
+            self.pending.popleft()
+
+    def reconcile(self, player: Player, seq: int, fields: tuple) -> None:
+        """Put the player in the state the server left it in after
+        command seq (the fixed fields of `codec.decode_input_ack`) and
+        replay the commands after it."""
+        self.acknowledge(seq)
+        predicted = player.x, player.y
+        walk_count = player.walk_count
+
+        player.x, player.y = fields[0], fields[1]
+        flags = codec.FLAG_VALUES[fields[FLAGS]]
+        for i, attribute in CORRECTED_FLAGS:
+            setattr(player, attribute, flags[i])
+        for _, keys, ms in self.pending:
+            player.update(ms * TIME_DIFF_MULTIPLYER, keys)
+
+        player.walk_count = walk_count
+        if (
+            abs(player.x - predicted[0]) > 1 / codec.POSITION_SCALE
+            or abs(player.y - predicted[1]) > 1 / codec.POSITION_SCALE
+        ):
+            self.corrections += 1
+
+
+def _later(seq: int, other: int) -> bool:
+    """Whether sequence number seq comes after other, across wrapping."""
+    difference = (seq - other) & codec.INPUT_SEQUENCE_MASK
+    return 0 < difference <= codec.INPUT_SEQUENCE_MASK // 2
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from enums.base import Network_
+from typing import Optional
+
+SNAPSHOT_HISTORY = Network_.SNAPSHOT_HISTORY.value
+
+
+class SnapshotHistory:
+    """The most recent snapshots of the players, by sequence number.
+
+    A snapshot maps each player id to the tuple of its networked fields
+    (see `codec.snapshot_fields`). Deltas are encoded and applied
+    against a snapshot from the history, so both the client and the
+    server keep one.
+    """
+
+    def __init__(self, size: int = SNAPSHOT_HISTORY):
+        self.size = size
+        self.snapshots = OrderedDict()
+        self.seq = 0  # Sequence number of the latest snapshot, 0 if none.
+
+    def __contains__(self, seq: int) -> bool:
+        return seq in self.snapshots
+
+    @property
+    def latest(self) -> dict:
+        return self.snapshots.get(self.seq, {})
+
+    def get(self, seq: int) -> Optional[dict]:
+        return self.snapshots.get(seq)
+
+    def add(self, snapshot: dict) -> int:
+        """Store a new snapshot and return its sequence number."""
+        return self.put(self.seq + 1, snapshot)
+
+    def put(self, seq: int, snapshot: dict) -> int:
+        """Store a snapshot under a sequence number chosen by the
+        server."""
+        self.snapshots[seq] = snapshot
+        self.seq = seq
+
+        while len(self.snapshots) > self.size:
+            self.snapshots.popitem(last=False)
+
+        return seq
@@ -0,0 +1,99 @@
+import time
+
+from network import codec
+from network.framing import frame
+from network.snapshots import SnapshotHistory
+from typing import Optional
+
+
+class SnapshotCache:
+    """Memoize the encoding of the latest snapshot.
+
+    The version is the sequence number of the latest snapshot in
+    history, which is bumped whenever the players change. Within a
+    version every player record is packed once per baseline state of
+    that player, and shared by every client which is sent it. When a
+    client sees every player, now and in its baseline, the whole framed
+    message is shared too, so it is serialized once per baseline instead
+    of once per client.
+    """
+
+    def __init__(self, history: SnapshotHistory):
+        self.history = history
+        self.version = None
+        self.frames = {}
+        self.records = {}
+        self.hits = 0  # Messages shared with another client.
+        self.misses = 0  # Messages serialized.
+        self.record_hits = 0
+        self.record_misses = 0
+        self.serialize_time = 0.0  # Seconds spent encoding snapshots.
+
+    def get(
+        self,
+        baseline_seq: int,
+        baseline: dict,
+        view: Optional[dict] = None
+    ) -> memoryview:
+        """Return the view of the latest snapshot framed and encoded
+        against the baseline, a baseline_seq of 0 being a keyframe.
+
+        view defaults to every player.
+        """
+        if self.version != self.history.seq:
+            self.version = self.history.seq
+            self.frames.clear()
+            self.records.clear()
+
+        # Clients only share a frame if they also share its baseline,
+        # which those seeing every player at the time do.
+        shared = (view is None or view is self.history.latest) and (
+            baseline_seq == 0 or baseline is self.history.get(baseline_seq)
+        )
+        if shared:
+            data = self.frames.get(baseline_seq)
+            if data is not None:
+                self.hits += 1
+                return data
+
+        self.misses += 1
+        started = time.perf_counter()
+        data = memoryview(frame(codec.encode_snapshot(
+            self.history.seq,
+            baseline_seq,
+            baseline,
+            self.history.latest if view is None else view,
+            self._pack_record
+        )))
+        self.serialize_time += time.perf_counter() - started
+
+        if shared:
+            self.frames[baseline_seq] = data
+        return data
+
+    def _pack_record(
+        self,
+        player_id: int,
+        previous: Optional[tuple],
+        fields: tuple
+    ) -> bytes:
+        key = (player_id, previous)
+        record = self.records.get(key)
+        if record is None:
+            self.record_misses += 1
+            record = self.records[key] = codec.pack_record(
+                player_id, previous, fields
+            )
+        else:
+            self.record_hits += 1
+        return record
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'record_hits': self.record_hits,
+            'record_misses': self.record_misses,
+            'serialize_ms': self.serialize_time * 1000,
+        }
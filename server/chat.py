@@ -0,0 +1,100 @@
+"""Saving the chat said over the game connections to Redis.
+
+The server sends each chat message to the players in the room itself
+(see `Server._say`), so the clients never read Redis. Messages are
+still saved once, for the clients chatting through Redis, by a thread
+of their own so that a slow or unreachable Redis never holds up the
+server.
+"""
+import queue
+import redis
+import threading
+
+from enums.base import Redis
+from game.redis import RedisClient
+from logger import get_logger
+
+log = get_logger(__name__)
+
+MAX_PENDING_MESSAGES = Redis.MAX_PENDING_MESSAGES.value
+
+# What the clients read from every chat message (see
+# `ChatBox.save_message`), and from each of its rects.
+MESSAGE_FIELDS = {
+    'username': str,
+    'text': str,
+    'username_rect': dict,
+    'text_rect': dict,
+}
+RECT_FIELDS = ('x', 'y', 'width', 'height')
+
+
+def is_valid_message(payload) -> bool:
+    """Whether payload has every field the clients draw a chat message
+    from, of the right type."""
+    if not isinstance(payload, dict):
+        return False
+    for field, field_type in MESSAGE_FIELDS.items():
+        if not isinstance(payload.get(field), field_type):
+            return False
+    return all(
+        isinstance(payload[rect].get(field), (int, float))
+        and not isinstance(payload[rect][field], bool)
+        for rect in ('username_rect', 'text_rect')
+        for field in RECT_FIELDS
+    )
+
+
+class ChatStore:
+    """Save chat messages to Redis on a thread of its own.
+
+    Messages saved while max_pending are still waiting are dropped.
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        max_pending: int = MAX_PENDING_MESSAGES
+    ):
+        self.redis = redis_client
+        self.queue = queue.Queue(max_pending)
+        self.saved = 0
+        self.dropped = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, message_id: str, payload: dict) -> None:
+        try:
+            self.queue.put_nowait((message_id, payload))
+        except queue.Full:
+            self.dropped += 1
+            log.warning(f'Chat store full, dropped message {message_id}.')
+
+    def close(self) -> None:
+        """Save the messages waiting, then stop."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self) -> None:
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            message_id, payload = message
+            try:
+                self.redis.save_message(payload, message_id)
+            except redis.exceptions.RedisError as e:
+                self.errors += 1
+                log.warning(f'Could not save message {message_id}: {e}')
+            else:
+                self.saved += 1
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'pending': self.queue.qsize(),
+            'saved': self.saved,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
@@ -0,0 +1,177 @@
+"""Share the players of each room between the nodes of a cluster.
+
+Every node owns its local connections. Each tick, a node publishes the
+snapshot of its own players in a room to the room's Redis channel,
+delta encoded against the snapshot it published before, and merges the
+players published by the other nodes into the snapshot it pushes to
+its clients. Player ids are unique across the cluster as each node
+hands them out from its own block.
+"""
+import math
+import os
+import redis
+import struct
+import time
+
+from enums.base import Cluster as Cluster_
+from enums.base import Redis
+from game.errors import ConfigError
+from game.utils import check_os_config
+from logger import get_logger
+from network import codec
+from network.snapshots import SnapshotHistory
+
+log = get_logger(__name__)
+
+CHANNEL_PREFIX = Cluster_.CHANNEL_PREFIX.value
+PLAYER_IDS_PER_NODE = Cluster_.PLAYER_IDS_PER_NODE.value
+KEYFRAME_INTERVAL = Cluster_.KEYFRAME_INTERVAL.value
+NODE_TIMEOUT = Cluster_.NODE_TIMEOUT.value
+ERROR_LOG_INTERVAL = Cluster_.ERROR_LOG_INTERVAL.value
+SOCKET_CONNECT_TIMEOUT = Redis.SOCKET_CONNECT_TIMEOUT.value
+# Overridden by REDIS_PORT, to run a local cluster against a test server.
+REDIS_PORT = int(os.environ.get('REDIS_PORT', Redis.PORT.value))
+# Player ids are sent as unsigned shorts.
+MAX_NODES = (1 << 16) // PLAYER_IDS_PER_NODE
+
+NODE = struct.Struct('!H')
+
+
+class Peer:
+    """The players of a room on another node."""
+
+    def __init__(self):
+        self.snapshots = SnapshotHistory()
+        self.last_seen = time.monotonic()
+
+
+class ClusterRoom:
+    """A room's link to the same room on the other nodes.
+
+    Only the tick thread of the room calls it. While Redis is down the
+    room carries on with its own players and the remote players it last
+    heard of, until their nodes time out.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.StrictRedis,
+        node_id: int,
+        name: str,
+        keyframe_interval: int = KEYFRAME_INTERVAL,
+        node_timeout: float = NODE_TIMEOUT
+    ):
+        self.redis = redis_client
+        self.node_id = node_id
+        self.channel = f'{CHANNEL_PREFIX}{name}'
+        self.keyframe_interval = keyframe_interval
+        self.node_timeout = node_timeout
+        self.published = SnapshotHistory()
+        self.sent_since_keyframe = keyframe_interval
+        self.peers = {}
+        self.redis_errors = 0
+        self.error_logged_at = -math.inf
+
+        self.pubsub = redis_client.pubsub()
+        self.pubsub.subscribe(self.channel)
+
+    def publish(self, snapshot: dict) -> None:
+        """Publish the snapshot of this node's players if it changed,
+        and a keyframe every keyframe_interval calls."""
+        if self.sent_since_keyframe >= self.keyframe_interval:
+            baseline_seq, baseline = 0, {}
+            self.sent_since_keyframe = 0
+        elif snapshot != self.published.latest:
+            baseline_seq = self.published.seq
+            baseline = self.published.latest
+        else:
+            self.sent_since_keyframe += 1
+            return None
+
+        self.sent_since_keyframe += 1
+        seq = self.published.add(snapshot)
+        try:
+            self.redis.publish(self.channel, NODE.pack(self.node_id) + (
+                codec.encode_snapshot(seq, baseline_seq, baseline, snapshot)
+            ))
+        except redis.exceptions.RedisError as e:
+            self._redis_error('publish', e)
+            # The other nodes missed this baseline.
+            self.sent_since_keyframe = self.keyframe_interval
+
+    def poll(self) -> None:
+        """Apply every snapshot published by the other nodes since the
+        last poll, without blocking."""
+        try:
+            while True:
+                # Subscribe confirmations are read rather than ignored,
+                # as redis-py returns None for an ignored message too.
+                message = self.pubsub.get_message()
+                if message is None:
+                    break
+                if message['type'] == 'message':
+                    self._apply(message['data'])
+        except redis.exceptions.RedisError as e:
+            self._redis_error('poll', e)
+
+        now = time.monotonic()
+        for node_id, peer in list(self.peers.items()):
+            if now - peer.last_seen > self.node_timeout:
+                del self.peers[node_id]
+                log.warning(f'Node {node_id} timed out, dropped its players.')
+
+    def players(self) -> dict:
+        """Return the snapshot of the players on the other nodes."""
+        snapshot = {}
+        for peer in self.peers.values():
+            snapshot.update(peer.snapshots.latest)
+        return snapshot
+
+    def _redis_error(self, action: str, error: Exception) -> None:
+        """Count a Redis error, logging one every ERROR_LOG_INTERVAL
+        seconds at most."""
+        self.redis_errors += 1
+        now = time.monotonic()
+        if now - self.error_logged_at >= ERROR_LOG_INTERVAL:
+            self.error_logged_at = now
+            log.warning(
+                f'Could not {action} {self.channel} ({self.redis_errors}'
+                f' Redis errors so far): {error}'
+            )
+
+    def _apply(self, data: bytes) -> None:
+        (node_id,) = NODE.unpack_from(data)
+        if node_id == self.node_id:
+            return None
+
+        peer = self.peers.get(node_id)
+        if peer is None:
+            peer = self.peers[node_id] = Peer()
+            log.info(f'Node {node_id} joined {self.channel}.')
+
+        peer.last_seen = time.monotonic()
+        if codec.decode_snapshot(data[NODE.size:], peer.snapshots) is None:
+            log.debug(f'Waiting for a keyframe from node {node_id}.')
+
+
+class Cluster:
+    """This node's membership of the cluster."""
+
+    def __init__(self, node_id: int, redis_client: redis.StrictRedis = None):
+        if not 0 <= node_id < MAX_NODES:
+            raise ConfigError(
+                f'Node id must be between 0 and {MAX_NODES - 1}.'
+            )
+
+        self.node_id = node_id
+        self.first_player_id = node_id * PLAYER_IDS_PER_NODE
+        if redis_client is None:
+            redis_client = redis.StrictRedis(
+                host=check_os_config('HOST'),
+                port=REDIS_PORT,
+                socket_connect_timeout=SOCKET_CONNECT_TIMEOUT
+            )
+        self.redis = redis_client
+
+    def room(self, name: str) -> ClusterRoom:
+        return ClusterRoom(self.redis, self.node_id, name)
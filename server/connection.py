@@ -0,0 +1,247 @@
+import asyncio
+import threading
+import time
+
+from collections import deque
+from network import codec
+from network.compression import Compressor
+from network.framing import HEADER, frame
+from server.broadcast import SnapshotCache
+from server.deltas import ClientDeltas
+from typing import Callable, Optional
+
+HEARTBEAT = memoryview(frame(codec.encode_heartbeat()))
+
+
+class Outbox:
+    """The next message to send to a client: the latest snapshot wins.
+
+    A snapshot put while the previous one is still waiting replaces it,
+    as it is encoded against what the client acknowledged and the stale
+    one is of no use any more. Messages posted, such as chat, are all
+    sent in order, ahead of the snapshot. lag is how long the client has
+    been waiting on data it is owed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = deque()  # When each was posted, and the message.
+        self.pending = None
+        self.pending_since = None
+        self.in_flight_since = None
+        self.last_put = time.monotonic()
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def put(self, data: bytes) -> None:
+        with self.lock:
+            self.last_put = time.monotonic()
+            if self.pending is None:
+                self.pending_since = self.last_put
+            else:
+                self.dropped += 1
+            self.pending = data
+            self.queued += 1
+
+    def post(self, data: bytes) -> None:
+        with self.lock:
+            self.last_put = time.monotonic()
+            self.messages.append((self.last_put, data))
+            self.queued += 1
+
+    def take(self) -> Optional[bytes]:
+        """Return the message to send next, None if there is none."""
+        with self.lock:
+            if self.messages:
+                self.in_flight_since, data = self.messages.popleft()
+                return data
+            data, self.pending = self.pending, None
+            if data is not None:
+                self.in_flight_since = self.pending_since
+                self.pending_since = None
+            return data
+
+    def done(self) -> None:
+        """Record the message taken as sent."""
+        with self.lock:
+            self.in_flight_since = None
+            self.sent += 1
+
+    @property
+    def depth(self) -> int:
+        """The messages waiting or being sent."""
+        return (
+            len(self.messages)
+            + (self.pending is not None)
+            + (self.in_flight_since is not None)
+        )
+
+    def lag(self, now: float = None) -> float:
+        """Seconds since the oldest message not yet sent was put."""
+        since = min(
+            (
+                since for since in (
+                    self.in_flight_since,
+                    self.messages[0][0] if self.messages else None,
+                    self.pending_since
+                )
+                if since is not None
+            ),
+            default=None
+        )
+        if since is None:
+            return 0.0
+        return (now or time.monotonic()) - since
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'queued': self.queued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'lag_ms': self.lag() * 1000,
+        }
+
+
+class Connection:
+    """A client connection which the server pushes snapshots to.
+
+    Pushing only puts the snapshot in the outbox, a sender thread per
+    connection writes it out with send, a blocking write of framed
+    data, so a slow client only holds up itself. abort closes the
+    connection under the client, to evict it.
+
+    Once the client negotiated compression, large messages are
+    compressed by the sender, just before they are sent, so the tick
+    is not slowed down and the snapshots it drops are never compressed.
+    """
+
+    def __init__(
+        self,
+        player_id: int,
+        send: Callable[[bytes], None],
+        cache: SnapshotCache,
+        abort: Callable[[], None] = None
+    ):
+        self.player_id = player_id
+        self.send = send
+        self.abort = abort
+        self.cache = cache
+        self.deltas = ClientDeltas(cache.history)
+        self.outbox = Outbox()
+        self.ready = threading.Event()
+        self.closed = False
+        self.last_received = time.monotonic()
+        self.compressor: Optional[Compressor] = None
+
+    def push(self, view: Optional[dict] = None) -> Optional[memoryview]:
+        """Queue the client's view of the latest snapshot, every player
+        by default, unless the client already has it.
+
+        Returns the framed message queued, None if there was none.
+        """
+        if self.deltas.up_to_date:
+            return None
+
+        if view is None:
+            view = self.cache.history.latest
+        if self.deltas.unchanged(view):
+            return None
+
+        baseline_seq = self.deltas.next_baseline(view)
+        data = self.cache.get(
+            baseline_seq, self.deltas.baseline(baseline_seq), view
+        )
+        self.outbox.put(data)
+        self.ready.set()
+        return data
+
+    def post(self, data: bytes) -> None:
+        """Queue a framed message which must reach the client."""
+        self.outbox.post(data)
+        self.ready.set()
+
+    def heartbeat(self) -> None:
+        """Queue a heartbeat, unless something is already being sent."""
+        if not self.outbox.depth:
+            self.outbox.put(HEARTBEAT)
+            self.ready.set()
+
+    def flush(self) -> bool:
+        """Send the messages waiting in the outbox, if any.
+
+        Returns whether anything was sent.
+        """
+        sent = False
+        while True:
+            data = self.outbox.take()
+            if data is None:
+                return sent
+            self.send(self.compress(data))
+            self.outbox.done()
+            sent = True
+
+    def compress(self, data: memoryview) -> bytes:
+        """Compress a framed message if compression was negotiated and
+        the message is large enough."""
+        compressor = self.compressor
+        if compressor is None or (
+            len(data) - HEADER.size < compressor.threshold
+        ):
+            return data
+        return frame(codec.encode_compressed(
+            compressor.method, compressor.compress(data[HEADER.size:])
+        ))
+
+    def run_sender(self) -> None:
+        """Send the outbox until the connection is closed, on the
+        connection's own sender thread."""
+        while not self.closed:
+            self.ready.wait()
+            self.ready.clear()
+            try:
+                self.flush()
+            except OSError:
+                # The receiving thread handles the disconnect.
+                break
+
+    def close(self) -> None:
+        self.closed = True
+        self.ready.set()
+
+
+class AsyncConnection(Connection):
+    """A connection sending its outbox from a task on the event loop.
+
+    drain waits for the stream's buffer to empty, so a slow client
+    keeps a single message buffered at most.
+    """
+
+    def __init__(
+        self,
+        player_id: int,
+        writer: asyncio.StreamWriter,
+        cache: SnapshotCache
+    ):
+        super().__init__(
+            player_id, writer.write, cache, writer.transport.abort
+        )
+        self.drain = writer.drain
+        self.ready = asyncio.Event()
+
+    async def async_run_sender(self) -> None:
+        while not self.closed:
+            await self.ready.wait()
+            self.ready.clear()
+            while True:
+                data = self.outbox.take()
+                if data is None:
+                    break
+                try:
+                    self.send(self.compress(data))
+                    await self.drain()
+                except ConnectionError:
+                    return
+                self.outbox.done()
@@ -0,0 +1,84 @@
+from enums.base import Server_
+from network import codec
+from network.snapshots import SnapshotHistory
+from typing import Optional
+
+KEYFRAME_INTERVAL = Server_.KEYFRAME_INTERVAL.value
+
+
+class ClientDeltas:
+    """Encode snapshots for one connection as deltas against the last
+    snapshot the client acknowledged.
+
+    A client may only be sent the players around it (see
+    `server.interest`), so the views of the snapshots which were sent
+    are kept by sequence number to encode the deltas against.
+
+    A full keyframe is sent when the client has not acknowledged any
+    snapshot still in the history, and every KEYFRAME_INTERVAL
+    snapshots so a client can always recover.
+    """
+
+    def __init__(
+        self,
+        history: SnapshotHistory,
+        keyframe_interval: int = KEYFRAME_INTERVAL
+    ):
+        self.history = history
+        self.sent = SnapshotHistory()
+        self.keyframe_interval = keyframe_interval
+        self.ack = 0
+        self.sent_seq = 0  # The latest snapshot sent to the client.
+        self.sent_since_keyframe = 0
+
+    @property
+    def up_to_date(self) -> bool:
+        return self.sent_seq == self.history.seq
+
+    def acknowledge(self, seq: int) -> None:
+        self.ack = seq
+
+    def unchanged(self, view: dict) -> bool:
+        """Whether the client already has, or is being sent, the view.
+
+        Marks the latest snapshot as sent if so.
+        """
+        if self.ack not in self.sent or view != self.sent.latest:
+            return False
+
+        self.sent_seq = self.history.seq
+        return True
+
+    def next_baseline(self, view: Optional[dict] = None) -> int:
+        """Pick the baseline to encode the view of the latest snapshot
+        against, 0 for a keyframe, and record the view as sent."""
+        if self.ack not in self.sent or (
+            self.sent_since_keyframe >= self.keyframe_interval
+        ):
+            baseline_seq = 0
+            self.sent_since_keyframe = 0
+        else:
+            baseline_seq = self.ack
+
+        self.sent_since_keyframe += 1
+        self.sent_seq = self.history.seq
+        self.sent.put(
+            self.history.seq, self.history.latest if view is None else view
+        )
+
+        return baseline_seq
+
+    def baseline(self, seq: int) -> dict:
+        return self.sent.get(seq) or {}
+
+    def encode(self, view: Optional[dict] = None) -> bytes:
+        """Encode the view of the latest snapshot in history, every
+        player by default."""
+        baseline_seq = self.next_baseline(view)
+
+        return codec.encode_snapshot(
+            self.history.seq,
+            baseline_seq,
+            self.baseline(baseline_seq),
+            self.sent.latest
+        )
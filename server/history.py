@@ -0,0 +1,208 @@
+"""Where the players of a room were at each of its last ticks, to check
+what a client saw at a past time (lag compensation) and to interpolate
+between ticks.
+
+The ticks are kept in a ring of preallocated rows, as many as fit in
+the room's memory cap, each row holding the time of the tick and the
+position of every player, a column per player. Appending a tick
+overwrites the oldest row, and a time is looked up with a binary search
+of the rows, which are in the order they were recorded.
+"""
+import numpy as np
+
+from collections import deque
+from enums.base import Server_
+from typing import Optional
+
+HISTORY_BYTES = Server_.HISTORY_BYTES.value
+MIN_TICKS = 2  # Kept whatever the cap, to interpolate between.
+POSITION = np.float32
+
+
+class PlayerHistory:
+    """The positions of a room's players by tick, looked up by the
+    player ids of `Server.players`.
+
+    The column of a player who left the room is kept until every tick
+    they were recorded in has been overwritten, and then given to a new
+    player.
+    """
+
+    def __init__(self, max_bytes: int = HISTORY_BYTES, players: int = 64):
+        self.max_bytes = max_bytes
+        self.columns = {}  # Player id: column.
+        self.unused = 0  # The first column never given to a player.
+        self.left = {}  # Player id: column, of the players who left.
+        # The players who left, their column and the tick they left at.
+        self.released = deque()
+        self.ticks = 0  # Recorded since the start.
+        self.size = 0  # Rows holding a tick, at most capacity.
+        self.head = 0  # The row the next tick is recorded in.
+        self.last = None  # The snapshot recorded last.
+        self._allocate(players)
+
+    @property
+    def memory(self) -> int:
+        """Bytes taken by the rows."""
+        return self.times.nbytes + self.x.nbytes + self.y.nbytes
+
+    def record(self, timestamp: float, snapshot: dict) -> None:
+        """Append the positions of the players of a snapshot (see
+        `codec.snapshot_fields`) at timestamp, later than the last.
+
+        The snapshots are not changed once recorded, as in
+        `SnapshotHistory`: the same snapshot again is a tick where
+        nothing changed, which copies the last row.
+        """
+        if snapshot is self.last and self.size:
+            row, last = self.head, self._row(self.size - 1)
+            self.times[row] = timestamp
+            self.x[row] = self.x[last]
+            self.y[row] = self.y[last]
+            self._advance()
+            return
+
+        for player_id in self.columns.keys() - snapshot.keys():
+            column = self.left[player_id] = self.columns.pop(player_id)
+            self.released.append((player_id, column, self.ticks))
+        for player_id in snapshot.keys() - self.columns.keys():
+            column = self.left.pop(player_id, None)
+            self.columns[player_id] = (
+                column if column is not None else self._column()
+            )
+
+        row = self.head
+        self.times[row] = timestamp
+        self.x[row] = np.nan
+        self.y[row] = np.nan
+        if snapshot:
+            columns = [self.columns[player_id] for player_id in snapshot]
+            self.x[row, columns] = [fields[0] for fields in snapshot.values()]
+            self.y[row, columns] = [fields[1] for fields in snapshot.values()]
+        self.last = snapshot
+        self._advance()
+
+    def rewind(self, player_id: int, timestamp: float) -> Optional[tuple]:
+        """Return the position of a player at the last tick at or before
+        timestamp, None if they were not in it or it is not kept."""
+        column = self._column_of(player_id)
+        index = self._find(timestamp)
+        if column is None or index < 0:
+            return None
+        return self._position(self._row(index), column)
+
+    def interpolate(
+        self,
+        player_id: int,
+        timestamp: float
+    ) -> Optional[tuple]:
+        """Return the position of a player at timestamp, between the
+        ticks around it. Past the last tick, the player is where they
+        were at it."""
+        column = self._column_of(player_id)
+        index = self._find(timestamp)
+        if column is None or index < 0:
+            return None
+
+        before = self._row(index)
+        start = self._position(before, column)
+        if index == self.size - 1 or start is None:
+            return start
+        after = self._row(index + 1)
+        end = self._position(after, column)
+        if end is None:
+            return start
+
+        t0, t1 = self.times[before], self.times[after]
+        fraction = float((timestamp - t0) / (t1 - t0))
+        return (
+            start[0] + (end[0] - start[0]) * fraction,
+            start[1] + (end[1] - start[1]) * fraction
+        )
+
+    def positions(self, timestamp: float) -> dict:
+        """Return the player id: position of every player at the last
+        tick at or before timestamp."""
+        index = self._find(timestamp)
+        if index < 0:
+            return {}
+        row = self._row(index)
+        positions = {}
+        for player_id, column in [
+            *self.columns.items(), *self.left.items()
+        ]:
+            position = self._position(row, column)
+            if position is not None:
+                positions[player_id] = position
+        return positions
+
+    def _find(self, timestamp: float) -> int:
+        """Return the index, oldest first, of the last tick at or
+        before timestamp, -1 if there is none."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[self._row(middle)] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def _row(self, index: int) -> int:
+        """The row of a tick by its index, oldest first."""
+        return (self.head - self.size + index) % self.capacity
+
+    def _advance(self) -> None:
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.ticks += 1
+
+    def _position(self, row: int, column: int) -> Optional[tuple]:
+        x = self.x[row, column]
+        if np.isnan(x):
+            return None
+        return float(x), float(self.y[row, column])
+
+    def _column_of(self, player_id: int) -> Optional[int]:
+        column = self.columns.get(player_id)
+        return column if column is not None else self.left.get(player_id)
+
+    def _column(self) -> int:
+        while self.released and (
+            self.ticks - self.released[0][2] >= self.capacity
+        ):
+            player_id, column, _ = self.released.popleft()
+            # Unless the player came back and took their column again.
+            if self.left.get(player_id) == column:
+                del self.left[player_id]
+                return column
+        if self.unused == self.x.shape[1]:
+            self._allocate(2 * self.unused)
+        self.unused += 1
+        return self.unused - 1
+
+    def _allocate(self, players: int) -> None:
+        """Make room for players columns, in as many rows as fit in
+        max_bytes, keeping the latest ticks."""
+        row_bytes = np.dtype(np.float64).itemsize + (
+            2 * players * np.dtype(POSITION).itemsize
+        )
+        capacity = max(MIN_TICKS, self.max_bytes // row_bytes)
+        times = np.zeros(capacity)
+        x = np.full((capacity, players), np.nan, POSITION)
+        y = np.full((capacity, players), np.nan, POSITION)
+
+        kept = min(self.size, capacity)
+        if kept:
+            rows = [
+                self._row(index)
+                for index in range(self.size - kept, self.size)
+            ]
+            times[:kept] = self.times[rows]
+            x[:kept, :self.x.shape[1]] = self.x[rows]
+            y[:kept, :self.y.shape[1]] = self.y[rows]
+
+        self.capacity = capacity
+        self.times, self.x, self.y = times, x, y
+        self.size = kept
+        self.head = kept % capacity
@@ -0,0 +1,99 @@
+"""Area-of-interest filtering of the players sent to each client."""
+from collections import defaultdict
+from enums.base import Server_
+from game.utils import get_config
+from math import ceil
+
+config = get_config()
+
+GRID_SPACING = config['GRID_SPACING']
+# Enough cells to cover the screen around the player, plus a margin so
+# players are known just before they walk into view.
+AOI_RADIUS = ceil(
+    max(config['WINDOW_WIDTH'], config['WINDOW_HEIGHT']) / 2 / GRID_SPACING
+) + Server_.AOI_MARGIN.value
+
+
+class SpatialHash:
+    """The players in each grid cell.
+
+    Cells are the same GRID_SPACING squares the client draws its grid
+    with, so a query only touches the cells around a position instead
+    of every player.
+    """
+
+    def __init__(self, cell_size: int = GRID_SPACING):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.player_cells = {}
+
+    def cell(self, x: float, y: float) -> tuple:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def move(self, player_id: int, x: float, y: float) -> None:
+        cell = self.cell(x, y)
+        previous = self.player_cells.get(player_id)
+        if previous == cell:
+            return None
+
+        if previous is not None:
+            self._leave(player_id, previous)
+        self.cells[cell].add(player_id)
+        self.player_cells[player_id] = cell
+
+    def remove(self, player_id: int) -> None:
+        cell = self.player_cells.pop(player_id, None)
+        if cell is not None:
+            self._leave(player_id, cell)
+
+    def near(self, x: float, y: float, radius: int) -> set:
+        """Return the players within radius cells of a position."""
+        cell_x, cell_y = self.cell(x, y)
+        players = set()
+        for column in range(cell_x - radius, cell_x + radius + 1):
+            for row in range(cell_y - radius, cell_y + radius + 1):
+                players.update(self.cells.get((column, row), ()))
+        return players
+
+    def _leave(self, player_id: int, cell: tuple) -> None:
+        players = self.cells[cell]
+        players.discard(player_id)
+        if not players:
+            del self.cells[cell]
+
+
+class AreaOfInterest:
+    """Decide which players of a snapshot each client is sent.
+
+    A client sees the players within AOI_RADIUS cells of its own player.
+    Players entering or leaving that area reach the client as new or
+    removed players of the snapshot delta.
+    """
+
+    def __init__(self, radius: int = AOI_RADIUS):
+        self.radius = radius
+        self.grid = SpatialHash()
+
+    def update(self, snapshot: dict) -> None:
+        """Move the players to their positions in the snapshot."""
+        for player_id in self.grid.player_cells.keys() - snapshot.keys():
+            self.grid.remove(player_id)
+        for player_id, (x, y, *_) in snapshot.items():
+            self.grid.move(player_id, x, y)
+
+    def view(self, player_id: int, snapshot: dict) -> dict:
+        """Return the part of the snapshot a player's client is sent.
+
+        The snapshot itself is returned when every player is in view,
+        so the encoded snapshot can be shared between the clients.
+        """
+        fields = snapshot.get(player_id)
+        if fields is None:
+            # The player has not been placed on the map yet.
+            return snapshot
+
+        visible = self.grid.near(fields[0], fields[1], self.radius)
+        if len(visible) == len(snapshot):
+            return snapshot
+
+        return {player_id: snapshot[player_id] for player_id in visible}
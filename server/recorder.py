@@ -0,0 +1,120 @@
+"""Capture of the traffic of a room, to replay it (see `server.replay`).
+
+A log starts with MAGIC and the log and codec versions, followed by
+records of a fixed header (seconds since the recording started, the kind
+of record, the player id and the length of the payload) and the
+payload:
+
+- JOIN: a player joined, the payload is the username.
+- MESSAGE: a message from a client, as received.
+- LEAVE: a player's connection dropped.
+- RESUME: a player resumed their session on a new connection.
+- TICK: the server ticked.
+- SNAPSHOT: a message queued to a client by the tick, without framing.
+"""
+import struct
+import threading
+import time
+
+from game.errors import ServerError
+from network import codec
+from typing import BinaryIO, Iterator
+
+MAGIC = b'LOBBYREC'
+LOG_VERSION = 1
+FILE_HEADER = struct.Struct('!8sBB')
+RECORD_HEADER = struct.Struct('!dBHI')
+
+# Record kinds.
+JOIN = 1
+MESSAGE = 2
+LEAVE = 3
+TICK = 4
+SNAPSHOT = 5
+RESUME = 6
+
+NO_PLAYER = 0xFFFF  # The player id of records about no player.
+
+
+class Recorder:
+    """Append the traffic of a room to a log file.
+
+    Records are written by the client threads and the tick thread under
+    lock, which the server also holds while handling what it records
+    (see `Server._recording`). The file is flushed every tick.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, LOG_VERSION, codec.VERSION))
+        self.started = time.monotonic()
+        self.lock = threading.RLock()
+        self.records = 0
+
+    def join(self, player_id: int, username: str) -> None:
+        self._write(JOIN, player_id, username.encode('utf-8'))
+
+    def message(self, player_id: int, data: bytes) -> None:
+        self._write(MESSAGE, player_id, data)
+
+    def leave(self, player_id: int) -> None:
+        self._write(LEAVE, player_id)
+
+    def resume(self, player_id: int) -> None:
+        self._write(RESUME, player_id)
+
+    def tick(self) -> None:
+        with self.lock:
+            self._write(TICK, NO_PLAYER)
+            if not self.file.closed:
+                self.file.flush()
+
+    def snapshot(self, player_id: int, data: bytes) -> None:
+        self._write(SNAPSHOT, player_id, data)
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+    def _write(self, kind: int, player_id: int, data: bytes = b'') -> None:
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(RECORD_HEADER.pack(
+                time.monotonic() - self.started, kind, player_id, len(data)
+            ))
+            self.file.write(data)
+            self.records += 1
+
+
+def read_log(path: str) -> Iterator[tuple]:
+    """Yield the timestamp, kind, player id and payload of every record
+    of a log."""
+    with open(path, 'rb') as log_file:
+        _check_header(log_file)
+        while True:
+            header = log_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                # The end, or a record cut short by a crash.
+                return
+            timestamp, kind, player_id, length = RECORD_HEADER.unpack(header)
+            data = log_file.read(length)
+            if len(data) < length:
+                return
+            yield timestamp, kind, player_id, data
+
+
+def _check_header(log_file: BinaryIO) -> None:
+    header = log_file.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ServerError('Not a recording: the file is too short.')
+
+    magic, log_version, codec_version = FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ServerError('Not a recording.')
+    if log_version != LOG_VERSION or codec_version != codec.VERSION:
+        raise ServerError(
+            f'Recording of log version {log_version} and codec version'
+            f' {codec_version}, expected {LOG_VERSION} and {codec.VERSION}.'
+        )
@@ -0,0 +1,105 @@
+"""Feed a recorded session (see `server.recorder`) back into a `Server`,
+without sockets.
+
+The players join, send their messages, leave and the server ticks in
+the order they were recorded. The snapshots the server queues are
+compared with the recorded ones, so a replay also tells whether the
+server still sends what it used to.
+"""
+import time
+
+from network import codec
+from network.compression import Decompressor
+from network.framing import HEADER
+from server import recorder
+from server.connection import Connection
+from server.server import Server
+from typing import Optional
+
+
+class Replayer:
+    """Replay the records of a log into a server.
+
+    speed scales the time between the records, None replays them as
+    fast as possible.
+    """
+
+    def __init__(self, server: Server, speed: Optional[float] = 1):
+        self.server = server
+        self.speed = speed
+        self.sent = {}  # Player id: the message the server last sent.
+        self.tokens = {}  # Player id: the token to resume its session.
+        # Player id: the client's end of its compression stream.
+        self.decompressors = {}
+        self.records = 0
+        self.ticks = 0
+        self.tick_time = 0.0  # Seconds spent ticking.
+        self.matched = 0  # Snapshots sent as recorded.
+        self.mismatched = 0
+
+    def replay(self, path: str) -> None:
+        started = time.monotonic()
+        for timestamp, kind, player_id, data in recorder.read_log(path):
+            if self.speed is not None:
+                time.sleep(max(
+                    0, started + timestamp / self.speed - time.monotonic()
+                ))
+            self.feed(kind, player_id, data)
+
+    def feed(self, kind: int, player_id: int, data: bytes) -> None:
+        self.records += 1
+        if kind in (recorder.JOIN, recorder.RESUME):
+            if kind == recorder.JOIN:
+                self.tokens[player_id] = self.server.sessions.issue_token(
+                    player_id
+                )
+            else:
+                self.server.resume(self.tokens[player_id])
+            self.server._join(Connection(
+                player_id,
+                lambda message: self._sent(player_id, message),
+                self.server.snapshot_cache
+            ), data.decode('utf-8'), kind == recorder.RESUME)
+        elif kind == recorder.MESSAGE:
+            connection = self.server.connections.get(player_id)
+            if connection is not None:
+                self.server._receive(connection, data)
+        elif kind == recorder.LEAVE:
+            self.server._handle_disconnect(player_id)
+            self.decompressors.pop(player_id, None)
+        elif kind == recorder.TICK:
+            self._tick()
+        elif kind == recorder.SNAPSHOT:
+            if self.sent.pop(player_id, None) == data:
+                self.matched += 1
+            else:
+                self.mismatched += 1
+
+    def _tick(self) -> None:
+        self.sent.clear()
+        started = time.perf_counter()
+        self.server.tick()
+        self.tick_time += time.perf_counter() - started
+        self.ticks += 1
+        for connection in list(self.server.connections.values()):
+            connection.flush()
+
+    def _sent(self, player_id: int, message: bytes) -> None:
+        data = bytes(message[HEADER.size:])
+        if codec.message_type(data) == codec.COMPRESSED:
+            method, payload = codec.decode_compressed(data)
+            if player_id not in self.decompressors:
+                self.decompressors[player_id] = Decompressor(method)
+            data = self.decompressors[player_id].decompress(payload)
+        if codec.message_type(data) == codec.SNAPSHOT:
+            self.sent[player_id] = data
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'records': self.records,
+            'ticks': self.ticks,
+            'tick_ms': self.tick_time * 1000 / max(1, self.ticks),
+            'matched': self.matched,
+            'mismatched': self.mismatched,
+        }
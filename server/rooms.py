@@ -0,0 +1,325 @@
+"""Rooms: a `Server`, with its own players table and tick, per map.
+
+In a single process the rooms are served by `Rooms`. With worker
+processes a `Supervisor` accepts the connections, reads each client's
+hello and hands the socket to the worker running the client's room.
+"""
+import asyncio
+import os
+import socket
+import threading
+import time
+
+from enums.base import Server_
+from game.errors import ServerError
+from game.redis import RedisClient
+from logger import get_logger
+from multiprocessing import get_context
+from network import codec
+from network.framing import FrameReader, read_frame
+from server.chat import ChatStore
+from server.cluster import PLAYER_IDS_PER_NODE, Cluster
+from server.history import HISTORY_BYTES
+from server.recorder import Recorder
+from server.server import PROTOCOL_ERRORS, TICK_RATE, Server
+from server.simulation import Simulation, Terrain
+from typing import Callable, Optional
+
+log = get_logger(__name__)
+
+HELLO_TIMEOUT = Server_.HELLO_TIMEOUT.value
+MAX_HELLO_SIZE = 1024
+# Spawned workers only get the sockets passed to them. Forked ones would
+# keep the supervisor's end of their control socket open, and would not
+# notice the supervisor exiting.
+SPAWN = get_context('spawn')
+
+
+def room_exists(name: str) -> bool:
+    """Rooms are named after the maps loaded by `Map.load`."""
+    return (
+        os.path.basename(name) == name
+        and os.path.isfile(f'maps/{name}.pkl')
+    )
+
+
+def _start_tick_thread(room: Server) -> None:
+    threading.Thread(target=room.tick_loop, daemon=True).start()
+
+
+class Rooms:
+    """The rooms served by this process, opened as players join them.
+
+    start_tick starts the tick loop of a new room, on its own thread by
+    default. With a record_dir, the traffic of each room is recorded to
+    a log in it. The chat said in every room is saved to chat_store.
+    history_bytes caps the memory each room keeps the past positions of
+    its players in, by room name, the rooms not named taking
+    HISTORY_BYTES.
+    """
+
+    def __init__(
+        self,
+        tick_rate: int = TICK_RATE,
+        start_tick: Callable[[Server], None] = _start_tick_thread,
+        cluster: Optional[Cluster] = None,
+        record_dir: Optional[str] = None,
+        chat_store: Optional[ChatStore] = None,
+        history_bytes: Optional[dict] = None
+    ):
+        self.tick_rate = tick_rate
+        self.start_tick = start_tick
+        self.cluster = cluster
+        self.record_dir = record_dir
+        self.chat_store = chat_store
+        self.history_bytes = history_bytes or {}
+        self.rooms = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Server:
+        with self.lock:
+            room = self.rooms.get(name)
+            if room is None:
+                room = self.rooms[name] = self._open(name)
+                self.start_tick(room)
+                log.info(f'Opened room {name}.')
+        return room
+
+    def _open(self, name: str) -> Server:
+        recorder = self._recorder(name)
+        simulation = Simulation(Terrain.load(name))
+        history_bytes = self.history_bytes.get(name, HISTORY_BYTES)
+        if self.cluster is None:
+            return Server(
+                tick_rate=self.tick_rate,
+                recorder=recorder,
+                chat_store=self.chat_store,
+                simulation=simulation,
+                history_bytes=history_bytes
+            )
+
+        return Server(
+            tick_rate=self.tick_rate,
+            first_player_id=self.cluster.first_player_id,
+            player_ids=PLAYER_IDS_PER_NODE,
+            cluster=self.cluster.room(name),
+            recorder=recorder,
+            chat_store=self.chat_store,
+            simulation=simulation,
+            history_bytes=history_bytes
+        )
+
+    def _recorder(self, name: str) -> Optional[Recorder]:
+        if self.record_dir is None:
+            return None
+
+        path = os.path.join(
+            self.record_dir, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}.rec'
+        )
+        log.info(f'Recording room {name} to {path}.')
+        return Recorder(path)
+
+    def serve(self, conn: socket, addr: tuple) -> None:
+        """Read the hello of a new connection on its own thread and
+        join its room."""
+        frames = FrameReader(conn)
+        conn.settimeout(HELLO_TIMEOUT)
+        try:
+            username, name, token = codec.decode_hello(frames.read())
+        except (EOFError, OSError, *PROTOCOL_ERRORS) as e:
+            log.info(f'Connection dropped before joining ({addr}): {e}')
+            conn.close()
+            return None
+
+        conn.settimeout(None)
+        self.join(conn, frames, username, name, addr, token)
+
+    def join(
+        self,
+        conn: socket,
+        frames: FrameReader,
+        username: str,
+        name: str,
+        addr: tuple = None,
+        token: str = ''
+    ) -> None:
+        if not room_exists(name):
+            log.warning(f'No map for room "{name}" ({addr}).')
+            conn.close()
+            return None
+
+        room = self.get(name)
+        try:
+            player_id, token = _player_id(room, token)
+        except ServerError as e:
+            log.warning(f'Refused connection ({addr}) to room "{name}": {e}')
+            conn.close()
+            return None
+        log.info(
+            f'Connected by: {addr}. Room: {name}. Player id: {player_id}'
+            f'{" (resumed)" if token else ""}'
+        )
+
+        room.client(conn, player_id, username, frames, token)
+
+    async def async_serve(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """Read the hello of a new connection and join its room on the
+        event loop."""
+        addr = writer.get_extra_info('peername')
+        try:
+            username, name, token = codec.decode_hello(
+                await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+            )
+        except (
+            EOFError, ConnectionError, asyncio.TimeoutError, *PROTOCOL_ERRORS
+        ) as e:
+            log.info(f'Connection dropped before joining ({addr}): {e}')
+            writer.close()
+            return None
+
+        if not room_exists(name):
+            log.warning(f'No map for room "{name}" ({addr}).')
+            writer.close()
+            return None
+
+        room = self.get(name)
+        try:
+            player_id, token = _player_id(room, token)
+        except ServerError as e:
+            log.warning(f'Refused connection ({addr}) to room "{name}": {e}')
+            writer.close()
+            return None
+        log.info(
+            f'Connected by: {addr}. Room: {name}. Player id: {player_id}'
+            f'{" (resumed)" if token else ""}'
+        )
+
+        await room.async_client(reader, writer, player_id, username, token)
+
+
+def _player_id(room: Server, token: str) -> tuple:
+    """Return the id of the player joining the room, and the token of
+    the session they resume, empty if they start a new one."""
+    player_id = room.resume(token)
+    if player_id is None:
+        return room.next_player_id(), ''
+    return player_id, token
+
+
+def _cluster(node_id: Optional[int]) -> Optional[Cluster]:
+    return None if node_id is None else Cluster(node_id)
+
+
+def run_worker(
+    control: socket,
+    tick_rate: int = TICK_RATE,
+    node_id: Optional[int] = None,
+    record_dir: Optional[str] = None,
+    save_chat: bool = False,
+    history_bytes: Optional[dict] = None
+) -> None:
+    """Serve the connections handed over by the supervisor on control,
+    each on its own thread."""
+    rooms = Rooms(
+        tick_rate,
+        cluster=_cluster(node_id),
+        record_dir=record_dir,
+        chat_store=ChatStore(RedisClient()) if save_chat else None,
+        history_bytes=history_bytes
+    )
+    while True:
+        hello, fds, _, _ = socket.recv_fds(control, MAX_HELLO_SIZE, 1)
+        if not hello:
+            # The supervisor exited.
+            break
+
+        conn = socket.socket(fileno=fds[0])
+        try:
+            addr = conn.getpeername()
+        except OSError:
+            # The client left while being handed over.
+            conn.close()
+            continue
+
+        username, name, token = codec.decode_hello(hello)
+        threading.Thread(
+            target=rooms.join,
+            args=(conn, FrameReader(conn), username, name, addr, token)
+        ).start()
+
+
+class Supervisor:
+    """Spread the rooms over a pool of worker processes.
+
+    A room lives on a single worker, the one with the fewest rooms when
+    its first player joined, so each room's players and tick stay in
+    one process while the rooms use every core.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        tick_rate: int = TICK_RATE,
+        node_id: Optional[int] = None,
+        record_dir: Optional[str] = None,
+        save_chat: bool = False,
+        history_bytes: Optional[dict] = None
+    ):
+        self.workers = []
+        self.rooms = {}  # Room name: index of its worker.
+        self.room_counts = [0] * workers
+        self.lock = threading.Lock()
+
+        for _ in range(workers):
+            control, worker_control = socket.socketpair(
+                socket.AF_UNIX, socket.SOCK_SEQPACKET
+            )
+            process = SPAWN.Process(
+                target=run_worker,
+                args=(
+                    worker_control,
+                    tick_rate,
+                    node_id,
+                    record_dir,
+                    save_chat,
+                    history_bytes
+                ),
+                daemon=True
+            )
+            process.start()
+            worker_control.close()
+            self.workers.append((process, control))
+
+    def worker_for(self, name: str) -> socket:
+        """Return the control socket of the worker running a room."""
+        with self.lock:
+            index = self.rooms.get(name)
+            if index is None:
+                index = self.room_counts.index(min(self.room_counts))
+                self.rooms[name] = index
+                self.room_counts[index] += 1
+                log.info(f'Room {name} assigned to worker {index}.')
+        return self.workers[index][1]
+
+    def dispatch(self, conn: socket, addr: tuple) -> None:
+        """Read the hello of a new connection and hand the socket over
+        to the worker running its room."""
+        with conn:
+            conn.settimeout(HELLO_TIMEOUT)
+            try:
+                hello = bytes(FrameReader(conn).read())
+                _, name, _ = codec.decode_hello(hello)
+            except (EOFError, OSError, *PROTOCOL_ERRORS) as e:
+                log.info(f'Connection dropped before joining ({addr}): {e}')
+                return None
+
+            if not room_exists(name):
+                log.warning(f'No map for room "{name}" ({addr}).')
+                return None
+
+            conn.settimeout(None)
+            socket.send_fds(self.worker_for(name), [hello], [conn.fileno()])
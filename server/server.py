@@ -1,83 +1,516 @@
-import pickle
+import asyncio
+import json
+import math
 import socket
+import struct
+import threading
+import time
 
-from enums.base import Network_
+from collections import deque
+from contextlib import nullcontext
+from enums.base import Server_
+from functools import partial
+from game.errors import ServerError
 from logger import get_logger
-from game.utils import check_os_config, network_data
+from game.utils import check_os_config
+from network import codec, compression
+from network.compression import Compressor
+from network.framing import (
+    HEADER, FrameReader, frame, read_frame, send_frame
+)
+from network.snapshots import SnapshotHistory
+from server.broadcast import SnapshotCache
+from server.chat import ChatStore, is_valid_message
+from server.cluster import ClusterRoom
+from server.connection import AsyncConnection, Connection
+from server.history import HISTORY_BYTES, PlayerHistory
+from server.interest import AreaOfInterest
+from server.recorder import Recorder
+from server.sessions import MAX_PLAYER_IDS, SessionRegistry
+from server.simulation import Simulation
+from server.timers import TimerWheel
+from typing import ContextManager, Optional
+from uuid import uuid4
 
 log = get_logger(__name__)
 
-BUFFER_SIZE = Network_.BUFFER_SIZE.value
+TICK_RATE = Server_.TICK_RATE.value
+STATS_INTERVAL = Server_.STATS_INTERVAL.value
+SLOW_CONSUMER_TIMEOUT = Server_.SLOW_CONSUMER_TIMEOUT.value
+HEARTBEAT_INTERVAL = Server_.HEARTBEAT_INTERVAL.value
+IDLE_TIMEOUT = Server_.IDLE_TIMEOUT.value
+RESUME_GRACE = Server_.RESUME_GRACE.value
+
+# What a client sending a malformed frame raises: an oversized header,
+# an unknown codec version or a truncated payload.
+PROTOCOL_ERRORS = (ServerError, struct.error)
 
 
 class Server:
     """The Server object handles inbound and outbound data to
-    and from the server."""
+    and from the players of a single room (see `server.rooms`)."""
 
-    current_player_id = 0
     host = None
     port = None
 
-    def __init__(self, host: int = None, port: int = None):
-        self.players = {}
-        self.disconnected_player_ids = []
+    def __init__(
+        self,
+        host: int = None,
+        port: int = None,
+        tick_rate: int = TICK_RATE,
+        first_player_id: int = 0,
+        player_ids: int = MAX_PLAYER_IDS,
+        cluster: Optional[ClusterRoom] = None,
+        recorder: Optional[Recorder] = None,
+        chat_store: Optional[ChatStore] = None,
+        simulation: Optional[Simulation] = None,
+        history_bytes: int = HISTORY_BYTES
+    ):
+        self.sessions = SessionRegistry(first_player_id, player_ids)
+        # Shares the players with the same room on the other nodes.
+        self.cluster = cluster
+        # Captures the room's traffic to replay it.
+        self.recorder = recorder
+        # Saves the chat said in the room.
+        self.chat_store = chat_store
+        # Moves the players who send their inputs, on the room's map.
+        self.simulation = (
+            simulation if simulation is not None else Simulation()
+        )
+        self.snapshots = SnapshotHistory()
+        # Where the players were at the last ticks, for lag compensation.
+        self.history = PlayerHistory(history_bytes)
+        self.snapshot_cache = SnapshotCache(self.snapshots)
+        self.interest = AreaOfInterest()
+        self.connections = {}
+        # Connections added since the last tick, to start their timers.
+        self.new_connections = deque()
+        # Checks each connection for idleness every heartbeat interval.
+        self.timers = TimerWheel()
+        # Players whose connection dropped since the last tick, by their
+        # id and suspension, and the end of their grace period to
+        # resume.
+        self.suspended = deque()
+        self.resume_timers = TimerWheel()
+        self.tick_interval = 1 / tick_rate
+        self.ticks = 0
 
         Server.host = check_os_config('HOST', host)
         Server.port = check_os_config('PORT', port)
 
-    def client(self, conn: socket, player_id: int) -> None:
+    def client(
+        self,
+        conn: socket,
+        player_id: int,
+        username: str,
+        frames: FrameReader,
+        token: str = ''
+    ) -> None:
+        """Receive a single client's updates on its own thread.
+
+        The client's hello has already been read from frames to pick
+        the room. Snapshots are pushed to the client by the tick loop.
+        token is the resume token of the session the client resumes
+        (see `resume`), empty for a new player.
+        """
         with conn:
-            conn.send(pickle.dumps(player_id))
+            resumed = bool(token)
+            if not resumed:
+                token = self.sessions.issue_token(player_id)
+            send_frame(conn, codec.encode_welcome(player_id, token, resumed))
+            connection = self._join(Connection(
+                player_id,
+                conn.sendall,
+                self.snapshot_cache,
+                partial(conn.shutdown, socket.SHUT_RDWR)
+            ), username, resumed)
+            threading.Thread(
+                target=connection.run_sender, daemon=True
+            ).start()
 
-            self.players[player_id] = network_data()
+            try:
+                while True:
+                    try:
+                        self._receive(connection, frames.read())
+                    except (EOFError, ConnectionError):
+                        self._handle_disconnect(player_id, connection)
+                        break
+                    except PROTOCOL_ERRORS as error:
+                        self._protocol_violation(player_id, connection, error)
+                        break
+            finally:
+                connection.close()
+
+    async def async_client(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        player_id: int,
+        username: str,
+        token: str = ''
+    ) -> None:
+        """Receive a single client's updates as a coroutine on the
+        event loop.
 
+        This mirrors `client`, but every connection shares one thread
+        so the sessions lock is never contended.
+        """
+        resumed = bool(token)
+        if not resumed:
+            token = self.sessions.issue_token(player_id)
+        writer.write(frame(codec.encode_welcome(player_id, token, resumed)))
+        connection = self._join(
+            AsyncConnection(player_id, writer, self.snapshot_cache),
+            username,
+            resumed
+        )
+        sender = asyncio.create_task(connection.async_run_sender())
+
+        try:
             while True:
                 try:
-                    player_attributes = pickle.loads(conn.recv(BUFFER_SIZE))
-                except EOFError:
-                    self._disconnect_player(player_id)
-                    # There are no players playing.
-                    # The last player is not yet removed from the server
-                    # as the disconnected players are only checked for
-                    # if there is more than 1 player playing.
-                    if len(self.players) == 1:
-                        self._delete_disconnected_players()
-                        self._reset_players()
+                    self._receive(connection, await read_frame(reader))
+                except (EOFError, ConnectionError):
+                    self._handle_disconnect(player_id, connection)
+                    break
+                except PROTOCOL_ERRORS as error:
+                    self._protocol_violation(player_id, connection, error)
                     break
-                else:
-                    self.players[player_id] = player_attributes
+        finally:
+            connection.close()
+            sender.cancel()
+            writer.close()
+
+    @property
+    def players(self) -> dict:
+        """The player id: attributes table, not to be mutated."""
+        return self.sessions.snapshot()
+
+    def next_player_id(self) -> int:
+        return self.sessions.allocate()
+
+    def resume(self, token: str) -> Optional[int]:
+        """Return the id of the player whose session the token resumes,
+        None if it resumes none. A player stays in the room, standing,
+        for RESUME_GRACE seconds after their connection drops."""
+        if not token:
+            return None
+        return self.sessions.resume(token)
+
+    def tick(self) -> None:
+        """Build one snapshot from the latest player updates and push
+        to every client the players in its area of interest."""
+        with self._recording():
+            if self.recorder is not None:
+                self.recorder.tick()
+            self._tick()
+
+    def _tick(self) -> None:
+        self._simulate()
+        self._update_snapshot()
+        snapshot = self.snapshots.latest
+        now = time.monotonic()
+        self.history.record(now, snapshot)
+        self.interest.update(snapshot)
+        self._acknowledge_inputs(snapshot)
+
+        for connection in list(self.connections.values()):
+            data = connection.push(
+                self.interest.view(connection.player_id, snapshot)
+            )
+            if data is not None and self.recorder is not None:
+                self.recorder.snapshot(
+                    connection.player_id, data[HEADER.size:]
+                )
+            if not connection.closed and (
+                connection.outbox.lag(now) > SLOW_CONSUMER_TIMEOUT
+            ):
+                self._evict(connection, 'slow')
+
+        while self.new_connections:
+            self.timers.schedule(
+                self.new_connections.popleft(),
+                self._ticks(HEARTBEAT_INTERVAL)
+            )
+        for connection in self.timers.advance():
+            self._check_idle(connection, now)
+
+        while self.suspended:
+            self.resume_timers.schedule(
+                self.suspended.popleft(), self._ticks(RESUME_GRACE)
+            )
+        for player_id, suspension in self.resume_timers.advance():
+            self._expire_session(player_id, suspension)
+
+        if self.sessions.disconnected:
+            self._delete_disconnected_players()
+
+        self.ticks += 1
+        if self.ticks % STATS_INTERVAL == 0:
+            log.info(f'Snapshot cache: {self.snapshot_cache.stats}.')
+            log.info(f'Sessions lock: {self.sessions.lock.stats}.')
+            log.info(f'Outboxes: {self.connection_stats()}.')
+            if self.chat_store is not None:
+                log.info(f'Chat store: {self.chat_store.stats}.')
+
+    def tick_loop(self) -> None:
+        """Run the tick at a fixed rate on its own thread."""
+        next_tick = time.monotonic()
+        while True:
+            self._guarded_tick()
+            next_tick = self._next_tick(next_tick, time.monotonic())
+            time.sleep(max(0, next_tick - time.monotonic()))
+
+    async def async_tick_loop(self) -> None:
+        """Run the tick at a fixed rate on the event loop."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            self._guarded_tick()
+            next_tick = self._next_tick(next_tick, loop.time())
+            await asyncio.sleep(max(0, next_tick - loop.time()))
+
+    def _guarded_tick(self) -> None:
+        """Tick, logging what went wrong rather than stopping the room's
+        tick, and with it every client in the room."""
+        try:
+            self.tick()
+        except Exception:
+            log.exception('Tick failed.')
+
+    def _next_tick(self, next_tick: float, now: float) -> float:
+        next_tick += self.tick_interval
+        # Skip the ticks we are too far behind on instead of bursting.
+        if next_tick < now:
+            log.debug('Tick overran, skipping missed ticks.')
+            next_tick = now
+        return next_tick
+
+    def connection_stats(self) -> dict:
+        """Return the outbox metrics of every connection."""
+        return {
+            player_id: connection.outbox.stats
+            for player_id, connection in list(self.connections.items())
+        }
+
+    def _join(
+        self,
+        connection: Connection,
+        username: str,
+        resumed: bool
+    ) -> Connection:
+        """Add the player, or the connection of a resumed session,
+        taking over from the session's previous connection if it is
+        still open."""
+        previous = None
+        with self._recording():
+            if resumed:
+                previous = self.connections.get(connection.player_id)
+                if self.recorder is not None:
+                    self.recorder.resume(connection.player_id)
+            else:
+                self._add_player(connection.player_id, username)
+            self._add_connection(connection)
+        if previous is not None:
+            self._evict(previous, 'resumed')
+        return connection
 
-                    conn.sendall(pickle.dumps(self.players))
+    def _add_connection(self, connection: Connection) -> Connection:
+        self.connections[connection.player_id] = connection
+        self.new_connections.append(connection)
+        return connection
 
-                    if self.disconnected_player_ids:
-                        self._delete_disconnected_players()
+    def _receive(self, connection: Connection, data: bytes) -> None:
+        """Handle a message from the client."""
+        connection.last_received = time.monotonic()
+        with self._recording():
+            if self.recorder is not None:
+                self.recorder.message(connection.player_id, data)
+            received_type = codec.message_type(data)
+            if received_type == codec.HEARTBEAT:
+                return
+            if received_type == codec.COMPRESSION:
+                self._negotiate_compression(
+                    connection, codec.decode_compression(data)
+                )
+                return
+            if received_type == codec.SAY:
+                self._say(connection.player_id, codec.decode_say(data))
+                return
+            if received_type == codec.INPUT:
+                ack, seq, commands = codec.decode_input(data)
+                self.simulation.input(connection.player_id, seq, commands)
+                connection.deltas.acknowledge(ack)
+                return
+            ack, player_attributes = codec.decode_state(data)
+            self._update_player(connection.player_id, player_attributes)
+            connection.deltas.acknowledge(ack)
 
-    def _disconnect_player(self, player_id: int) -> None:
-        # Indicate that this player should be deleted locally.
-        self.players[player_id]['x'] = None
-        self.disconnected_player_ids.append(player_id)
+    def _negotiate_compression(
+        self,
+        connection: Connection,
+        offered: tuple
+    ) -> None:
+        method = compression.choose(offered)
+        if method is not None:
+            connection.compressor = Compressor(method)
         log.info(
-            f'Connection dropped ({self.players[player_id]["username"]},'
-            f' Player id: {player_id}).'
+            f'Player {connection.player_id} offered compression {offered},'
+            f' chose {method}.'
         )
 
-    def _delete_disconnected_players(self) -> None:
-        for id_ in reversed(self.disconnected_player_ids):
+    def _say(self, player_id: int, data: str) -> None:
+        """Send a chat message to every client in the room, the one
+        who said it too, and save it."""
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            payload = None
+        if not is_valid_message(payload):
+            log.warning(f'Malformed chat message from player {player_id}.')
+            return
+
+        payload['player_id'] = player_id
+        message_id = uuid4().hex
+        try:
+            chat = codec.encode_chat(message_id, json.dumps(payload))
+        except ServerError as e:
+            log.warning(f'Chat message from player {player_id} too long: {e}')
+            return
+        message = frame(chat)
+        for connection in list(self.connections.values()):
+            connection.post(message)
+        if self.chat_store is not None:
+            self.chat_store.save(message_id, payload)
+
+    def _recording(self) -> ContextManager:
+        """Hold while handling anything which is recorded, so the log
+        has it in the order the server saw it."""
+        if self.recorder is None:
+            return nullcontext()
+        return self.recorder.lock
+
+    def _ticks(self, seconds: float) -> int:
+        return math.ceil(seconds / self.tick_interval)
+
+    def _check_idle(self, connection: Connection, now: float) -> None:
+        """Disconnect the client if it has gone quiet, else send it a
+        heartbeat if it has not been sent anything for a while, and
+        check it again later."""
+        if self.connections.get(connection.player_id) is not connection:
+            return
+        if connection.closed:
+            # Closed but never handled as a disconnect, e.g. its
+            # receiver never returned from a read: reap it here.
+            self._handle_disconnect(connection.player_id, connection)
+            return
+
+        idle = now - connection.last_received
+        if idle > IDLE_TIMEOUT:
+            self._evict(connection, 'idle')
+            return
+
+        if now - connection.outbox.last_put >= HEARTBEAT_INTERVAL:
+            connection.heartbeat()
+        self.timers.schedule(
+            connection,
+            self._ticks(min(HEARTBEAT_INTERVAL, IDLE_TIMEOUT - idle))
+        )
+
+    def _protocol_violation(
+        self, player_id: int, connection: Connection, error: Exception
+    ) -> None:
+        """Disconnect a client which sent a malformed frame, as if its
+        connection dropped, rather than leave its player behind."""
+        log.warning(f'Protocol violation from player {player_id}: {error}')
+        self._handle_disconnect(player_id, connection)
+
+    def _evict(self, connection: Connection, reason: str) -> None:
+        """Disconnect a client which fell too far behind or went
+        quiet. Its receiving thread then handles the disconnect."""
+        log.warning(
+            f'Evicting {reason} player {connection.player_id}:'
+            f' {connection.outbox.stats}.'
+        )
+        connection.close()
+        if connection.abort is not None:
             try:
-                del self.players[id_]
-            except KeyError:
-                log.warning(
-                    f'Could not delete player with id {id_} from server.'
-                )
-            else:
-                log.info(f'Deleted player with id {id_} from server.')
-            finally:
-                self.disconnected_player_ids.remove(id_)
+                connection.abort()
+            except OSError:
+                pass
+
+    def _add_player(self, player_id: int, username: str) -> None:
+        self.sessions.add(player_id, username)
+        if self.recorder is not None:
+            self.recorder.join(player_id, username)
+
+    def _update_player(self, player_id: int, player_attributes: dict) -> None:
+        self.sessions.update(player_id, player_attributes)
+
+    def _simulate(self) -> None:
+        """Move the players who send their inputs by a tick."""
+        if not self.simulation:
+            return
+        moved = self.simulation.step(
+            self.sessions.snapshot(), self.tick_interval
+        )
+        if moved:
+            self.sessions.update_many(moved)
 
-    def _reset_players(self) -> None:
-        if self.players:
-            self.players.clear()
+    def _acknowledge_inputs(self, snapshot: dict) -> None:
+        """Send the players the simulation moved the last command it
+        applied and where it left them, to correct their prediction."""
+        acked, self.simulation.acked = self.simulation.acked, {}
+        for player_id, seq in acked.items():
+            connection = self.connections.get(player_id)
+            fields = snapshot.get(player_id)
+            if connection is not None and fields is not None:
+                connection.post(frame(codec.encode_input_ack(seq, fields)))
 
-        Server.current_player_id = 0
+    def _update_snapshot(self) -> None:
+        """Add a snapshot of the players to the history if anything
+        changed since the latest one."""
+        # Serialized without the lock, client threads update a copy.
+        snapshot = codec.snapshot_fields(self.sessions.snapshot())
+        if self.cluster is not None:
+            self.cluster.poll()
+            self.cluster.publish(snapshot)
+            snapshot = {**self.cluster.players(), **snapshot}
 
-        log.info('All players reset.')
+        if snapshot != self.snapshots.latest or not self.snapshots.seq:
+            self.snapshots.add(snapshot)
+
+    def _handle_disconnect(
+        self,
+        player_id: int,
+        connection: Optional[Connection] = None
+    ) -> None:
+        """Keep the player of a dropped connection until their session
+        is resumed or expires. Nothing is done if the connection given
+        was already taken over by a resumed session."""
+        with self._recording():
+            current = self.connections.get(player_id)
+            if connection is not None and current is not connection:
+                return
+            if self.recorder is not None:
+                self.recorder.leave(player_id)
+            self.connections.pop(player_id, None)
+            if current is not None:
+                current.close()
+            self.simulation.remove(player_id)
+            self.suspended.append(
+                (player_id, self.sessions.suspend(player_id))
+            )
+        log.info(
+            f'Connection dropped (Player id: {player_id}), resumable for'
+            f' {RESUME_GRACE} s.'
+        )
+
+    def _expire_session(self, player_id: int, suspension: int) -> None:
+        username = self.sessions.expire(player_id, suspension)
+        if username is not None:
+            log.info(f'Session expired ({username}, Player id: {player_id}).')
+
+    def _delete_disconnected_players(self) -> None:
+        for player_id in self.sessions.remove_disconnected():
+            log.info(f'Deleted player with id {player_id} from server.')
@@ -0,0 +1,218 @@
+import secrets
+import threading
+import time
+
+from collections import deque
+from game.errors import ServerError
+from game.utils import network_data
+from typing import Optional
+
+# Player ids are sent as unsigned shorts.
+MAX_PLAYER_IDS = 1 << 16
+
+
+class TimedLock:
+    """A lock which records how long it is waited for and held."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+        self.acquisitions = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.hold_time = 0.0
+        self.max_hold_time = 0.0
+
+    def __enter__(self) -> 'TimedLock':
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_at = time.perf_counter()
+        waited = self._acquired_at - started
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        self.acquisitions += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        held = time.perf_counter() - self._acquired_at
+        self.hold_time += held
+        self.max_hold_time = max(self.max_hold_time, held)
+        self._lock.release()
+
+    @property
+    def stats(self) -> dict:
+        acquisitions = self.acquisitions or 1
+        return {
+            'acquisitions': self.acquisitions,
+            'mean_wait_us': self.wait_time / acquisitions * 1e6,
+            'max_wait_us': self.max_wait_time * 1e6,
+            'mean_hold_us': self.hold_time / acquisitions * 1e6,
+            'max_hold_us': self.max_hold_time * 1e6,
+        }
+
+
+class SessionRegistry:
+    """The players of a room, shared by the client threads and the tick.
+
+    Every method holds the lock only to update the table. The table is
+    copied on write: a snapshot hands out the current table, which is
+    never mutated afterwards, so the tick can serialize it without the
+    lock. A player's attributes are replaced rather than updated for
+    the same reason.
+
+    Player ids are handed out from the block of max_ids ids starting at
+    first_id, reusing the ids of removed players, those freed first
+    being reused first.
+
+    A player whose connection dropped is away until they resume their
+    session with the token issued to them, or the session expires.
+    """
+
+    def __init__(self, first_id: int = 0, max_ids: int = MAX_PLAYER_IDS):
+        self.lock = TimedLock()
+        self.next_id = first_id
+        self.end_id = min(first_id + max_ids, MAX_PLAYER_IDS)
+        self.free_ids = deque()
+        self.disconnected = set()
+        self.away = set()
+        self.tokens = {}  # Resume token: player id.
+        self.suspensions = {}  # Player id: number of their suspension.
+        self._last_suspension = 0
+        self._players = {}
+        self._shared = False  # Whether a snapshot holds the table.
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def allocate(self) -> int:
+        """Return an unused player id, raising ServerError once every id
+        of the block is in use."""
+        with self.lock:
+            if self.free_ids:
+                return self.free_ids.popleft()
+
+            if self.next_id >= self.end_id:
+                raise ServerError(
+                    f'All the player ids up to {self.end_id - 1} are in use.'
+                )
+            player_id = self.next_id
+            self.next_id += 1
+            return player_id
+
+    def add(self, player_id: int, username: str) -> None:
+        attributes = network_data()
+        attributes['id'] = player_id
+        attributes['username'] = username
+        with self.lock:
+            self._writable()[player_id] = attributes
+
+    def update(self, player_id: int, player_attributes: dict) -> None:
+        with self.lock:
+            players = self._writable()
+            players[player_id] = {
+                **players[player_id], **player_attributes, 'id': player_id
+            }
+
+    def update_many(self, players: dict) -> None:
+        """Update the attributes of many players, of player id:
+        attributes, holding the lock once."""
+        with self.lock:
+            table = self._writable()
+            for player_id, player_attributes in players.items():
+                table[player_id] = {
+                    **table[player_id], **player_attributes, 'id': player_id
+                }
+
+    def disconnect(self, player_id: int) -> str:
+        """Mark a player as disconnected, to be removed by
+        `remove_disconnected`, and return its username."""
+        with self.lock:
+            return self._disconnect(player_id)
+
+    def issue_token(self, player_id: int) -> str:
+        """Return a new token to resume the player's session with."""
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.tokens[token] = player_id
+        return token
+
+    def suspend(self, player_id: int) -> int:
+        """Keep a player whose connection dropped, standing still, for
+        them to resume their session. Return the number of the
+        suspension, to expire it by."""
+        with self.lock:
+            players = self._writable()
+            players[player_id] = {**players[player_id], 'standing': True}
+            self.away.add(player_id)
+            self._last_suspension += 1
+            self.suspensions[player_id] = self._last_suspension
+            return self._last_suspension
+
+    def resume(self, token: str) -> Optional[int]:
+        """Return the id of the player whose session the token resumes,
+        None if there is no such session any more."""
+        with self.lock:
+            player_id = self.tokens.get(token)
+            if player_id is None or player_id in self.disconnected:
+                return None
+            self.away.discard(player_id)
+            return player_id
+
+    def expire(
+        self, player_id: int, suspension: Optional[int] = None
+    ) -> Optional[str]:
+        """Disconnect a player who is still away and return its
+        username, None if the player resumed in the meantime. Given a
+        suspension, the player is only disconnected if it is still away
+        since then, not since dropping again after resuming."""
+        with self.lock:
+            if player_id not in self.away or suspension not in (
+                None, self.suspensions.get(player_id)
+            ):
+                return None
+            self.away.discard(player_id)
+            return self._disconnect(player_id)
+
+    def remove_disconnected(self) -> list:
+        """Remove the disconnected players, free their ids and return
+        them."""
+        with self.lock:
+            players = self._writable()
+            removed = list(self.disconnected)
+            for player_id in removed:
+                del players[player_id]
+            self.free_ids.extend(removed)
+            for player_id in removed:
+                self.suspensions.pop(player_id, None)
+            self.tokens = {
+                token: player_id
+                for token, player_id in self.tokens.items()
+                if player_id not in self.disconnected
+            }
+            self.disconnected.clear()
+        return removed
+
+    def snapshot(self) -> dict:
+        """Return the player id: attributes table as it is now.
+
+        It is not changed afterwards, so it can be read without the
+        lock, but it must not be mutated.
+        """
+        with self.lock:
+            self._shared = True
+            return self._players
+
+    def _disconnect(self, player_id: int) -> str:
+        players = self._writable()
+        # Indicate that this player should be deleted locally.
+        players[player_id] = {**players[player_id], 'x': None}
+        self.disconnected.add(player_id)
+        return players[player_id]['username']
+
+    def _writable(self) -> dict:
+        """Return the table to mutate, copying it first if a snapshot
+        holds it. Call with the lock held."""
+        if self._shared:
+            self._players = dict(self._players)
+            self._shared = False
+        return self._players
@@ -0,0 +1,362 @@
+"""Movement of the players who send the keys they hold (see
+`codec.INPUT`) rather than their state, simulated by the server against
+the room's map.
+
+Each input command is the keys a client held over one of its frames,
+and is applied for as long as that frame lasted, so the server moves
+the player exactly as the client predicted (see `network.prediction`).
+A player can only have the server apply as much input as time went by,
+give or take INPUT_BUDGET for commands arriving in bursts.
+
+The rules are those `game.player.Player` moves the local player by: a
+player walks at PLAYER_VELOCITY, slower in grass and water, backs off
+the cells objects stand on and stays on the screen. They are applied
+here to every simulated player at once, on arrays holding one field of
+every player each, as `Player` needs a display and a loop per player
+would not scale to a crowded room.
+"""
+import pickle
+
+import numpy as np
+
+from collections import deque
+from enums.base import Base, Player_, Server_, Window
+from game.utils import get_config, random_xy
+from network import codec
+from typing import Iterable, Optional
+
+config = get_config()
+
+WINDOW_HEIGHT = config['WINDOW_HEIGHT']
+WINDOW_WALL_WIDTH = Window.WALL_WIDTH.value
+GRID_SPACING = config['GRID_SPACING']
+PLAYER_HEIGHT = Player_.HEIGHT.value
+PLAYER_VEL = config['PLAYER_VELOCITY']
+TIME_DIFF_MULTIPLYER = Base.TIME_DIFF_MULTIPLYER.value
+INPUT_BUDGET = Server_.INPUT_BUDGET.value
+
+# The bounds of the screen, the rightmost cell being walkable.
+MAX_X = WINDOW_HEIGHT - WINDOW_WALL_WIDTH - GRID_SPACING
+MAX_Y = WINDOW_HEIGHT - PLAYER_HEIGHT
+
+# Directions by index, in the order Player.move checks their keys, and
+# the step each one walks along x and y.
+DIRECTIONS = ('left', 'right', 'up', 'down')
+DIRECTION_KEYS = (
+    codec.LEFT_KEY, codec.RIGHT_KEY, codec.UP_KEY, codec.DOWN_KEY
+)
+DOWN = DIRECTIONS.index('down')
+STEP_X = np.array([-1, 1, 0, 0])
+STEP_Y = np.array([0, 0, -1, 1])
+# The direction attributes of a player facing each direction.
+FACING = tuple(
+    {other: other == direction for other in DIRECTIONS}
+    for direction in DIRECTIONS
+)
+# The arrays holding a field of every simulated player, by slot.
+COLUMNS = {
+    'ids': np.int64,
+    'x': np.float64,
+    'y': np.float64,
+    'facing': np.int8,
+    'standing': np.bool_,
+    'current_step': np.float64,
+    'slow': np.bool_,
+    'bike': np.bool_,
+    'seqs': np.uint16,  # The last input command applied.
+    'budget': np.float64,  # Seconds of input the player may still use.
+}
+
+
+class Terrain:
+    """The cells of a map, by their top left corner, which the movement
+    rules look at, also laid out as grids to look up many positions at
+    once."""
+
+    def __init__(
+        self,
+        nodes: Iterable[tuple] = (),
+        blocked_nodes: Iterable[tuple] = (),
+        reduced_speed_nodes: Optional[dict] = None
+    ):
+        self.nodes = set(nodes)  # Traversable.
+        self.blocked_nodes = set(blocked_nodes)
+        # Cell: how much slower players walk in it.
+        self.reduced_speed_nodes = dict(reduced_speed_nodes or {})
+
+        cells = [*self.blocked_nodes, *self.reduced_speed_nodes]
+        shape = (
+            max((x for x, _ in cells), default=0) // GRID_SPACING + 1,
+            max((y for _, y in cells), default=0) // GRID_SPACING + 1
+        )
+        self.blocked = np.zeros(shape, np.bool_)
+        self.slow = np.zeros(shape, np.bool_)
+        self.reduced_speed = np.zeros(shape)
+        for x, y in self.blocked_nodes:
+            self.blocked[x // GRID_SPACING, y // GRID_SPACING] = True
+        for (x, y), speed in self.reduced_speed_nodes.items():
+            self.slow[x // GRID_SPACING, y // GRID_SPACING] = True
+            self.reduced_speed[x // GRID_SPACING, y // GRID_SPACING] = speed
+
+    @classmethod
+    def load(cls, map_name: str) -> 'Terrain':
+        """Load the cells of a map from the maps/ directory, as
+        `Map.load` does."""
+        with open(f'maps/{map_name}.pkl', 'rb') as path:
+            map_ = pickle.load(path)
+        return cls(
+            map_['nodes'],
+            map_['blocked nodes'],
+            map_['reduced speed nodes']
+        )
+
+    def lookup(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """Return whether each cell is blocked, whether it is slow and
+        how much slower, for cells off the map too."""
+        columns = x // GRID_SPACING
+        rows = y // GRID_SPACING
+        on_map = (
+            (columns >= 0) & (columns < self.blocked.shape[0])
+            & (rows >= 0) & (rows < self.blocked.shape[1])
+        )
+        columns = np.where(on_map, columns, 0)
+        rows = np.where(on_map, rows, 0)
+        slow = on_map & self.slow[columns, rows]
+        return (
+            on_map & self.blocked[columns, rows],
+            slow,
+            np.where(slow, self.reduced_speed[columns, rows], 0)
+        )
+
+
+class Simulation:
+    """Move the players of a room by the keys they last sent.
+
+    Each simulated player has a slot in the arrays of COLUMNS, the
+    players in slots below size. Client threads only queue the commands
+    received, and the players to remove, in inputs, which the tick
+    thread applies in order at each step.
+    """
+
+    def __init__(self, terrain: Optional[Terrain] = None, capacity: int = 64):
+        self.terrain = terrain if terrain is not None else Terrain()
+        # Player id, the sequence number of the first command and the
+        # commands received since the last step, None to remove the
+        # player.
+        self.inputs = deque()
+        # Player id: the last command applied by the last step.
+        self.acked = {}
+        self.slots = {}  # Player id: slot.
+        self.size = 0
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype))
+
+    def __len__(self) -> int:
+        """The players simulated, or to be from the next step."""
+        return self.size + len(self.inputs)
+
+    def input(self, player_id: int, seq: int, commands: list) -> None:
+        """Queue input commands, the keys held and for how many
+        milliseconds, numbered from seq."""
+        self.inputs.append((player_id, seq, commands))
+
+    def remove(self, player_id: int) -> None:
+        """Stop moving a player, until they send their keys again."""
+        self.inputs.append((player_id, 0, None))
+
+    def step(self, players: dict, seconds: float) -> dict:
+        """Apply the commands received since the last step, seconds
+        ago, and return the player id: movement attributes of the
+        players who moved. The last command applied for each player is
+        left in acked.
+
+        players is where the players new to the simulation start from.
+        """
+        queued = self._apply(players, seconds)
+        self.acked = {}
+        changed = np.zeros(self.size, np.bool_)
+        # A round applies the next command of every player who has one.
+        for round_ in range(max(map(len, queued.values()), default=0)):
+            slots, seqs, keys, durations = [], [], [], []
+            for player_id, commands in queued.items():
+                if round_ < len(commands):
+                    seq, held, ms = commands[round_]
+                    slots.append(self.slots[player_id])
+                    seqs.append(seq)
+                    keys.append(held)
+                    durations.append(ms / 1000)
+                    self.acked[player_id] = seq
+            slots = np.array(slots)
+            durations = np.minimum(durations, self.budget[slots])
+            self.budget[slots] -= durations
+            self.seqs[slots] = seqs
+            moved = self._move(slots, np.array(keys, np.uint8), durations)
+            changed[slots[moved]] = True
+        return self._movement(np.flatnonzero(changed))
+
+    def _move(
+        self,
+        slots: np.ndarray,
+        keys: np.ndarray,
+        seconds: np.ndarray
+    ) -> np.ndarray:
+        """Move the players in slots, holding keys for seconds each, and
+        return whether each one changed."""
+        dt = seconds * 1000 * TIME_DIFF_MULTIPLYER
+        x, y, facing = self.x[slots], self.y[slots], self.facing[slots]
+        standing = self.standing[slots]
+        step = self.current_step[slots]
+        before = [
+            column[slots]
+            for column in (
+                self.x, self.y, self.facing, self.standing,
+                self.current_step, self.slow, self.bike
+            )
+        ]
+
+        blocked, slow, reduced_speed = self.terrain.lookup(
+            _sync_with_grid(x), _sync_with_grid(y + 10)
+        )
+        bike = (keys & codec.BIKE_KEY) != 0
+        distance = (PLAYER_VEL - reduced_speed) * dt
+
+        # The first direction held, -1 for none.
+        walk = np.select(
+            [(keys & key) != 0 for key in DIRECTION_KEYS],
+            range(len(DIRECTIONS)),
+            -1
+        )
+        walking = ~blocked & (walk >= 0)
+        stopping = ~blocked & (walk < 0)
+        # Strafing keeps facing across the direction walked in.
+        turning = walking & ~(
+            ((keys & codec.STRAFE_KEY) != 0) & (facing // 2 != walk // 2)
+        )
+        facing[turning] = walk[turning]
+        standing[walking] = False
+        standing[stopping] = True
+        step[stopping] = 0
+        x += np.where(walking, STEP_X[walk] * distance, 0)
+        y += np.where(walking, STEP_Y[walk] * distance, 0)
+
+        # Back off the blocked cells, moving anyone standing in one
+        # somewhere else first.
+        if self.terrain.nodes:
+            for i in np.flatnonzero(blocked & standing):
+                x[i], y[i] = random_xy(self.terrain.nodes)
+        x -= np.where(blocked, STEP_X[facing] * distance, 0)
+        y -= np.where(blocked, STEP_Y[facing] * distance, 0)
+
+        step[step + 1 > 4] = 0
+        step += np.where(standing, 0, dt)
+
+        # Stay on the screen, on both axes.
+        right = x > MAX_X
+        left = x < 0
+        top = y < 0
+        bottom = y > MAX_Y
+        x += np.where(left, distance, 0) - np.where(right, distance, 0)
+        y += np.where(top, distance, 0) - np.where(bottom, distance, 0)
+
+        after = (x, y, facing, standing, step, slow, bike)
+        self.x[slots], self.y[slots], self.facing[slots] = x, y, facing
+        self.standing[slots], self.current_step[slots] = standing, step
+        self.slow[slots], self.bike[slots] = slow, bike
+        changed = np.zeros(len(slots), np.bool_)
+        for old, new in zip(before, after):
+            changed |= old != new
+        return changed
+
+    def _movement(self, slots: np.ndarray) -> dict:
+        """Return the player id: movement attributes of the players in
+        slots."""
+        return {
+            player_id: {
+                'x': x,
+                'y': y,
+                **FACING[facing],
+                'standing': standing,
+                '_current_step': step,
+                'in_slow_area': slow,
+                'bike': bike,
+            }
+            for player_id, x, y, facing, standing, step, slow, bike in zip(*(
+                column[slots].tolist() for column in (
+                    self.ids, self.x, self.y, self.facing, self.standing,
+                    self.current_step, self.slow, self.bike
+                )
+            ))
+        }
+
+    def _apply(self, players: dict, seconds: float) -> dict:
+        """Apply what the client threads left since the last step,
+        seconds ago, and return the player id: numbered commands to
+        apply."""
+        n = self.size
+        self.budget[:n] = np.minimum(self.budget[:n] + seconds, INPUT_BUDGET)
+
+        queued = {}
+        while self.inputs:
+            player_id, seq, commands = self.inputs.popleft()
+            if commands is None:
+                queued.pop(player_id, None)
+                self._release(player_id)
+                continue
+            if player_id not in self.slots:
+                attributes = players.get(player_id)
+                if attributes is None or attributes['x'] is None:
+                    continue
+                self._add(player_id, attributes)
+            queued.setdefault(player_id, []).extend(
+                ((seq + i) & codec.INPUT_SEQUENCE_MASK, keys, ms)
+                for i, (keys, ms) in enumerate(commands)
+            )
+        return queued
+
+    def _add(self, player_id: int, attributes: dict) -> int:
+        if self.size == len(self.ids):
+            for name in COLUMNS:
+                column = getattr(self, name)
+                setattr(self, name, np.resize(column, 2 * len(column)))
+
+        slot = self.size
+        self.size += 1
+        self.slots[player_id] = slot
+        self.ids[slot] = player_id
+        self.x[slot] = attributes['x']
+        self.y[slot] = attributes['y']
+        self.facing[slot] = next(
+            (
+                i for i, direction in enumerate(DIRECTIONS)
+                if attributes[direction]
+            ),
+            DOWN
+        )
+        self.standing[slot] = attributes['standing']
+        self.current_step[slot] = attributes['_current_step']
+        self.slow[slot] = attributes['in_slow_area']
+        self.bike[slot] = attributes['bike']
+        self.budget[slot] = INPUT_BUDGET
+        return slot
+
+    def _release(self, player_id: int) -> None:
+        """Free a player's slot, moving the last player into it so the
+        players stay in the first size slots."""
+        slot = self.slots.pop(player_id, None)
+        if slot is None:
+            return
+        self.size -= 1
+        last = self.size
+        if slot != last:
+            for name in COLUMNS:
+                column = getattr(self, name)
+                column[slot] = column[last]
+            self.slots[int(self.ids[slot])] = slot
+
+
+def _sync_with_grid(n: np.ndarray) -> np.ndarray:
+    """`sync_value_with_grid` of every value: the nearest multiple of
+    the grid spacing, halves rounding up."""
+    floor = (n // GRID_SPACING) * GRID_SPACING
+    ceil = np.ceil(n / GRID_SPACING) * GRID_SPACING
+    return np.where(n - floor < GRID_SPACING / 2, floor, ceil).astype(int)
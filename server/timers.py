@@ -0,0 +1,80 @@
+from typing import Hashable, List
+
+
+class TimerWheel:
+    """Hierarchical timing wheel counting in ticks.
+
+    Level 0 has a slot per tick, and each level above a slot per full
+    turn of the level below. A timer goes in the lowest level its
+    deadline fits in and moves down a level each time the level below
+    turns over, so scheduling and cancelling are O(1) and advancing a
+    tick only touches the timers in the current slots.
+
+    Deadlines past the range of the wheel are parked at its far end and
+    rescheduled when reached.
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 3):
+        self.slots = slots
+        self.levels = levels
+        self.wheels = [
+            [set() for _ in range(slots)] for _ in range(levels)
+        ]
+        self.now = 0
+        self.timers = {}  # key: (deadline, level, slot)
+
+    def __len__(self) -> int:
+        return len(self.timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.timers
+
+    def schedule(self, key: Hashable, ticks: int) -> None:
+        """Expire the key in ticks ticks, replacing its previous timer."""
+        self.cancel(key)
+        self._insert(key, self.now + max(1, ticks))
+
+    def cancel(self, key: Hashable) -> None:
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            _, level, slot = timer
+            self.wheels[level][slot].discard(key)
+
+    def advance(self) -> List[Hashable]:
+        """Move on a tick and return the keys which expired."""
+        self.now += 1
+        # Cascade from the top so the timers land in lower slots which
+        # are still to come.
+        for level in reversed(range(1, self.levels)):
+            if self.now % self.slots ** level == 0:
+                self._cascade(level, (self.now // self.slots ** level))
+
+        slot = self.wheels[0][self.now % self.slots]
+        expired = []
+        for key in list(slot):
+            deadline, _, _ = self.timers.pop(key)
+            slot.discard(key)
+            if deadline > self.now:
+                # It was parked at the end of the wheel.
+                self._insert(key, deadline)
+            else:
+                expired.append(key)
+        return expired
+
+    def _cascade(self, level: int, turns: int) -> None:
+        slot = self.wheels[level][turns % self.slots]
+        keys = list(slot)
+        slot.clear()
+        for key in keys:
+            deadline, _, _ = self.timers.pop(key)
+            self._insert(key, deadline)
+
+    def _insert(self, key: Hashable, deadline: int) -> None:
+        at = min(deadline, self.now + self.slots ** self.levels - 1)
+        delay = at - self.now
+        level = 0
+        while delay >= self.slots ** (level + 1):
+            level += 1
+        slot = (at // self.slots ** level) % self.slots
+        self.wheels[level][slot].add(key)
+        self.timers[key] = (deadline, level, slot)
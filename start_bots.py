@@ -0,0 +1,88 @@
+import sys
+
+from argparse import ArgumentParser, Namespace
+from bots.load import MODES, run
+from enums.base import Bots, Network_
+from game.utils import get_config
+
+CHAT_INTERVAL = Bots.CHAT_INTERVAL.value
+DURATION = Bots.DURATION.value
+RAMP_UP = Bots.RAMP_UP.value
+SEND_RATE = Network_.SEND_RATE.value
+ROOM = get_config()['MAP']
+
+
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(
+        description='Put load on the server with headless bots.'
+    )
+    parser.add_argument(
+        '--bots',
+        type=int,
+        default=10,
+    )
+    parser.add_argument(
+        '--mode',
+        type=str,
+        choices=MODES,
+        default='threads',
+        help='Run every bot on its own thread, task or process.',
+    )
+    parser.add_argument(
+        '--room',
+        type=str,
+        default=ROOM,
+        help='The map the bots play, in maps/.',
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=DURATION,
+        help='Seconds each bot plays for.',
+    )
+    parser.add_argument(
+        '--ramp-up',
+        type=float,
+        default=RAMP_UP,
+        help='Seconds over which the bots join.',
+    )
+    parser.add_argument(
+        '--send-rate',
+        type=int,
+        default=SEND_RATE,
+        help='Moves each bot sends per second.',
+    )
+    parser.add_argument(
+        '--chat-interval',
+        type=float,
+        default=CHAT_INTERVAL,
+        help='Mean seconds between the chat messages of a bot, 0 for none.',
+    )
+    parser.add_argument(
+        '--fake-redis',
+        action='store_true',
+        help='Chat through an in-memory fakeredis instead of Redis.',
+    )
+    parser.add_argument(
+        '--prefix',
+        type=str,
+        default='bot',
+        help='The bots are named the prefix followed by their number.',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+    )
+    parsed = parser.parse_args(args)
+    if parsed.bots < 1:
+        parser.error('--bots must be at least 1.')
+    return parsed
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    result = run(args)
+    print(f'{args.bots} bots ({args.mode}) in room {args.room}')
+    for name, value in result.items():
+        print(f'{name:<18}{value:>10.2f}')
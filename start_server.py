@@ -1,33 +1,184 @@
+import asyncio
 import socket
+import sys
+import threading
 
+from argparse import ArgumentParser, Namespace
 from enums.base import Server_
+from game.redis import RedisClient
+from game.utils import check_os_config
 from logger import get_logger
-from server.server import Server
-import threading
+from server.chat import ChatStore
+from server.cluster import Cluster
+from server.rooms import Rooms, Supervisor
+from typing import Callable, Optional
 
 log = get_logger(__name__, file_log_level='INFO')
 
 MAX_CONNECTIONS = Server_.MAX_CONNECTIONS.value
+TICK_RATE = Server_.TICK_RATE.value
+
 
+def parse_args(args) -> Namespace:
+    parser = ArgumentParser(description='Start the game server.')
+    parser.add_argument(
+        '--mode',
+        type=str,
+        choices=('threaded', 'asyncio'),
+        default='threaded',
+        help=(
+            'Serve each connection on its own thread or as coroutines on'
+            ' a single event loop.'
+        ),
+    )
+    parser.add_argument(
+        '--tick-rate',
+        type=int,
+        default=TICK_RATE,
+        help='Snapshots pushed to the clients per second.',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=0,
+        help=(
+            'Worker processes to spread the rooms over (threaded mode).'
+            ' 0 serves every room in this process.'
+        ),
+    )
+    parser.add_argument(
+        '--node',
+        type=int,
+        default=None,
+        help=(
+            'Join the cluster of servers sharing their players through'
+            ' Redis as this node id.'
+        ),
+    )
+    parser.add_argument(
+        '--record',
+        type=str,
+        default=None,
+        metavar='DIR',
+        help=(
+            'Record the traffic of every room to a log in this directory,'
+            ' to replay with benchmarks.replay.'
+        ),
+    )
+    parser.add_argument(
+        '--save-chat',
+        action='store_true',
+        help=(
+            'Save the chat said over the game connections to Redis, for'
+            ' the clients chatting through Redis.'
+        ),
+    )
+    parser.add_argument(
+        '--history-kb',
+        type=str,
+        action='append',
+        default=[],
+        metavar='ROOM=KB',
+        help=(
+            'Memory a room keeps the past positions of its players in, for'
+            ' lag compensation. May be given for several rooms.'
+        ),
+    )
+    parsed = parser.parse_args(args)
+    if parsed.workers and parsed.mode == 'asyncio':
+        parser.error('--workers can only be used in the threaded mode.')
+    parsed.history_bytes = {}
+    for cap in parsed.history_kb:
+        room, _, kilobytes = cap.partition('=')
+        if not room or not kilobytes.isdigit():
+            parser.error(f'--history-kb expects ROOM=KB, not {cap}.')
+        parsed.history_bytes[room] = int(kilobytes) * 1024
+    return parsed
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
 
-    if __name__ == '__main__':
-        server = Server()
-        sock.bind((server.host, server.port))
+def run_threaded(
+    host: str,
+    port: int,
+    serve: Callable[[socket.socket, tuple], None]
+) -> None:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, port))
         sock.listen(MAX_CONNECTIONS)
 
         log.info('Server started, waiting for connection...')
 
         while True:
             conn, addr = sock.accept()
-            log.info(
-                f'Connected by: {addr}. Player id: {server.current_player_id}'
-            )
 
-            threading.Thread(
-                target=server.client,
-                args=(conn, server.current_player_id)
-            ).start()
+            threading.Thread(target=serve, args=(conn, addr)).start()
+
+
+async def run_asyncio(
+    host: str,
+    port: int,
+    tick_rate: int,
+    cluster: Optional[Cluster] = None,
+    record_dir: Optional[str] = None,
+    chat_store: Optional[ChatStore] = None,
+    history_bytes: Optional[dict] = None
+) -> None:
+    tick_loops = set()
 
-            Server.current_player_id += 1
+    def start_tick(room) -> None:
+        tick_loops.add(asyncio.create_task(room.async_tick_loop()))
+
+    rooms = Rooms(
+        tick_rate,
+        start_tick=start_tick,
+        cluster=cluster,
+        record_dir=record_dir,
+        chat_store=chat_store,
+        history_bytes=history_bytes
+    )
+    async_server = await asyncio.start_server(
+        rooms.async_serve, host, port, backlog=MAX_CONNECTIONS
+    )
+
+    log.info('Server started (asyncio), waiting for connection...')
+
+    async with async_server:
+        await async_server.serve_forever()
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    host = check_os_config('HOST')
+    port = check_os_config('PORT')
+    if args.workers:
+        # Each worker joins the cluster itself.
+        supervisor = Supervisor(
+            args.workers,
+            args.tick_rate,
+            args.node,
+            args.record,
+            args.save_chat,
+            args.history_bytes
+        )
+        run_threaded(host, port, supervisor.dispatch)
+    else:
+        cluster = None if args.node is None else Cluster(args.node)
+        chat_store = ChatStore(RedisClient()) if args.save_chat else None
+        if args.mode == 'asyncio':
+            asyncio.run(run_asyncio(
+                host,
+                port,
+                args.tick_rate,
+                cluster,
+                args.record,
+                chat_store,
+                args.history_bytes
+            ))
+        else:
+            rooms = Rooms(
+                args.tick_rate,
+                cluster=cluster,
+                record_dir=args.record,
+                chat_store=chat_store,
+                history_bytes=args.history_bytes
+            )
+            run_threaded(host, port, rooms.serve)
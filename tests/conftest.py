@@ -1,6 +1,9 @@
+import io
+
 import pytest
 
 from fakeredis import FakeStrictRedis
+from network.framing import frame
 from unittest.mock import patch
 
 
@@ -14,6 +17,23 @@ def mock_os_config(monkeypatch):
     return host, port
 
 
+@pytest.fixture
+def mock_recv_into():
+    """Build a socket.recv_into side effect which streams the given
+    payloads as frames, then behaves as a closed connection or raises
+    end if given."""
+    def _mock_recv_into(*payloads, end=None):
+        stream = io.BytesIO(b''.join(frame(payload) for payload in payloads))
+
+        def recv_into(buffer, n_bytes=0):
+            n_bytes = stream.readinto(buffer[:n_bytes or len(buffer)])
+            if not n_bytes and end is not None:
+                raise end
+            return n_bytes
+        return recv_into
+    return _mock_recv_into
+
+
 @pytest.fixture
 def mock_player():
     def _mock_player(
@@ -0,0 +1,204 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+import redis
+
+from bots.bot import GRID_SPACING, Bot
+from bots.load import report, start_delay
+from game.redis import RedisClient
+from network import codec
+from network.framing import HEADER
+from server.rooms import Rooms
+from unittest.mock import AsyncMock, Mock
+
+NODES = {
+    (x * GRID_SPACING, y * GRID_SPACING) for x in range(5) for y in range(5)
+}
+
+
+@pytest.fixture
+def bot():
+    return Bot('bot0', NODES, seed=1)
+
+
+@pytest.fixture
+def threaded_server(mock_os_config, monkeypatch):
+    """Rooms served on a real socket, each connection on its own
+    thread, as start_server.py does."""
+    rooms = Rooms(tick_rate=50)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen()
+    monkeypatch.setenv('PORT', str(sock.getsockname()[1]))
+
+    def accept():
+        while True:
+            try:
+                conn, addr = sock.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=rooms.serve, args=(conn, addr), daemon=True
+            ).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield rooms
+    sock.close()
+
+
+def test_step_walks_to_neighbouring_node(bot):
+    for _ in range(50):
+        x, y = bot.position
+        bot.step()
+
+        assert bot.position in NODES
+        assert abs(bot.position[0] - x) + abs(bot.position[1] - y) == (
+            GRID_SPACING
+        )
+        assert bot.attributes[bot.direction]
+        assert not bot.attributes['standing']
+
+
+def test_step_stands_when_stuck():
+    bot = Bot('bot0', {(0, 0)})
+    bot.step()
+
+    assert bot.position == (0, 0)
+    assert bot.attributes['standing']
+
+
+def test_observe_times_moves(bot):
+    bot.attributes['id'] = 3
+    bot.step()
+    bot.sent(1.0)
+    first = bot.position
+    bot.step()
+    bot.sent(1.1)
+    second = bot.position
+    bot.step()
+    bot.sent(1.2)
+
+    bot.observe({3: (*second, 0, 0)}, 1.5)
+
+    assert bot.stats.rtts == [pytest.approx(0.4)]
+    # The first move was overtaken by the second.
+    assert [position for position, _ in bot.in_flight] == [bot.position]
+    assert first not in [position for position, _ in bot.in_flight]
+    assert bot.stats.received == 1
+
+
+def test_maybe_chat(mock_os_config, mock_strict_redis):
+    chat = RedisClient()
+    bot = Bot('bot0', NODES, chat, chat_interval=1)
+
+    bot.maybe_chat(bot.next_chat - 1)
+    assert bot.stats.chats == 0
+
+    bot.maybe_chat(bot.next_chat)
+    assert bot.stats.chats == 1
+    assert len(chat.get_all_messages()) == 1
+
+
+def test_no_chat_interval():
+    bot = Bot('bot0', NODES, Mock(), chat_interval=0)
+    bot.maybe_chat(1e9)
+
+    bot.chat.save_message.assert_not_called()
+
+
+def test_maybe_chat_counts_errors(bot):
+    bot.chat = Mock()
+    bot.chat.save_message.side_effect = redis.exceptions.ConnectionError
+    bot.maybe_chat(bot.next_chat)
+
+    assert bot.stats.chats == 0
+    assert bot.stats.errors['chat'] == 1
+
+
+def test_play(threaded_server, bot):
+    stats = bot.play('lobby', 0.5, send_rate=20)
+
+    assert stats.sent > 0
+    assert stats.rtts
+    assert not stats.errors
+    assert 'bot0' in [
+        attributes['username']
+        for attributes in threaded_server.rooms['lobby'].players.values()
+    ]
+
+
+def test_play_connect_error(mock_os_config, bot):
+    stats = bot.play('lobby', 0.5)
+
+    assert stats.errors['connect'] == 1
+
+
+def test_async_play(mock_os_config, bot):
+    async def play():
+        tick_loops = set()
+
+        def start_tick(room):
+            tick_loops.add(asyncio.create_task(room.async_tick_loop()))
+
+        rooms = Rooms(tick_rate=50, start_tick=start_tick)
+        server = await asyncio.start_server(
+            rooms.async_serve, '127.0.0.1', 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            stats = await bot.async_play('lobby', 0.5, 20, port=port)
+        for tick_loop in tick_loops:
+            tick_loop.cancel()
+        return stats
+
+    stats = asyncio.run(play())
+
+    assert stats.sent > 0
+    assert stats.rtts
+    assert not stats.errors
+
+
+def test_async_receive_skips_chat(bot, mock_other_players_attributes):
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+    reader = Mock()
+    reader.readexactly = AsyncMock(side_effect=[
+        part
+        for payload in (
+            codec.encode_snapshot(1, 0, {}, snapshot),
+            codec.encode_chat('f92d896a', '{"text": "hello"}'),
+            codec.encode_heartbeat(),
+            codec.encode_snapshot(2, 1, snapshot, snapshot),
+        )
+        for part in (HEADER.pack(len(payload)), payload)
+    ] + [asyncio.IncompleteReadError(b'', 4)])
+
+    asyncio.run(bot._async_receive(reader))
+
+    assert bot.ack == 2
+    assert bot.stats.received == 2
+    assert not bot.stats.errors
+
+
+def test_start_delay():
+    args = Mock(ramp_up=5, bots=10)
+
+    assert start_delay(args, 0) == 0
+    assert start_delay(args, 5) == 2.5
+
+
+def test_report(bot):
+    bot.stats.rtts = [0.01 * i for i in range(1, 101)]
+    bot.stats.sent = 200
+    bot.stats.chats = 3
+    bot.stats.errors['chat'] = 1
+    bot.stats.errors['connect'] = 1
+
+    result = report(bot.stats, bots=4, elapsed=10)
+
+    assert result['rtt p50 ms'] == pytest.approx(510)
+    assert result['rtt p99 ms'] == pytest.approx(1000)
+    assert result['states/s'] == 20
+    assert result['connect errors %'] == 25
+    assert result['chat errors %'] == 25
@@ -216,6 +216,33 @@ class TestTextInput:
             len(hover_messages.dict[player_id]['wrapped']['widths'])
         )
 
+    def test_get_new_messages_from_server(
+        self,
+        mock_pygame,
+        mock_redis,
+        mock_messages_window_width,
+        hover_messages
+    ):
+        net = Mock()
+        net.take_chat.return_value = [{
+            'id': 'f92d896ac90b4fed8dcc3c986ca0c1f0',
+            'data': (
+                '{"username": "testUser", "text": "hello world",'
+                '"username_rect": {"x": 0, "y": 470, "width": 47,'
+                '"height": 10}, "text_rect": {"x": 47, "y": 470,'
+                '"width": 54, "height": 10}, "player_id": 3}'
+            ),
+        }]
+        text_input = TextInput('test user', net)
+
+        text_input.get_new_messages(hover_messages)
+        text_input.delete_old_msg_ids()
+
+        mock_redis.assert_not_called()
+        assert text_input.msgs.list[-1]['text'] == 'hello world'
+        assert 3 in hover_messages.dict
+        assert not text_input.msgs.cache
+
     def test_delete_old_msg_ids_no_cache(
         self, create_mock_text_input_with_redis_data
     ):
@@ -373,6 +400,21 @@ class TestTextInput:
 
         assert mock_update_messages.call_count == 1
 
+    def test_save_message_through_server(
+        self, mock_pygame, mock_redis, mock_create_rect_dict
+    ):
+        net = Mock()
+        text_input = TextInput('test user', net)
+        text_input.text = 'test'
+        text_input.text_img.get_width.return_value = 100
+        text_input.text_img.get_size.return_value = 100
+
+        text_input.save_message(window=Mock(), player_id=0)
+
+        net.say.assert_called_once()
+        assert net.say.call_args.args[0]['text'] == 'test'
+        mock_redis.assert_not_called()
+
     def test_update_messages(self, mock_pygame, mock_redis, mock_msgs_list):
         text_input = TextInput('test user')
         text_input.text_rect.height = 10
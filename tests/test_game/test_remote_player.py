@@ -0,0 +1,79 @@
+import pytest
+
+from game.player import Player
+from game.remote_player import PLAYER_COLOURS, RemotePlayer, sprites
+from network import codec
+from unittest.mock import Mock, call, patch
+
+
+@pytest.fixture
+def mock_load_player_img():
+    with patch('game.remote_player.load_player_img') as mock_load, patch.dict(
+        'game.remote_player._sprites', clear=True
+    ):
+        # Each sprite is its name, and the colour it was loaded for.
+        mock_load.side_effect = lambda img, img_id: (img, img_id)
+        yield mock_load
+
+
+def _fields(x=10, y=20, step=0, username='user', **flags):
+    attributes = {
+        'x': x, 'y': y, '_current_step': step, 'username': username,
+        'left': False, 'right': False, 'up': False, 'down': True,
+        'standing': True, 'in_slow_area': False, 'bike': False,
+        **flags
+    }
+    return codec.snapshot_fields({0: attributes})[0]
+
+
+def test_update_in_place(mock_load_player_img):
+    player = RemotePlayer(1, _fields())
+    player.update(_fields(x=30, y=40, step=3, username='renamed'))
+
+    assert (player.x, player.y, player.walk_count) == (30, 40, 3)
+    assert player.username == 'renamed'
+    assert not hasattr(player, '__dict__')
+
+
+def test_sprites_shared_by_colour(mock_load_player_img):
+    players = [
+        RemotePlayer(player_id, _fields())
+        for player_id in range(PLAYER_COLOURS + 1)
+    ]
+
+    assert players[0].sprites is players[PLAYER_COLOURS].sprites
+    assert players[0].sprites is not players[1].sprites
+    # 24 sprites a colour, loaded once.
+    assert mock_load_player_img.call_count == PLAYER_COLOURS * 24
+
+
+@pytest.mark.parametrize('player_id', [1, PLAYER_COLOURS + 1])
+def test_colour_matches_local_player(mock_load_player_img, player_id):
+    with patch('game.player.load_player_img'), patch('game.player.sound'):
+        player = Player((10, 20), player_id)
+
+    remote = RemotePlayer(player_id, _fields())
+    assert remote.sprites is sprites(player.img_id)
+
+
+@pytest.mark.parametrize('flags, step, drawn', [
+    ({}, 0, ('down1', 1)),
+    ({'standing': False}, 3, ('down3', 1)),
+    ({'standing': False}, 4, ('down2', 1)),
+    ({'right': True, 'down': False, 'bike': True}, 0, ('bike_right1', 1)),
+    ({'left': True, 'up': True, 'standing': False}, 0, ('left2', 1)),
+])
+def test_draw(mock_load_player_img, flags, step, drawn):
+    win = Mock()
+    RemotePlayer(1, _fields(step=step, **flags)).draw(win, 0)
+
+    assert win.blit.call_args_list == [call(drawn, (10, 20))]
+
+
+def test_draw_in_slow_area(mock_load_player_img):
+    win = Mock()
+    RemotePlayer(1, _fields(in_slow_area=True)).draw(win, 0)
+
+    img, position, area = win.blit.call_args.args
+    assert (img, position) == (('down1', 1), (10, 20))
+    assert area[3] < area[2] * 2
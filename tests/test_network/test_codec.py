@@ -0,0 +1,310 @@
+import pytest
+
+from game.errors import ServerError
+from network import codec
+from network.snapshots import SnapshotHistory
+
+
+@pytest.fixture
+def mock_snapshot(mock_other_players_attributes):
+    return codec.snapshot_fields(mock_other_players_attributes)
+
+
+def test_fields_follow_player_attributes():
+    assert codec.FLAG_FIELDS == (
+        'left', 'right', 'up', 'down', 'standing', 'in_slow_area', 'bike'
+    )
+    assert codec.NUMBER_FIELDS == ('x', 'y', '_current_step')
+    assert codec.SNAPSHOT_FIELDS == (
+        'x', 'y', '_current_step', 'flags', 'username'
+    )
+
+
+def test_hello():
+    assert codec.decode_hello(codec.encode_hello('TestUser', 'lobby')) == (
+        'TestUser', 'lobby', ''
+    )
+
+
+def test_hello_token():
+    assert codec.decode_hello(
+        codec.encode_hello('TestUser', 'lobby', 'f92d896a')
+    ) == ('TestUser', 'lobby', 'f92d896a')
+
+
+def test_hello_unicode_username():
+    assert codec.decode_hello(codec.encode_hello('Pokémon', 'lobby')) == (
+        'Pokémon', 'lobby', ''
+    )
+
+
+def test_welcome():
+    assert codec.decode_welcome(codec.encode_welcome(42)) == (42, '', False)
+    assert codec.decode_welcome(
+        codec.encode_welcome(42, 'f92d896a', resumed=True)
+    ) == (42, 'f92d896a', True)
+
+
+def test_state(mock_player):
+    attributes = mock_player(player_id=3, x=120, y=45).attributes
+    attributes.update(left=True, down=False, bike=True)
+
+    ack, decoded = codec.decode_state(codec.encode_state(7, attributes))
+
+    del attributes['username']
+    assert ack == 7
+    assert decoded == attributes
+
+
+def test_state_does_not_send_username(mock_player):
+    data = codec.encode_state(0, mock_player(username='TestUser').attributes)
+
+    assert b'TestUser' not in data
+    assert len(data) == (
+        codec.MESSAGE_HEADER.size + codec.SEQUENCE.size + codec.PLAYER.size
+    )
+
+
+def test_snapshot_fields_skips_players_not_playing(mock_player):
+    players = {
+        1: mock_player(player_id=1).attributes,
+        2: mock_player(player_id=2, username=None).attributes,
+        3: mock_player(player_id=3, x=None).attributes,
+    }
+
+    assert list(codec.snapshot_fields(players)) == [1]
+
+
+def test_fields_to_attributes(mock_player):
+    attributes = mock_player(player_id=4, x=10, y=20).attributes
+    fields = codec.snapshot_fields({4: attributes})[4]
+
+    assert codec.fields_to_attributes(4, fields) == attributes
+
+
+def test_keyframe(mock_snapshot):
+    history = SnapshotHistory()
+    data = codec.encode_snapshot(1, 0, {}, mock_snapshot)
+
+    assert codec.decode_snapshot(data, history) == 1
+    assert history.latest == mock_snapshot
+
+
+def test_delta_only_sends_changes(mock_other_players_attributes):
+    history = SnapshotHistory()
+    baseline = codec.snapshot_fields(mock_other_players_attributes)
+    codec.decode_snapshot(codec.encode_snapshot(1, 0, {}, baseline), history)
+
+    mock_other_players_attributes[3]['x'] = 99
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+    data = codec.encode_snapshot(2, 1, baseline, snapshot)
+
+    # One record holding only the x position, as an int16, and no
+    # usernames.
+    assert len(data) == (
+        codec.MESSAGE_HEADER.size + 2 * codec.SEQUENCE.size
+        + 2 * codec.COUNT.size + codec.RECORD_HEADER.size + 2
+    )
+    assert codec.decode_snapshot(data, history) == 2
+    assert history.latest == snapshot
+
+
+def test_positions_are_quantized(mock_player):
+    attributes = mock_player(player_id=1, x=12.3, y=-4.01).attributes
+    attributes['_current_step'] = 3.7
+    history = SnapshotHistory()
+    codec.decode_snapshot(
+        codec.encode_snapshot(
+            1, 0, {}, codec.snapshot_fields({1: attributes})
+        ),
+        history
+    )
+
+    x, y, step, *_ = history.latest[1]
+    assert x == pytest.approx(12.3, abs=1 / codec.POSITION_SCALE)
+    assert y == pytest.approx(-4.01, abs=1 / codec.POSITION_SCALE)
+    assert (x * codec.POSITION_SCALE).is_integer()
+    assert step == 3
+
+
+def test_positions_out_of_range_clamped():
+    fields = (-5000.0, 3000.0, 0, 0, 'user')
+    history = SnapshotHistory()
+    codec.decode_snapshot(
+        codec.encode_snapshot(1, 0, {}, {1: fields}), history
+    )
+    _, (x, y, *_) = codec.decode_input_ack(codec.encode_input_ack(1, fields))
+
+    lowest, highest = codec.FIXED_RANGES[0]
+    assert history.latest[1][:2] == (
+        lowest / codec.POSITION_SCALE, highest / codec.POSITION_SCALE
+    )
+    assert (x, y) == history.latest[1][:2]
+
+
+def test_input():
+    keys = codec.LEFT_KEY | codec.STRAFE_KEY
+    data = codec.encode_input(7, 0x10002, [(keys, 16), (0, 300)])
+
+    assert codec.decode_input(data) == (
+        7, 2, [(keys, 16), (0, codec.MAX_COMMAND_MS)]
+    )
+    assert len(data) < len(codec.encode_state(7, dict(codec.SCHEMA, id=0)))
+
+
+def test_input_truncated():
+    data = codec.encode_input(7, 1, [(0, 16)] * 3)
+
+    with pytest.raises(ServerError):
+        codec.decode_input(data[:-1])
+    with pytest.raises(ServerError):
+        codec.encode_input(7, 1, [(0, 16)] * (codec.MAX_COMMANDS + 1))
+
+
+def test_input_ack():
+    fields = (12.3, 45.6, 3, 0b101, 'user')
+    seq, (x, y, step, flags) = codec.decode_input_ack(
+        codec.encode_input_ack(0x10005, fields)
+    )
+
+    assert seq == 5
+    assert x == pytest.approx(12.3, abs=1 / codec.POSITION_SCALE)
+    assert y == pytest.approx(45.6, abs=1 / codec.POSITION_SCALE)
+    assert (step, flags) == (3, 0b101)
+
+
+def test_delta_nothing_changed(mock_snapshot):
+    data = codec.encode_snapshot(2, 1, mock_snapshot, mock_snapshot)
+
+    assert len(data) == (
+        codec.MESSAGE_HEADER.size + 2 * codec.SEQUENCE.size
+        + 2 * codec.COUNT.size
+    )
+
+
+def test_delta_new_player_sends_username(mock_player, mock_snapshot):
+    history = SnapshotHistory()
+    codec.decode_snapshot(
+        codec.encode_snapshot(1, 0, {}, mock_snapshot), history
+    )
+
+    snapshot = dict(mock_snapshot)
+    snapshot.update(codec.snapshot_fields(
+        {9: mock_player(player_id=9, username='NewUser').attributes}
+    ))
+    data = codec.encode_snapshot(2, 1, mock_snapshot, snapshot)
+
+    assert b'NewUser' in data
+    assert b'TestUser' not in data
+    codec.decode_snapshot(data, history)
+    assert history.latest[9][-1] == 'NewUser'
+
+
+def test_delta_removed_player(mock_snapshot):
+    history = SnapshotHistory()
+    codec.decode_snapshot(
+        codec.encode_snapshot(1, 0, {}, mock_snapshot), history
+    )
+
+    snapshot = dict(mock_snapshot)
+    del snapshot[2]
+    codec.decode_snapshot(
+        codec.encode_snapshot(2, 1, mock_snapshot, snapshot), history
+    )
+
+    assert 2 not in history.latest
+    assert history.latest == snapshot
+
+
+def test_delta_applied_to_its_baseline(mock_other_players_attributes):
+    """A delta against an older snapshot ignores newer ones."""
+    history = SnapshotHistory()
+    first = codec.snapshot_fields(mock_other_players_attributes)
+    codec.decode_snapshot(codec.encode_snapshot(1, 0, {}, first), history)
+
+    mock_other_players_attributes[1]['x'] = 50
+    second = codec.snapshot_fields(mock_other_players_attributes)
+    codec.decode_snapshot(codec.encode_snapshot(2, 1, first, second), history)
+
+    mock_other_players_attributes[1]['x'] = 0
+    third = codec.snapshot_fields(mock_other_players_attributes)
+    codec.decode_snapshot(codec.encode_snapshot(3, 1, first, third), history)
+
+    assert history.latest == third
+
+
+def test_delta_missing_baseline(mock_snapshot):
+    history = SnapshotHistory()
+    data = codec.encode_snapshot(5, 4, mock_snapshot, mock_snapshot)
+
+    assert codec.decode_snapshot(data, history) is None
+    assert history.seq == 0
+
+
+def test_wrong_version():
+    data = bytearray(codec.encode_welcome(1))
+    data[0] = codec.VERSION + 1
+
+    with pytest.raises(ServerError) as err:
+        codec.decode_welcome(data)
+
+    err.match('Unsupported codec version')
+
+
+def test_wrong_message_type():
+    with pytest.raises(ServerError) as err:
+        codec.decode_welcome(codec.encode_hello('TestUser', 'lobby'))
+
+    err.match('Unexpected message type')
+
+
+def test_heartbeat():
+    data = codec.encode_heartbeat()
+
+    assert codec.message_type(data) == codec.HEARTBEAT
+    assert len(data) == codec.MESSAGE_HEADER.size
+
+
+def test_compression():
+    data = codec.encode_compression((1, 2))
+
+    assert codec.decode_compression(data) == (1, 2)
+
+
+def test_compressed():
+    method, payload = codec.decode_compressed(
+        codec.encode_compressed(1, b'payload')
+    )
+
+    assert method == 1
+    assert payload == b'payload'
+
+
+def test_say():
+    text = '{"text": "' + 'é' * 300 + '"}'
+
+    assert codec.decode_say(codec.encode_say(text)) == text
+
+
+def test_say_too_long():
+    with pytest.raises(ServerError):
+        codec.encode_say('a' * 2 ** 16)
+
+
+def test_say_not_utf_8():
+    with pytest.raises(ServerError):
+        codec.decode_say(codec.encode_say('"hello"')[:-1] + b'\xff')
+
+
+def test_chat():
+    data = codec.encode_chat('f92d896a', '{"text": "hello"}')
+
+    assert codec.decode_chat(data) == ('f92d896a', '{"text": "hello"}')
+
+
+def test_message_type_checks_version():
+    data = bytearray(codec.encode_heartbeat())
+    data[0] = codec.VERSION + 1
+
+    with pytest.raises(ServerError):
+        codec.message_type(data)
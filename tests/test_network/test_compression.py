@@ -0,0 +1,46 @@
+import pytest
+
+from game.errors import ServerError
+from network import compression
+from network.compression import Compressor, Decompressor
+
+
+def test_choose():
+    assert compression.choose((99, compression.ZLIB)) == compression.ZLIB
+    assert compression.choose((99,)) is None
+    assert compression.choose(()) is None
+
+
+def test_unsupported_method():
+    with pytest.raises(ServerError):
+        Compressor(99)
+    with pytest.raises(ServerError):
+        Decompressor(99)
+
+
+def test_stream():
+    compressor = Compressor()
+    decompressor = Decompressor()
+    messages = [f'player_{i % 10} moved to {i}'.encode() for i in range(50)]
+
+    for message in messages:
+        assert decompressor.decompress(
+            compressor.compress(message)
+        ) == message
+
+    # Later messages are compressed against the earlier ones.
+    assert compressor.stats['ratio'] < 0.5
+    assert compressor.stats['raw'] == sum(map(len, messages))
+
+
+def test_decompress_corrupt():
+    with pytest.raises(ServerError):
+        Decompressor().decompress(b'\xff' * 10)
+
+
+def test_decompress_too_large(monkeypatch):
+    monkeypatch.setattr(compression, 'MAX_FRAME_SIZE', 100)
+    data = Compressor().compress(b'\x00' * 1000)
+
+    with pytest.raises(ServerError):
+        Decompressor().decompress(data)
@@ -0,0 +1,138 @@
+import asyncio
+import pickle
+
+import pytest
+
+from game.errors import ServerError
+from network.framing import (
+    HEADER,
+    FrameReader,
+    frame,
+    read_frame,
+    send_frame
+)
+from unittest.mock import Mock, patch
+
+
+@pytest.fixture
+def mock_socket(mock_recv_into):
+    def _mock_socket(*payloads):
+        with patch('socket.socket') as mock_socket:
+            mock_socket.recv_into.side_effect = mock_recv_into(*payloads)
+            return mock_socket
+    return _mock_socket
+
+
+@pytest.fixture
+def mock_trickle_socket():
+    """A socket which only ever returns a single byte per read."""
+    def _mock_trickle_socket(*payloads):
+        data = bytearray(b''.join(frame(payload) for payload in payloads))
+
+        def recv_into(buffer, n_bytes=0):
+            if not data:
+                return 0
+            buffer[0] = data.pop(0)
+            return 1
+
+        conn = Mock()
+        conn.recv_into.side_effect = recv_into
+        return conn
+    return _mock_trickle_socket
+
+
+def test_frame():
+    assert frame(b'hello') == HEADER.pack(5) + b'hello'
+
+
+def test_send_frame():
+    conn = Mock()
+    send_frame(conn, b'hello')
+
+    conn.sendall.assert_called_once_with(HEADER.pack(5) + b'hello')
+
+
+def test_read_frames_are_kept_apart(mock_socket):
+    reader = FrameReader(mock_socket(b'first', b'second'))
+
+    assert bytes(reader.read()) == b'first'
+    assert bytes(reader.read()) == b'second'
+
+
+def test_read_frame_larger_than_buffer(mock_socket):
+    players = {i: {'x': i, 'username': f'player {i}'} for i in range(500)}
+    payload = pickle.dumps(players)
+    reader = FrameReader(mock_socket(payload), buffer_size=16)
+
+    assert len(payload) > 16
+    assert pickle.loads(reader.read()) == players
+
+
+def test_read_reuses_buffer(mock_socket):
+    reader = FrameReader(mock_socket(b'abc', b'def'))
+    buffer = reader.buffer
+
+    reader.read()
+    reader.read()
+
+    assert reader.buffer is buffer
+
+
+def test_read_partial_reads(mock_trickle_socket):
+    reader = FrameReader(mock_trickle_socket(b'split up', b'again'))
+
+    assert bytes(reader.read()) == b'split up'
+    assert bytes(reader.read()) == b'again'
+
+
+def test_read_connection_closed(mock_socket):
+    with pytest.raises(EOFError):
+        FrameReader(mock_socket()).read()
+
+
+def test_read_connection_closed_mid_frame():
+    conn = Mock()
+    data = [HEADER.pack(10), b'short']
+
+    def recv_into(buffer, n_bytes=0):
+        if not data:
+            return 0
+        chunk = data.pop(0)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    conn.recv_into.side_effect = recv_into
+
+    with pytest.raises(EOFError):
+        FrameReader(conn).read()
+
+
+def test_read_frame_too_large():
+    conn = Mock()
+    header = HEADER.pack(2 ** 32 - 1)
+
+    def recv_into(buffer, n_bytes=0):
+        buffer[:] = header
+        return len(header)
+
+    conn.recv_into.side_effect = recv_into
+
+    with pytest.raises(ServerError) as err:
+        FrameReader(conn).read()
+
+    err.match('exceeds the maximum frame size')
+
+
+def test_async_read_frame():
+    async def _read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(frame(b'first') + frame(b'second'))
+        reader.feed_eof()
+
+        frames = [await read_frame(reader), await read_frame(reader)]
+        with pytest.raises(EOFError):
+            await read_frame(reader)
+
+        return frames
+
+    assert asyncio.run(_read()) == [b'first', b'second']
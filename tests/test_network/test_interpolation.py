@@ -0,0 +1,64 @@
+import pytest
+
+from network import codec
+from network.interpolation import (
+    MAX_EXTRAPOLATION, Interpolation, JitterBuffer
+)
+
+
+def _snapshot(x, y, standing=False):
+    return {
+        1: codec.snapshot_fields({1: {
+            **codec.SCHEMA, 'x': x, 'y': y, 'standing': standing,
+            'username': 'user'
+        }})[1]
+    }
+
+
+def test_interpolates_between_samples():
+    buffer = JitterBuffer()
+    buffer.add(1.0, 0, 0, True)
+    buffer.add(1.1, 10, 20, True)
+    buffer.add(1.2, 20, 20, True)
+
+    assert buffer.sample(1.05) == pytest.approx((5, 10))
+    assert buffer.sample(1.15) == pytest.approx((15, 20))
+    assert buffer.sample(0.5) == (0, 0)
+
+
+def test_extrapolation_is_bounded():
+    buffer = JitterBuffer()
+    buffer.add(1.0, 0, 0, True)
+    buffer.add(1.1, 10, 0, True)
+
+    assert buffer.sample(1.15) == pytest.approx((15, 0))
+    assert buffer.sample(5.0) == pytest.approx(
+        (10 + 100 * MAX_EXTRAPOLATION, 0)
+    )
+
+
+def test_no_extrapolation_when_standing():
+    buffer = JitterBuffer()
+    buffer.add(1.0, 0, 0, True)
+    buffer.add(1.1, 10, 0, False)
+
+    assert buffer.sample(2.0) == (10, 0)
+
+
+def test_interpolation_draws_in_the_past():
+    interpolation = Interpolation(delay=0.1)
+    interpolation.add(1.0, _snapshot(0, 0))
+    interpolation.add(1.1, _snapshot(10, 0))
+    # The same snapshot again is ignored.
+    interpolation.add(1.1, _snapshot(50, 0))
+
+    assert interpolation.position(1, 1.15) == pytest.approx((5, 0))
+    assert interpolation.position(2, 1.15) is None
+
+
+def test_interpolation_forgets_players_who_left():
+    interpolation = Interpolation()
+    interpolation.add(1.0, _snapshot(0, 0))
+    interpolation.add(1.1, {})
+
+    assert interpolation.position(1, 1.2) is None
@@ -0,0 +1,11 @@
+from network.mailbox import Mailbox
+
+
+def test_take_latest():
+    mailbox = Mailbox()
+    mailbox.put(1)
+    mailbox.put(2)
+
+    assert mailbox.take() == 2
+    assert mailbox.take() is None
+    assert mailbox.take('empty') == 'empty'
@@ -1,10 +1,17 @@
-import pickle
-from unittest.mock import call, patch
+import threading
+import time
+
+from unittest.mock import Mock, call, patch
 
 import pytest
 
 from game.errors import ServerError
+from game.remote_player import RemotePlayer
+from network import codec, compression
+from network.compression import Compressor
+from network.framing import HEADER, frame
 from network.network import (
+    KEEPALIVE_INTERVAL,
     Network,
     _delete_player,
     _update_player,
@@ -21,38 +28,53 @@ def mock_player_attributes(mock_player):
 
 
 @pytest.fixture
-def mock_other_players(mock_player):
-    players = {
-        1: mock_player(player_id=1),
-        2: mock_player(player_id=2),
-        3: mock_player(player_id=3),
-        4: mock_player(player_id=4),
-        5: mock_player(player_id=5)
+def mock_sprites():
+    with patch('game.remote_player.load_player_img') as mock_load, patch.dict(
+        'game.remote_player._sprites', clear=True
+    ):
+        yield mock_load
+
+
+@pytest.fixture
+def mock_other_players(mock_sprites, mock_other_players_attributes):
+    return {
+        player_id: RemotePlayer(player_id, fields)
+        for player_id, fields in codec.snapshot_fields(
+            mock_other_players_attributes
+        ).items()
     }
-    return players
 
 
 @pytest.fixture
-def mock_recv_player_data(mock_os_config, mock_other_players_attributes):
+def mock_recv_player_data(
+    mock_os_config, mock_other_players_attributes, mock_recv_into
+):
     def _mock_recv_player_data(players=mock_other_players_attributes):
         with patch('socket.socket') as mock_socket:
-            mock_socket.return_value.recv.return_value = pickle.dumps(
-                players
+            mock_player_id = 0
+            mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+                codec.encode_welcome(mock_player_id),
+                codec.encode_snapshot(
+                    1, 0, {}, codec.snapshot_fields(players)
+                )
             )
-            return Network()
+            net = Network('TestUser')
+            # The snapshot is waiting to be read, then nothing more.
+            net._ready = Mock(side_effect=[True, False])
+            return net
 
     return _mock_recv_player_data
 
 
 @pytest.fixture
-def mock_no_data_from_server(mock_os_config):
+def mock_no_data_from_server(mock_os_config, mock_recv_into):
     with patch('socket.socket') as mock_socket:
         mock_player_id = 0
-        mock_socket.return_value.recv.return_value = pickle.dumps(
-            mock_player_id
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(mock_player_id)
         )
-        net = Network()
-        mock_socket.return_value.recv.return_value = b''
+        net = Network('TestUser')
+        net._ready = Mock(return_value=True)
         yield net
 
 
@@ -72,27 +94,44 @@ def mock_create_player(mock_player):
 
 @pytest.fixture
 def mock_new_player(mock_player):
-    with patch('network.network.Player') as mock_new_player_player:
+    with patch('network.network.RemotePlayer') as mock_new_player_player:
         mock_new_player_player.return_value = mock_player()
         yield mock_new_player_player
 
 
-def test_init(mock_os_config):
+def test_init(mock_os_config, mock_recv_into):
     with patch('socket.socket') as mock_socket:
         mock_player_id = 0
-        mock_socket.return_value.recv.return_value = pickle.dumps(
-            mock_player_id
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(mock_player_id)
         )
-        net = Network()
+        net = Network('TestUser')
 
         assert net.addr == mock_os_config
         assert net.data
+        assert net.player_id == mock_player_id
         net.client.connect.assert_called_with(mock_os_config)
+        assert net.client.sendall.call_args_list == [
+            call(frame(codec.encode_hello('TestUser', 'lobby'))),
+            call(frame(codec.encode_compression(compression.METHODS))),
+        ]
+
+
+def test_init_without_compression(mock_os_config, mock_recv_into):
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0)
+        )
+        net = Network('TestUser', compress=False)
+
+        net.client.sendall.assert_called_once_with(
+            frame(codec.encode_hello('TestUser', 'lobby'))
+        )
 
 
 def test_init_server_down(mock_os_config):
     with pytest.raises(ServerError) as err:
-        net = Network()
+        net = Network('TestUser')
 
         assert net.addr == mock_os_config
         assert not net.data
@@ -110,6 +149,331 @@ def test_fetch_player_data_calls_update_player(
     assert mock_update_player.call_count == len(mock_other_players)
 
 
+def test_fetch_player_data_interpolates(
+    mock_player,
+    mock_other_players,
+    mock_recv_player_data,
+    mock_other_players_attributes
+):
+    net = mock_recv_player_data()
+    fetch_player_data(mock_player(), mock_other_players, net)
+    mock_other_players[1].x = -1
+    net._ready = Mock(return_value=False)
+    fetch_player_data(mock_player(), mock_other_players, net)
+
+    assert net.interpolation.buffers.keys() == (
+        mock_other_players_attributes.keys()
+    )
+    assert mock_other_players[1].x == mock_other_players_attributes[1]['x']
+
+
+def test_send_rate_limited(mock_player, mock_recv_player_data):
+    net = mock_recv_player_data()
+    net._ready = Mock(return_value=False)
+    sent_on_connect = net.client.sendall.call_count
+
+    for _ in range(5):
+        net._send(mock_player().attributes)
+
+    assert net.client.sendall.call_count == sent_on_connect + 1
+
+    net.last_due -= net.send_interval
+    net._send(mock_player(x=10).attributes)
+
+    assert net.client.sendall.call_count == sent_on_connect + 2
+
+
+def test_send_only_changes(mock_player, mock_recv_player_data):
+    net = mock_recv_player_data()
+    net._ready = Mock(return_value=False)
+    sent_on_connect = net.client.sendall.call_count
+
+    for x in (0, 0, 0, 0.01, 5):
+        net._send(mock_player(x=x).attributes)
+        net.last_due -= net.send_interval
+
+    # A change too small to be sent is no change.
+    assert net.client.sendall.call_args_list[sent_on_connect:] == [
+        call(frame(codec.encode_state(0, mock_player(x=0).attributes))),
+        call(frame(codec.encode_state(0, mock_player(x=5).attributes))),
+    ]
+    assert (net.updates_sent, net.updates_skipped) == (2, 3)
+
+    # Kept alive, acknowledging the snapshots received.
+    net.last_sent -= KEEPALIVE_INTERVAL
+    net.ack = 3
+    net._send(mock_player(x=5).attributes)
+
+    net.client.sendall.assert_called_with(
+        frame(codec.encode_state(3, mock_player(x=5).attributes))
+    )
+    assert net.updates_sent == 3
+
+
+def test_send_inputs_standing_still(mock_player, mock_recv_player_data):
+    net = mock_recv_player_data()
+    net.send_inputs = True
+    net._ready = Mock(return_value=False)
+    net._send(mock_player().attributes)
+    sent_after_state = net.client.sendall.call_count
+
+    for keys in (0, 0, 0, codec.LEFT_KEY):
+        net.command(keys, 16)
+        net._send(mock_player().attributes)
+        net.last_due -= net.send_interval
+
+    # Standing still after the first command, until the keys change.
+    assert net.client.sendall.call_args_list[sent_after_state:] == [
+        call(frame(codec.encode_input(0, 1, [(0, 16)]))),
+        call(frame(codec.encode_input(0, 4, [(codec.LEFT_KEY, 16)]))),
+    ]
+    assert net.updates_skipped == 2
+
+
+def test_send_inputs(mock_player, mock_recv_player_data):
+    net = mock_recv_player_data()
+    net.send_inputs = True
+    net._ready = Mock(return_value=False)
+    sent_on_connect = net.client.sendall.call_count
+    attributes = mock_player().attributes
+
+    for keys in (codec.LEFT_KEY, codec.LEFT_KEY, codec.UP_KEY, codec.UP_KEY):
+        net.command(keys, 16)
+        net._send(attributes)
+
+    # The state to start from, then the commands as soon as the keys
+    # change.
+    assert net.client.sendall.call_args_list[sent_on_connect:] == [
+        call(frame(codec.encode_state(0, attributes))),
+        call(frame(codec.encode_input(0, 2, [(codec.LEFT_KEY, 16)]))),
+        call(frame(codec.encode_input(0, 3, [(codec.UP_KEY, 16)]))),
+    ]
+    assert list(net.unsent) == [(4, codec.UP_KEY, 16)]
+
+
+def test_receive_input_ack(
+    mock_os_config, mock_player, mock_recv_into, mock_other_players
+):
+    fields = (12, 34, 0, 0)
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0),
+            codec.encode_input_ack(3, (*fields, 'user'))
+        )
+        net = Network('TestUser')
+        net._ready = Mock(side_effect=[True, False])
+        net.prediction = Mock()
+        fetch_player_data(mock_player(), mock_other_players, net)
+
+    net.prediction.reconcile.assert_called_once()
+    assert net.prediction.reconcile.call_args.args[1:] == (3, fields)
+
+
+def test_send_nothing_received(mock_player, mock_recv_player_data):
+    net = mock_recv_player_data()
+    net._ready = Mock(return_value=False)
+
+    assert net._send(mock_player().attributes) == {}
+    assert net.ack == 0
+
+
+def test_receive_applies_latest_snapshot(
+    mock_os_config, mock_other_players_attributes, mock_recv_into
+):
+    first = codec.snapshot_fields(mock_other_players_attributes)
+    mock_other_players_attributes[1]['x'] = 40
+    second = codec.snapshot_fields(mock_other_players_attributes)
+
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0),
+            codec.encode_snapshot(1, 0, {}, first),
+            codec.encode_snapshot(2, 0, {}, second)
+        )
+        net = Network('TestUser')
+        net._ready = Mock(side_effect=[True, True, False])
+
+        changed = net._receive()
+
+    assert net.ack == 2
+    assert changed[1][0] == 40
+    assert net.players == second
+
+
+def test_receive_skips_heartbeats(
+    mock_os_config, mock_other_players_attributes, mock_recv_into
+):
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0),
+            codec.encode_snapshot(1, 0, {}, snapshot),
+            codec.encode_heartbeat()
+        )
+        net = Network('TestUser')
+        net._ready = Mock(side_effect=[True, True, False])
+
+        net._receive()
+
+    assert net.ack == 1
+    assert net.players == snapshot
+
+
+def test_receive_decompresses(
+    mock_os_config, mock_other_players_attributes, mock_recv_into
+):
+    first = codec.snapshot_fields(mock_other_players_attributes)
+    mock_other_players_attributes[1]['x'] = 40
+    second = codec.snapshot_fields(mock_other_players_attributes)
+    compressor = Compressor()
+
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0),
+            *(
+                codec.encode_compressed(
+                    compression.ZLIB,
+                    compressor.compress(codec.encode_snapshot(seq, 0, {}, s))
+                )
+                for seq, s in ((1, first), (2, second))
+            ),
+            codec.encode_heartbeat()
+        )
+        net = Network('TestUser')
+        net._ready = Mock(side_effect=[True, True, True, False])
+
+        net._receive()
+
+    assert net.ack == 2
+    assert net.players == second
+
+
+def test_receive_chat(
+    mock_os_config, mock_other_players_attributes, mock_recv_into
+):
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0),
+            codec.encode_chat('1', '{"text": "hello"}'),
+            codec.encode_snapshot(1, 0, {}, snapshot),
+            codec.encode_chat('2', '{"text": "there"}')
+        )
+        net = Network('TestUser')
+        net._ready = Mock(side_effect=[True, True, True, False])
+
+        net._receive()
+
+    assert net.ack == 1
+    assert net.take_chat() == [
+        {'id': '1', 'data': '{"text": "hello"}'},
+        {'id': '2', 'data': '{"text": "there"}'},
+    ]
+    assert net.take_chat() == []
+
+
+def test_say(mock_no_data_from_server):
+    net = mock_no_data_from_server
+    net.say({'text': 'hello'})
+
+    net.client.sendall.assert_called_with(
+        frame(codec.encode_say('{"text": "hello"}'))
+    )
+
+
+def _ready_once(timeout=0):
+    """Data is waiting the first time, not after that."""
+    if _ready_once.calls:
+        time.sleep(timeout)
+    _ready_once.calls += 1
+    return _ready_once.calls == 1
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_exchange_through_thread(
+    mock_player, mock_recv_player_data, mock_other_players_attributes
+):
+    net = mock_recv_player_data()
+    _ready_once.calls = 0
+    net._ready = _ready_once
+    attributes = mock_player().attributes
+    net.start()
+    changed = {}
+    assert _wait_for(lambda: changed.update(net.exchange(attributes)) or (
+        changed
+    ))
+    assert net.exchange(attributes) == {}
+    net.say({'text': 'hello'})
+    assert _wait_for(lambda: not net.said)
+    net.stop()
+
+    assert changed.keys() == mock_other_players_attributes.keys()
+    assert net.ack == 1
+    assert codec.STATE in [
+        codec.message_type(sent.args[0][HEADER.size:])
+        for sent in net.client.sendall.call_args_list
+    ]
+    net.client.sendall.assert_called_with(
+        frame(codec.encode_say('{"text": "hello"}'))
+    )
+
+
+def test_exchange_thread_error(mock_player, mock_no_data_from_server):
+    net = mock_no_data_from_server
+    net.start()
+    assert _wait_for(lambda: not net.running)
+
+    with pytest.raises(ServerError) as err:
+        net.exchange(mock_player().attributes)
+
+    err.match('Could not receive data from server.')
+
+
+def test_exchange_thread_unexpected_error(
+    mock_player, mock_no_data_from_server
+):
+    net = mock_no_data_from_server
+    net._receive = Mock(side_effect=RuntimeError('deque mutated'))
+    net.start()
+    assert _wait_for(lambda: not net.running)
+
+    with pytest.raises(RuntimeError):
+        net.exchange(mock_player().attributes)
+
+
+def test_commands_given_while_sending(mock_player, mock_recv_player_data):
+    net = mock_recv_player_data()
+    net.send_inputs = True
+    net._ready = Mock(return_value=False)
+    net._send(mock_player().attributes)
+    sent_after_state = net.client.sendall.call_count
+    count = 20000
+
+    def play():
+        for i in range(count):
+            net.command(codec.LEFT_KEY if i % 3 else codec.UP_KEY, 16)
+
+    game_loop = threading.Thread(target=play)
+    game_loop.start()
+    while game_loop.is_alive():
+        net._send_update({}, time.monotonic())
+    net._send_update({}, time.monotonic())
+
+    seqs = []
+    for sent in net.client.sendall.call_args_list[sent_after_state:]:
+        _, seq, commands = codec.decode_input(sent.args[0][HEADER.size:])
+        seqs.extend(range(seq, seq + len(commands)))
+    assert seqs == list(range(1, count + 1))
+
+
 def test_fetch_player_data_cannot_receive_data(
     mock_player, mock_other_players, mock_no_data_from_server
 ):
@@ -121,6 +485,36 @@ def test_fetch_player_data_cannot_receive_data(
     err.match('Could not receive data from server.')
 
 
+def test_send_reconnects(
+    mock_os_config, mock_player, mock_recv_into, mock_new_player
+):
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(3, 'f92d896a'),
+            codec.encode_snapshot(1, 0, {}, {}),
+        )
+        net = Network('TestUser', compress=False)
+        net._ready = Mock(side_effect=[True, False])
+        net._receive()
+        # The connection drops, the server resumes the session.
+        mock_socket.return_value.sendall.side_effect = [
+            BrokenPipeError, None
+        ]
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(3, 'f92d896a', resumed=True)
+        )
+
+        assert net._send(mock_player().attributes) == {}
+
+    assert mock_socket.return_value.sendall.call_args.args[0] == frame(
+        codec.encode_hello('TestUser', 'lobby', 'f92d896a')
+    )
+    mock_socket.return_value.close.assert_called_once()
+    assert net.player_id == 3
+    assert net.resumed
+    assert net.ack == 0
+
+
 def test_fetch_player_data_ignore_local_user_player_data(
     mock_player,
     mock_player_attributes,
@@ -158,91 +552,124 @@ def test_fetch_player_data_only_one_player_online(
 
 
 def test_fetch_player_data_player_disconnected(
+    mock_os_config,
     mock_player,
-    mock_player_attributes,
+    mock_recv_into,
     mock_other_players,
-    mock_recv_player_data,
-    mock_update_player
+    mock_other_players_attributes
 ):
-    fetch_player_data(
-        mock_player(),
-        mock_other_players,
-        mock_recv_player_data(
-            mock_player_attributes(
-                player_id=1, x=None
-            )
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+    left = dict(snapshot)
+    del left[1]
+    with patch('socket.socket') as mock_socket:
+        mock_socket.return_value.recv_into.side_effect = mock_recv_into(
+            codec.encode_welcome(0),
+            codec.encode_snapshot(1, 0, {}, snapshot),
+            codec.encode_snapshot(2, 1, snapshot, left)
         )
-    )
+        net = Network('TestUser')
+        net._ready = Mock(side_effect=[True, False, True, False])
+        fetch_player_data(mock_player(), mock_other_players, net)
+        assert 1 in mock_other_players
 
-    assert mock_update_player.call_count == 0
+        fetch_player_data(mock_player(), mock_other_players, net)
 
+    assert list(mock_other_players) == [2, 3, 4, 5]
 
-def test_delete_player(
-    mock_player,
-    mock_player_attributes,
-    mock_other_players,
+
+def test_apply_snapshot_returns_changed_players(
+    mock_recv_player_data, mock_other_players_attributes
 ):
+    net = mock_recv_player_data()
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
 
-    player_id = 1
-    mock_player_data = mock_player_attributes(player_id=1)[player_id]
-    _delete_player(mock_other_players, mock_player_data)
+    assert net._apply_snapshot(codec.encode_snapshot(1, 0, {}, snapshot)) == (
+        snapshot
+    )
+    assert net.ack == 1
 
-    assert player_id not in mock_other_players
+    mock_other_players_attributes[2]['x'] = 80
+    moved = codec.snapshot_fields(mock_other_players_attributes)
+    changed = net._apply_snapshot(codec.encode_snapshot(2, 1, snapshot, moved))
 
+    assert changed == {2: moved[2]}
+    assert net.ack == 2
 
-def test_delete_player_invalid_player_key(
-    mock_player,
-    mock_player_attributes,
-    mock_other_players,
+
+def test_apply_snapshot_removed_player(
+    mock_recv_player_data, mock_other_players_attributes
 ):
+    net = mock_recv_player_data()
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+    net._apply_snapshot(codec.encode_snapshot(1, 0, {}, snapshot))
+
+    removed = dict(snapshot)
+    del removed[3]
+    changed = net._apply_snapshot(
+        codec.encode_snapshot(2, 1, snapshot, removed)
+    )
 
-    player_id = 10
-    mock_player_data = mock_player_attributes(player_id=player_id)[player_id]
-    _delete_player(mock_other_players, mock_player_data)
+    assert changed == {3: None}
 
 
-def test_update_player(
-    mock_player,
-    mock_player_attributes,
-    mock_other_players,
+def test_apply_snapshot_missing_baseline_requests_keyframe(
+    mock_recv_player_data, mock_other_players_attributes
 ):
-    new_x = 123
-    new_y = 456
-    _current_step = 4
-    mock_player_data = mock_player_attributes(
-        player_id=1, x=new_x, y=new_y, _current_step=_current_step
-    )[1]
-    _update_player(mock_other_players, mock_player_data)
+    net = mock_recv_player_data()
+    snapshot = codec.snapshot_fields(mock_other_players_attributes)
+    net._apply_snapshot(codec.encode_snapshot(1, 0, {}, snapshot))
+
+    changed = net._apply_snapshot(
+        codec.encode_snapshot(50, 49, snapshot, snapshot)
+    )
+
+    assert changed == {}
+    assert net.ack == 0
+
 
-    updated_player = mock_other_players[mock_player_data['id']]
-    assert updated_player.x == new_x
-    assert updated_player.y == new_y
-    assert updated_player.walk_count == _current_step
+def test_delete_player(mock_other_players):
+    _delete_player(mock_other_players, 1)
+
+    assert 1 not in mock_other_players
+
+
+def test_delete_player_invalid_player_key(mock_other_players):
+    _delete_player(mock_other_players, 10)
+
+    assert len(mock_other_players) == 5
+
+
+def test_update_player(mock_player_attributes, mock_other_players):
+    player = mock_other_players[1]
+    fields = codec.snapshot_fields(mock_player_attributes(
+        player_id=1, x=123, y=456, _current_step=4
+    ))[1]
+    _update_player(mock_other_players, 1, fields)
+
+    assert mock_other_players[1] is player
+    assert (player.x, player.y, player.walk_count) == (123, 456, 4)
+    assert player.username == 'TestUser'
 
 
 def test_update_player_calls_create_new_player(
-    mock_player,
     mock_player_attributes,
     mock_other_players,
     mock_create_player,
 ):
-    mock_player_data = mock_player_attributes(player_id=10)[10]
-    _update_player(mock_other_players, mock_player_data)
+    fields = codec.snapshot_fields(mock_player_attributes(player_id=10))[10]
+    _update_player(mock_other_players, 10, fields)
 
-    assert mock_create_player.call_count == 1
+    assert mock_create_player.call_args == call(mock_other_players, 10, fields)
 
 
 def test_create_player(
     mock_other_players, mock_player_attributes, mock_new_player
 ):
     player_id = 99
-    mock_player_data = mock_player_attributes(
+    fields = codec.snapshot_fields(mock_player_attributes(
         x=50, y=50, player_id=player_id, username='My Created Player'
-    )[99]
-    _create_player(mock_other_players, mock_player_data)
+    ))[player_id]
+    _create_player(mock_other_players, player_id, fields)
 
-    assert mock_new_player.call_count == 1
-    assert mock_new_player.call_args_list == [
-        call((50, 50), 99, 'My Created Player')
-    ]
+    assert mock_new_player.call_args_list == [call(player_id, fields)]
     assert player_id in mock_other_players
@@ -0,0 +1,108 @@
+import pytest
+
+from enums.base import Base
+from game.player import Player
+from network import codec
+from network.prediction import Prediction
+from server.simulation import Simulation
+from unittest.mock import patch
+
+TIME_DIFF_MULTIPLYER = Base.TIME_DIFF_MULTIPLYER.value
+
+COMMANDS = (
+    [(codec.RIGHT_KEY, 16)] * 5
+    + [(codec.DOWN_KEY | codec.STRAFE_KEY, 20)] * 3
+    + [(codec.UP_KEY, 17), (0, 16)]
+)
+
+
+@pytest.fixture
+def player():
+    with patch('game.player.load_player_img'), patch('game.player.sound'):
+        yield Player((100, 100))
+
+
+def _ack(player, seq):
+    """The acknowledgement of command seq, the player being where the
+    server left it."""
+    return seq, codec.decode_input_ack(
+        codec.encode_input_ack(seq, codec.snapshot_fields({0: {
+            **player.attributes, 'username': 'user'
+        }})[0])
+    )[1]
+
+
+def _play(player, prediction, commands):
+    for keys, ms in commands:
+        _, keys, ms = prediction.command(keys, ms)
+        player.update(ms * TIME_DIFF_MULTIPLYER, keys)
+
+
+def test_server_moves_as_predicted(player):
+    simulation = Simulation()
+    simulation.input(0, 1, COMMANDS)
+    moved = simulation.step({0: dict(player.attributes)}, 1)
+
+    _play(player, Prediction(), COMMANDS)
+
+    assert (moved[0]['x'], moved[0]['y']) == pytest.approx(
+        (player.x, player.y)
+    )
+    assert moved[0]['right'] == player.right
+    assert moved[0]['standing'] == player.standing
+    assert simulation.acked == {0: len(COMMANDS)}
+
+
+def test_reconcile_replays_pending_commands(player):
+    prediction = Prediction()
+    _play(player, prediction, COMMANDS[:5])
+    acknowledged = _ack(player, 5)
+    _play(player, prediction, COMMANDS[5:])
+    predicted = player.x, player.y
+    walk_count = player.walk_count
+
+    prediction.reconcile(player, *acknowledged)
+
+    assert [seq for seq, _, _ in prediction.pending] == list(
+        range(6, len(COMMANDS) + 1)
+    )
+    assert (player.x, player.y) == pytest.approx(predicted, abs=0.1)
+    assert player.walk_count == walk_count
+    assert prediction.corrections == 0
+
+
+def test_reconcile_corrects_misprediction(player):
+    prediction = Prediction()
+    _play(player, prediction, COMMANDS[:5])
+    seq, fields = _ack(player, 5)
+    _play(player, prediction, COMMANDS[5:8])
+    x, y = player.x, player.y
+
+    # The server had the player somewhere else.
+    prediction.reconcile(player, seq, (fields[0] - 20, *fields[1:]))
+
+    assert player.x == pytest.approx(x - 20, abs=0.1)
+    assert player.y == pytest.approx(y, abs=0.1)
+    assert prediction.corrections == 1
+
+
+def test_acknowledge_across_wrapping():
+    prediction = Prediction()
+    prediction.seq = codec.INPUT_SEQUENCE_MASK - 1
+    for _ in range(4):
+        prediction.command(0, 16)
+    prediction.acknowledge(0)
+
+    assert [seq for seq, _, _ in prediction.pending] == [1, 2]
+
+
+def test_pending_commands_are_bounded():
+    prediction = Prediction(size=3)
+    for _ in range(5):
+        prediction.command(0, 1000)
+
+    assert [command for command in prediction.pending] == [
+        (3, 0, codec.MAX_COMMAND_MS),
+        (4, 0, codec.MAX_COMMAND_MS),
+        (5, 0, codec.MAX_COMMAND_MS),
+    ]
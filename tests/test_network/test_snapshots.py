@@ -0,0 +1,34 @@
+from network.snapshots import SnapshotHistory
+
+
+def test_add():
+    history = SnapshotHistory()
+
+    assert history.seq == 0
+    assert history.latest == {}
+    assert history.add({1: 'first'}) == 1
+    assert history.add({1: 'second'}) == 2
+    assert history.latest == {1: 'second'}
+    assert history.get(1) == {1: 'first'}
+
+
+def test_put():
+    history = SnapshotHistory()
+    history.put(10, {1: 'first'})
+
+    assert history.seq == 10
+    assert 10 in history
+    assert history.add({}) == 11
+
+
+def test_oldest_snapshots_dropped():
+    history = SnapshotHistory(size=3)
+    for i in range(5):
+        history.add({1: i})
+
+    assert 1 not in history
+    assert 2 not in history
+    assert [history.get(seq) for seq in (3, 4, 5)] == [
+        {1: 2}, {1: 3}, {1: 4}
+    ]
+    assert history.get(1) is None
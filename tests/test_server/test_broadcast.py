@@ -0,0 +1,77 @@
+import pytest
+
+from network import codec
+from network.framing import HEADER
+from network.snapshots import SnapshotHistory
+from server.broadcast import SnapshotCache
+
+
+@pytest.fixture
+def cache(mock_other_players_attributes):
+    history = SnapshotHistory()
+    history.add(codec.snapshot_fields(mock_other_players_attributes))
+    return SnapshotCache(history)
+
+
+def test_get_is_framed_snapshot(cache):
+    data = cache.get(0, {})
+
+    history = SnapshotHistory()
+    assert HEADER.unpack_from(data)[0] == len(data) - HEADER.size
+    assert codec.decode_snapshot(data[HEADER.size:], history) == 1
+    assert history.latest == cache.history.latest
+
+
+def test_get_memoizes_per_baseline(cache, mock_other_players_attributes):
+    keyframe = cache.get(0, {})
+    mock_other_players_attributes[1]['x'] = 123
+    cache.history.add(codec.snapshot_fields(mock_other_players_attributes))
+
+    delta = cache.get(1, cache.history.get(1))
+
+    assert cache.get(1, cache.history.get(1)) is delta
+    assert cache.get(0, {}) is not keyframe
+    assert len(delta) < len(cache.get(0, {}))
+    assert cache.hits == 2
+    assert cache.misses == 3
+    assert cache.record_misses == 2 * len(cache.history.latest) + 1
+    assert cache.stats['serialize_ms'] > 0
+
+
+def test_frame_not_shared_with_other_baseline(
+    cache, mock_other_players_attributes
+):
+    latest = cache.history.latest
+    mock_other_players_attributes[1]['x'] = 123
+    cache.history.add(codec.snapshot_fields(mock_other_players_attributes))
+
+    full = cache.get(1, latest)
+    # The baseline of this client left player 1 out of its view.
+    partial = cache.get(1, {2: latest[2]})
+
+    assert partial is not full
+    history = SnapshotHistory()
+    history.put(1, {2: latest[2]})
+    codec.decode_snapshot(partial[HEADER.size:], history)
+    assert history.latest == cache.history.latest
+
+
+def test_new_version_invalidates(cache, mock_other_players_attributes):
+    keyframe = cache.get(0, {})
+    mock_other_players_attributes[1]['x'] = 123
+    cache.history.add(codec.snapshot_fields(mock_other_players_attributes))
+
+    assert cache.get(0, {}) is not keyframe
+    assert cache.version == 2
+    assert list(cache.frames) == [0]
+
+
+def test_views_share_records(cache):
+    latest = cache.history.latest
+    first = cache.get(0, {}, {1: latest[1], 2: latest[2]})
+    second = cache.get(0, {}, {2: latest[2], 3: latest[3]})
+
+    assert first is not second
+    assert cache.misses == 2
+    assert cache.record_hits == 1
+    assert cache.record_misses == 3
@@ -0,0 +1,54 @@
+import json
+import threading
+
+import redis
+
+from fakeredis import FakeStrictRedis
+from game.redis import RedisClient
+from server.chat import ChatStore
+from unittest.mock import Mock
+
+
+def test_save():
+    client = RedisClient(FakeStrictRedis(decode_responses=True))
+    store = ChatStore(client)
+    store.save('f92d896a', {'text': 'hello'})
+    store.close()
+
+    assert store.stats['saved'] == 1
+    assert json.loads(client.get_message('f92d896a')['data']) == {
+        'text': 'hello'
+    }
+
+
+def test_save_error():
+    client = Mock()
+    client.save_message.side_effect = redis.exceptions.ConnectionError
+    store = ChatStore(client)
+    store.save('f92d896a', {'text': 'hello'})
+    store.close()
+
+    assert store.stats['errors'] == 1
+    assert store.stats['saved'] == 0
+
+
+def test_save_full():
+    saving = threading.Event()
+    release = threading.Event()
+
+    def save_message(payload, message_id):
+        saving.set()
+        release.wait()
+
+    client = Mock()
+    client.save_message.side_effect = save_message
+    store = ChatStore(client, max_pending=1)
+    store.save('0', {})
+    saving.wait()
+    store.save('1', {})
+    store.save('2', {})
+    release.set()
+    store.close()
+
+    assert store.stats['saved'] == 2
+    assert store.stats['dropped'] == 1
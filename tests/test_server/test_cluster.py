@@ -0,0 +1,257 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from fakeredis import FakeServer, FakeStrictRedis, TcpFakeServer
+from game.errors import ConfigError
+from network import codec
+from network.framing import FrameReader, send_frame
+from network.snapshots import SnapshotHistory
+from server.cluster import Cluster, ClusterRoom
+from server.server import Server
+from server.connection import Connection
+from unittest.mock import Mock, patch
+
+
+@pytest.fixture
+def redis_server():
+    """A Redis server shared by the nodes, as in a real cluster."""
+    return FakeServer()
+
+
+@pytest.fixture
+def node(mock_os_config, redis_server):
+    def _node(node_id):
+        cluster = Cluster(node_id, FakeStrictRedis(server=redis_server))
+        return Server(
+            first_player_id=cluster.first_player_id,
+            cluster=cluster.room('lobby')
+        )
+    return _node
+
+
+def _snapshot(*player_ids, x=0) -> dict:
+    return {
+        player_id: (x, 0, 0, 0, f'player_{player_id}')
+        for player_id in player_ids
+    }
+
+
+def test_node_player_ids(node):
+    assert node(0).next_player_id() == 0
+    assert node(2).next_player_id() == 2000
+
+
+def test_node_id_out_of_range(redis_server):
+    with pytest.raises(ConfigError):
+        Cluster(66, FakeStrictRedis(server=redis_server))
+
+
+def test_nodes_merge_remote_players(node):
+    first, second = node(0), node(1)
+    first._add_player(first.next_player_id(), 'first')
+    second._add_player(second.next_player_id(), 'second')
+
+    for _ in range(2):
+        first.tick()
+        second.tick()
+
+    assert set(first.snapshots.latest) == {0, 1000}
+    assert set(second.snapshots.latest) == {0, 1000}
+    assert second.snapshots.latest[0][-1] == 'first'
+
+
+def test_nodes_share_moves_and_leaves(node):
+    first, second = node(0), node(1)
+    first._add_player(0, 'first')
+    first._add_player(1, 'other')
+    first.tick()
+    second.tick()
+
+    first._update_player(0, {'x': 50})
+    first.sessions.disconnect(1)
+    first.tick()
+    second.tick()
+
+    assert second.snapshots.latest[0][0] == 50
+    assert 1 not in second.snapshots.latest
+
+
+def test_rooms_are_separate(mock_os_config, redis_server):
+    cluster = Cluster(0, FakeStrictRedis(server=redis_server))
+    lobby = cluster.room('lobby')
+    nature = ClusterRoom(FakeStrictRedis(server=redis_server), 1, 'nature')
+
+    lobby.publish(_snapshot(0))
+    nature.poll()
+
+    assert nature.players() == {}
+
+
+def test_publish_deltas(redis_server):
+    room = ClusterRoom(FakeStrictRedis(server=redis_server), 0, 'lobby')
+    peer = ClusterRoom(FakeStrictRedis(server=redis_server), 1, 'lobby')
+
+    with patch.object(room.redis, 'publish', wraps=room.redis.publish) as p:
+        room.publish(_snapshot(*range(10)))
+        room.publish(_snapshot(*range(10)))
+        room.publish({**_snapshot(*range(10)), 3: (5, 0, 0, 0, 'player_3')})
+
+    keyframe, delta = (call.args[1] for call in p.call_args_list)
+    assert p.call_count == 2
+    assert len(delta) < len(keyframe)
+
+    peer.poll()
+    assert peer.players()[3][0] == 5
+
+
+def test_missed_baseline_waits_for_keyframe(redis_server):
+    room = ClusterRoom(
+        FakeStrictRedis(server=redis_server), 0, 'lobby', keyframe_interval=3
+    )
+    room.publish(_snapshot(0))
+    late = ClusterRoom(FakeStrictRedis(server=redis_server), 1, 'lobby')
+
+    room.publish(_snapshot(0, x=10))
+    late.poll()
+    assert late.players() == {}
+
+    # Nothing changed, so nothing is published until the keyframe.
+    room.publish(_snapshot(0, x=10))
+    room.publish(_snapshot(0, x=10))
+    late.poll()
+    assert late.players() == _snapshot(0, x=10)
+
+
+def test_redis_down(redis_server):
+    room = ClusterRoom(FakeStrictRedis(server=redis_server), 0, 'lobby')
+    peer = ClusterRoom(FakeStrictRedis(server=redis_server), 1, 'lobby')
+    room.publish(_snapshot(0))
+    peer.poll()
+
+    redis_server.connected = False
+    with patch('server.cluster.log') as log:
+        room.publish(_snapshot(0, x=10))
+        peer.poll()
+        peer.poll()
+
+    assert room.redis_errors == 1
+    assert peer.redis_errors == 2
+    assert log.warning.call_count == 2
+    assert peer.players() == _snapshot(0)
+
+    # The snapshot the peer missed is published again, as a keyframe.
+    redis_server.connected = True
+    # Resubscribes.
+    peer.poll()
+    room.publish(_snapshot(0, x=10))
+    peer.poll()
+    assert peer.players() == _snapshot(0, x=10)
+
+
+def test_tick_with_redis_down(node, redis_server):
+    server = node(0)
+    server._add_player(0, 'player_0')
+    connection = server._add_connection(
+        Connection(0, Mock(), server.snapshot_cache)
+    )
+    redis_server.connected = False
+    server.tick()
+
+    assert connection.outbox.depth
+    assert server.cluster.redis_errors == 2
+
+
+def test_silent_node_dropped(redis_server):
+    room = ClusterRoom(FakeStrictRedis(server=redis_server), 0, 'lobby')
+    peer = ClusterRoom(
+        FakeStrictRedis(server=redis_server), 1, 'lobby', node_timeout=0
+    )
+    room.publish(_snapshot(0))
+    peer.poll()
+
+    assert peer.players() == {}
+    assert peer.peers == {}
+
+
+def test_encoded_with_codec(redis_server):
+    room = ClusterRoom(FakeStrictRedis(server=redis_server), 7, 'lobby')
+    listener = FakeStrictRedis(server=redis_server).pubsub()
+    listener.subscribe('lobby:room:lobby')
+    listener.get_message()
+
+    room.publish(_snapshot(0))
+
+    data = listener.get_message()['data']
+    assert data[:2] == b'\x00\x07'
+    assert codec.MESSAGE_HEADER.unpack_from(data, 2) == (
+        codec.VERSION, codec.SNAPSHOT
+    )
+
+
+def _start_node(node_id: int, port: int, redis_port: int):
+    env = dict(
+        os.environ, HOST='127.0.0.1', PORT=str(port),
+        REDIS_PORT=str(redis_port)
+    )
+    process = subprocess.Popen(
+        [sys.executable, 'start_server.py', '--node', str(node_id)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            return process, socket.create_connection(('127.0.0.1', port))
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f'Node {node_id} did not start.')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.slow
+def test_server_processes_share_players():
+    redis_port = _free_port()
+    redis_server = TcpFakeServer(('127.0.0.1', redis_port))
+    threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+
+    nodes = [_start_node(i, _free_port(), redis_port) for i in range(2)]
+    try:
+        views = []
+        for node_id, (_, conn) in enumerate(nodes):
+            send_frame(conn, codec.encode_hello(f'node{node_id}', 'lobby'))
+            frames = FrameReader(conn)
+            player_id, _, _ = codec.decode_welcome(frames.read())
+            send_frame(conn, codec.encode_state(0, codec.fields_to_attributes(
+                player_id, (10 * node_id, 0, 0, 0, f'node{node_id}')
+            )))
+            views.append((conn, frames, SnapshotHistory()))
+
+        deadline = time.monotonic() + 10
+        for conn, frames, history in views:
+            conn.settimeout(10)
+            while len(history.latest) < 2 and time.monotonic() < deadline:
+                codec.decode_snapshot(frames.read(), history)
+
+        assert [set(history.latest) for *_, history in views] == [
+            {0, 1000}, {0, 1000}
+        ]
+    finally:
+        for process, conn in nodes:
+            conn.close()
+            process.kill()
+            process.wait()
+        redis_server.shutdown()
+        redis_server.server_close()
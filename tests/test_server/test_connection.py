@@ -0,0 +1,173 @@
+import threading
+
+import pytest
+
+from network import codec
+from network.compression import Compressor, Decompressor
+from network.framing import HEADER
+from network.snapshots import SnapshotHistory
+from server.broadcast import SnapshotCache
+from server.connection import HEARTBEAT, Connection, Outbox
+from unittest.mock import Mock
+
+
+@pytest.fixture
+def connection(mock_other_players_attributes):
+    history = SnapshotHistory()
+    history.add(codec.snapshot_fields(mock_other_players_attributes))
+    return Connection(1, Mock(), SnapshotCache(history))
+
+
+def test_outbox_latest_wins():
+    outbox = Outbox()
+    outbox.put(b'first')
+    outbox.put(b'second')
+
+    assert outbox.take() == b'second'
+    assert outbox.take() is None
+    assert outbox.queued == 2
+    assert outbox.dropped == 1
+
+
+def test_outbox_depth():
+    outbox = Outbox()
+    assert outbox.depth == 0
+
+    outbox.put(b'first')
+    outbox.take()
+    outbox.put(b'second')
+    assert outbox.depth == 2
+
+    outbox.done()
+    assert outbox.depth == 1
+    assert outbox.sent == 1
+
+
+def test_outbox_lag():
+    outbox = Outbox()
+    assert outbox.lag() == 0.0
+
+    outbox.put(b'first')
+    since = outbox.pending_since
+    outbox.take()
+    # Still owed while it is being sent, even once replaced.
+    outbox.put(b'second')
+    assert outbox.lag(since + 2) == pytest.approx(2)
+
+    outbox.done()
+    assert outbox.lag(since + 2) < 2
+    outbox.take()
+    outbox.done()
+    assert outbox.lag() == 0.0
+
+
+def test_push_queues_snapshot(connection):
+    assert connection.push()
+    assert not connection.push()
+
+    connection.send.assert_not_called()
+    assert connection.outbox.queued == 1
+    assert connection.ready.is_set()
+
+
+def test_flush(connection):
+    assert not connection.flush()
+
+    connection.push()
+    assert connection.flush()
+    connection.send.assert_called_once()
+    assert connection.outbox.depth == 0
+
+
+def test_flush_compresses_large_messages(connection):
+    connection.compressor = Compressor(threshold=0)
+    connection.push()
+    snapshot = bytes(connection.outbox.pending[HEADER.size:])
+    connection.flush()
+
+    data = connection.send.call_args.args[0][HEADER.size:]
+    assert codec.message_type(data) == codec.COMPRESSED
+    assert Decompressor().decompress(
+        codec.decode_compressed(data)[1]
+    ) == snapshot
+
+
+def test_flush_leaves_small_messages(connection):
+    connection.compressor = Compressor()
+    connection.heartbeat()
+    connection.flush()
+
+    connection.send.assert_called_once_with(HEARTBEAT)
+    assert connection.compressor.raw_bytes == 0
+
+
+def test_outbox_posted_messages_all_sent_first():
+    outbox = Outbox()
+    outbox.put(b'snapshot 1')
+    outbox.post(b'chat 1')
+    outbox.put(b'snapshot 2')
+    outbox.post(b'chat 2')
+
+    assert outbox.depth == 3
+    assert [outbox.take() for _ in range(4)] == [
+        b'chat 1', b'chat 2', b'snapshot 2', None
+    ]
+
+
+def test_outbox_lag_of_posted_message():
+    outbox = Outbox()
+    outbox.post(b'chat')
+    posted = outbox.messages[0][0]
+
+    assert outbox.lag(posted + 2) == 2
+
+
+def test_flush_sends_everything(connection):
+    connection.push()
+    connection.post(b'chat')
+
+    assert connection.flush()
+    assert connection.send.call_count == 2
+    assert connection.outbox.depth == 0
+
+
+def test_heartbeat(connection):
+    connection.heartbeat()
+
+    assert codec.message_type(
+        connection.outbox.pending[HEADER.size:]
+    ) == codec.HEARTBEAT
+    assert connection.ready.is_set()
+
+
+def test_heartbeat_not_queued_over_snapshot(connection):
+    connection.push()
+    snapshot = connection.outbox.pending
+    connection.heartbeat()
+
+    assert connection.outbox.pending is snapshot
+    assert connection.outbox.dropped == 0
+
+
+def test_run_sender_sends_until_closed(connection):
+    sent = threading.Event()
+    connection.send.side_effect = lambda data: sent.set()
+    sender = threading.Thread(target=connection.run_sender)
+    sender.start()
+    connection.push()
+
+    assert sent.wait(timeout=1)
+    connection.close()
+    sender.join(timeout=1)
+    assert not sender.is_alive()
+
+
+def test_run_sender_stops_on_send_error(connection):
+    connection.send.side_effect = BrokenPipeError
+    connection.push()
+    sender = threading.Thread(target=connection.run_sender)
+    sender.start()
+    sender.join(timeout=1)
+
+    assert not sender.is_alive()
+    assert connection.outbox.sent == 0
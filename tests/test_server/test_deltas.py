@@ -0,0 +1,127 @@
+import pytest
+
+from network import codec
+from network.snapshots import SnapshotHistory
+from server.deltas import ClientDeltas
+
+
+@pytest.fixture
+def history(mock_other_players_attributes):
+    history = SnapshotHistory()
+    history.add(codec.snapshot_fields(mock_other_players_attributes))
+    return history
+
+
+def _baseline_seq(data: bytes) -> int:
+    (baseline_seq,) = codec.SEQUENCE.unpack_from(
+        data, codec.MESSAGE_HEADER.size + codec.SEQUENCE.size
+    )
+    return baseline_seq
+
+
+def test_first_snapshot_is_keyframe(history):
+    deltas = ClientDeltas(history)
+
+    assert _baseline_seq(deltas.encode()) == 0
+
+
+def test_delta_against_acknowledged_snapshot(
+    history, mock_other_players_attributes
+):
+    deltas = ClientDeltas(history)
+    keyframe = deltas.encode()
+    deltas.acknowledge(1)
+
+    mock_other_players_attributes[1]['x'] = 123
+    history.add(codec.snapshot_fields(mock_other_players_attributes))
+    delta = deltas.encode()
+
+    assert _baseline_seq(delta) == 1
+    assert len(delta) < len(keyframe)
+
+
+def test_egress_scales_with_activity(mock_player):
+    players = {
+        i: mock_player(player_id=i).attributes for i in range(100)
+    }
+    history = SnapshotHistory()
+    history.add(codec.snapshot_fields(players))
+    deltas = ClientDeltas(history)
+    deltas.encode()
+    deltas.acknowledge(history.seq)
+
+    idle = len(deltas.encode())
+
+    players[5]['x'] = 10
+    history.add(codec.snapshot_fields(players))
+    one_moving = len(deltas.encode())
+
+    for i in range(10):
+        players[i]['x'] = 20
+    history.add(codec.snapshot_fields(players))
+    ten_moving = len(deltas.encode())
+
+    assert idle < one_moving < ten_moving
+    assert ten_moving - idle == 10 * (one_moving - idle)
+
+
+def test_keyframe_when_ack_not_in_history(history):
+    deltas = ClientDeltas(history)
+    deltas.acknowledge(1000)
+
+    assert _baseline_seq(deltas.encode()) == 0
+
+
+def test_periodic_keyframe(history):
+    deltas = ClientDeltas(history, keyframe_interval=3)
+    deltas.encode()
+    deltas.acknowledge(1)
+
+    baselines = [_baseline_seq(deltas.encode()) for _ in range(7)]
+
+    assert baselines == [1, 1, 0, 1, 1, 0, 1]
+
+
+def test_up_to_date(history, mock_other_players_attributes):
+    deltas = ClientDeltas(history)
+
+    assert not deltas.up_to_date
+    deltas.encode()
+    assert deltas.up_to_date
+
+    mock_other_players_attributes[1]['x'] = 123
+    history.add(codec.snapshot_fields(mock_other_players_attributes))
+    assert not deltas.up_to_date
+
+
+def test_delta_against_view_sent(history, mock_other_players_attributes):
+    deltas = ClientDeltas(history)
+    view = {1: history.latest[1]}
+    deltas.encode(view)
+    deltas.acknowledge(1)
+
+    mock_other_players_attributes[2]['x'] = 123
+    history.add(codec.snapshot_fields(mock_other_players_attributes))
+    delta = deltas.encode({2: history.latest[2]})
+
+    client = SnapshotHistory()
+    client.put(1, view)
+    codec.decode_snapshot(delta, client)
+    # Player 2 entered the view and player 1 left it.
+    assert client.latest == {2: history.latest[2]}
+
+
+def test_unchanged(history):
+    deltas = ClientDeltas(history)
+    view = {1: history.latest[1]}
+
+    assert not deltas.unchanged(view)
+    deltas.encode(view)
+    # The client has not acknowledged the view yet.
+    assert not deltas.unchanged(view)
+
+    deltas.acknowledge(1)
+    history.add(dict(history.latest))
+
+    assert deltas.unchanged(view)
+    assert deltas.up_to_date
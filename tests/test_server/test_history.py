@@ -0,0 +1,115 @@
+import pytest
+
+from server.history import MIN_TICKS, PlayerHistory
+
+
+def _fields(x, y):
+    return (x, y, 0, 0, 'user')
+
+
+def _record(history, ticks, players=(1,), start=0):
+    """Record ticks a second apart, each player at x = tick."""
+    for tick in range(start, start + ticks):
+        history.record(
+            float(tick),
+            {player_id: _fields(tick, player_id) for player_id in players}
+        )
+
+
+def test_rewind():
+    history = PlayerHistory()
+    _record(history, 10, players=(1, 2))
+
+    assert history.rewind(1, 4.0) == (4, 1)
+    assert history.rewind(2, 4.5) == (4, 2)
+    assert history.rewind(1, 100.0) == (9, 1)
+    assert history.rewind(1, -1.0) is None
+    assert history.rewind(3, 4.0) is None
+
+
+def test_interpolate():
+    history = PlayerHistory()
+    _record(history, 10)
+
+    assert history.interpolate(1, 4.25) == pytest.approx((4.25, 1))
+    assert history.interpolate(1, 3.0) == pytest.approx((3, 1))
+    # Not extrapolated past the last tick.
+    assert history.interpolate(1, 12.0) == pytest.approx((9, 1))
+
+
+def test_player_who_left():
+    history = PlayerHistory()
+    _record(history, 3, players=(1, 2))
+    _record(history, 3, players=(2,), start=3)
+
+    assert history.rewind(1, 2.0) == (2, 1)
+    assert history.rewind(1, 4.0) is None
+    assert history.interpolate(1, 2.5) == pytest.approx((2, 1))
+    assert history.positions(1.0) == {1: (1, 1), 2: (1, 2)}
+    assert history.positions(4.0) == {2: (4, 2)}
+
+
+def test_player_comes_back():
+    history = PlayerHistory()
+    _record(history, 2, players=(1,))
+    _record(history, 2, players=(2,), start=2)
+    _record(history, 2, players=(1, 2), start=4)
+
+    assert history.rewind(1, 1.0) == (1, 1)
+    assert history.rewind(1, 3.0) is None
+    assert history.rewind(1, 5.0) == (5, 1)
+
+
+def test_overwrites_oldest_ticks():
+    history = PlayerHistory(max_bytes=100, players=4)
+    capacity = history.capacity
+    _record(history, capacity + 5)
+
+    assert history.size == capacity
+    assert history.rewind(1, 4.0) is None
+    assert history.rewind(1, 5.0) == (5, 1)
+    assert history.interpolate(1, capacity + 3.5) == pytest.approx(
+        (capacity + 3.5, 1)
+    )
+
+
+def test_memory_cap():
+    history = PlayerHistory(max_bytes=64 * 1024, players=8)
+    _record(history, 1000, players=range(100))
+
+    assert history.memory <= 64 * 1024
+    assert history.x.shape[1] >= 100
+    assert history.rewind(99, 999.0) == (999, 99)
+
+
+def test_keeps_min_ticks():
+    history = PlayerHistory(max_bytes=0)
+    _record(history, 5)
+
+    assert history.capacity == MIN_TICKS
+    assert history.interpolate(1, 3.5) == pytest.approx((3.5, 1))
+
+
+def test_column_reused_once_overwritten():
+    history = PlayerHistory(max_bytes=400, players=2)
+    _record(history, 1, players=(1, 2))
+    column = history.columns[1]
+    _record(history, history.capacity, players=(2,), start=1)
+    _record(history, 1, players=(2, 3), start=history.capacity + 1)
+
+    assert history.columns[3] == column
+    assert history.rewind(3, 0.0) is None
+    assert history.rewind(1, 0.0) is None
+
+
+def test_same_snapshot_copies_last_tick():
+    history = PlayerHistory()
+    snapshot = {1: _fields(5, 6)}
+    history.record(0.0, snapshot)
+    history.record(1.0, snapshot)
+    history.record(2.0, {2: _fields(7, 8)})
+
+    assert history.size == 3
+    assert history.rewind(1, 1.5) == (5, 6)
+    assert history.rewind(2, 1.5) is None
+    assert history.rewind(2, 2.0) == (7, 8)
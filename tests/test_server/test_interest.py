@@ -0,0 +1,69 @@
+from server.interest import AreaOfInterest, SpatialHash
+
+
+def test_spatial_hash_move():
+    grid = SpatialHash(cell_size=10)
+    grid.move(1, 15, 25)
+    grid.move(2, 19, 21)
+
+    assert grid.cells == {(1, 2): {1, 2}}
+
+    grid.move(1, 105, 25)
+
+    assert grid.cells == {(1, 2): {2}, (10, 2): {1}}
+
+
+def test_spatial_hash_remove():
+    grid = SpatialHash(cell_size=10)
+    grid.move(1, 15, 25)
+    grid.remove(1)
+    grid.remove(2)
+
+    assert grid.cells == {}
+    assert grid.player_cells == {}
+
+
+def test_spatial_hash_near():
+    grid = SpatialHash(cell_size=10)
+    grid.move(1, 0, 0)
+    grid.move(2, 20, 0)
+    grid.move(3, 35, 35)
+
+    assert grid.near(0, 0, radius=2) == {1, 2}
+    assert grid.near(20, 20, radius=2) == {1, 2, 3}
+
+
+def _snapshot(*positions) -> dict:
+    return {
+        player_id: (x, y, 0, 0, f'player_{player_id}')
+        for player_id, (x, y) in enumerate(positions)
+    }
+
+
+def test_view_only_nearby_players():
+    interest = AreaOfInterest(radius=5)
+    snapshot = _snapshot((0, 0), (40, 40), (500, 500))
+    interest.update(snapshot)
+
+    assert interest.view(0, snapshot) == {
+        0: snapshot[0], 1: snapshot[1]
+    }
+    assert interest.view(2, snapshot) == {2: snapshot[2]}
+
+
+def test_view_everyone_nearby_is_snapshot():
+    interest = AreaOfInterest(radius=5)
+    snapshot = _snapshot((0, 0), (40, 40))
+    interest.update(snapshot)
+
+    assert interest.view(0, snapshot) is snapshot
+
+
+def test_update_removes_players():
+    interest = AreaOfInterest(radius=5)
+    interest.update(_snapshot((0, 0), (40, 40)))
+    snapshot = _snapshot((0, 0))
+    interest.update(snapshot)
+
+    assert interest.grid.player_cells == {0: (0, 0)}
+    assert interest.view(0, snapshot) is snapshot
@@ -0,0 +1,61 @@
+import pytest
+
+from game.errors import ServerError
+from server import recorder
+from server.recorder import FILE_HEADER, Recorder, read_log
+
+
+def test_read_log(tmp_path):
+    path = tmp_path / 'lobby.rec'
+    log = Recorder(path)
+    log.join(1, 'TestUser')
+    log.message(1, b'state')
+    log.tick()
+    log.snapshot(1, b'snapshot')
+    log.leave(1)
+    log.close()
+
+    records = list(read_log(path))
+
+    assert [record[1:] for record in records] == [
+        (recorder.JOIN, 1, b'TestUser'),
+        (recorder.MESSAGE, 1, b'state'),
+        (recorder.TICK, recorder.NO_PLAYER, b''),
+        (recorder.SNAPSHOT, 1, b'snapshot'),
+        (recorder.LEAVE, 1, b''),
+    ]
+    timestamps = [record[0] for record in records]
+    assert timestamps == sorted(timestamps)
+
+
+def test_closed_recorder_ignores_records(tmp_path):
+    path = tmp_path / 'lobby.rec'
+    log = Recorder(path)
+    log.close()
+    log.tick()
+
+    assert list(read_log(path)) == []
+
+
+def test_read_log_truncated(tmp_path):
+    path = tmp_path / 'lobby.rec'
+    log = Recorder(path)
+    log.message(1, b'state')
+    log.message(1, b'cut short')
+    log.close()
+    path.write_bytes(path.read_bytes()[:-3])
+
+    assert [data for *_, data in read_log(path)] == [b'state']
+
+
+@pytest.mark.parametrize('header', [
+    b'LOBBY',
+    FILE_HEADER.pack(b'NOTAREC!', recorder.LOG_VERSION, 4),
+    FILE_HEADER.pack(recorder.MAGIC, recorder.LOG_VERSION + 1, 4),
+])
+def test_read_log_not_a_recording(tmp_path, header):
+    path = tmp_path / 'lobby.rec'
+    path.write_bytes(header)
+
+    with pytest.raises(ServerError):
+        list(read_log(path))
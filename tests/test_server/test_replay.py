@@ -0,0 +1,71 @@
+import pytest
+
+from network import codec, compression
+from server.connection import Connection
+from server.recorder import Recorder
+from server.replay import Replayer
+from server.server import Server
+from unittest.mock import Mock, patch
+
+
+@pytest.fixture
+def recording(tmp_path, mock_os_config, mock_other_players_attributes):
+    """Record a session of the players moving about."""
+    path = tmp_path / 'lobby.rec'
+    server = Server(recorder=Recorder(path))
+    for player_id, attributes in mock_other_players_attributes.items():
+        server._add_player(player_id, attributes['username'])
+        server._add_connection(
+            Connection(player_id, Mock(), server.snapshot_cache, Mock())
+        )
+
+    server._receive(
+        server.connections[2], codec.encode_compression(compression.METHODS)
+    )
+
+    for step in range(5):
+        for player_id, attributes in mock_other_players_attributes.items():
+            acked = server.connections[player_id].deltas.sent_seq
+            state = dict(attributes, x=attributes['x'] + step)
+            server._receive(
+                server.connections[player_id],
+                codec.encode_state(acked, state),
+            )
+        server.tick()
+        for connection in server.connections.values():
+            connection.flush()
+    server._handle_disconnect(1)
+    server.tick()
+    token = server.sessions.issue_token(3)
+    server._handle_disconnect(3)
+    server.tick()
+    server.resume(token)
+    server._join(
+        Connection(3, Mock(), server.snapshot_cache), 'TestUser', True
+    )
+    server.tick()
+    server.connections[3].flush()
+    server.recorder.close()
+    return path
+
+
+def test_replay_sends_recorded_snapshots(recording, mock_os_config):
+    replayer = Replayer(Server(), speed=None)
+    replayer.replay(recording)
+
+    assert replayer.stats['ticks'] == 8
+    assert replayer.stats['matched'] > 0
+    assert replayer.stats['mismatched'] == 0
+    # Player 1 is away, player 3 resumed.
+    assert len(replayer.server.players) == 5
+    assert set(replayer.server.connections) == {2, 3, 4, 5}
+    assert replayer.server.connections[2].compressor is not None
+
+
+def test_replay_at_speed(recording, mock_os_config):
+    replayer = Replayer(Server(), speed=10)
+    with patch('time.sleep') as sleep:
+        replayer.replay(recording)
+
+    assert sleep.called
+    assert replayer.stats['mismatched'] == 0
@@ -0,0 +1,242 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from network import codec
+from network.framing import HEADER, FrameReader, send_frame
+from server.rooms import (
+    HELLO_TIMEOUT, Rooms, Supervisor, room_exists, run_worker
+)
+from unittest.mock import AsyncMock, Mock, patch
+
+
+@pytest.fixture
+def rooms(mock_os_config):
+    return Rooms(start_tick=Mock())
+
+
+@pytest.fixture
+def mock_hello_connection(mock_recv_into):
+    def _mock_hello_connection(room, *payloads, end=None):
+        with patch('socket.socket') as mock_socket:
+            mock_socket.recv_into.side_effect = mock_recv_into(
+                codec.encode_hello('TestUser', room), *payloads, end=end
+            )
+            return mock_socket
+    return _mock_hello_connection
+
+
+def test_room_exists():
+    assert room_exists('lobby')
+    assert not room_exists('not_a_map')
+    assert not room_exists('../maps/lobby')
+
+
+def test_get_opens_room_once(rooms):
+    lobby = rooms.get('lobby')
+
+    assert rooms.get('lobby') is lobby
+    assert rooms.get('nature') is not lobby
+    assert rooms.start_tick.call_count == 2
+
+
+def test_get_records_room(mock_os_config, tmp_path):
+    rooms = Rooms(start_tick=Mock(), record_dir=str(tmp_path))
+    lobby = rooms.get('lobby')
+
+    assert lobby.recorder is not None
+    assert lobby.recorder.path.startswith(str(tmp_path / 'lobby-'))
+    assert rooms.get('nature').recorder is not lobby.recorder
+    lobby.recorder.close()
+    rooms.get('nature').recorder.close()
+
+
+def test_serve_joins_room(rooms, mock_player, mock_hello_connection):
+    conn = mock_hello_connection(
+        'nature',
+        codec.encode_state(0, mock_player(x=50).attributes),
+        end=InterruptedError
+    )
+    with pytest.raises(InterruptedError):
+        rooms.serve(conn, ('127.0.0.1', 1))
+
+    assert list(rooms.rooms) == ['nature']
+    assert rooms.rooms['nature'].players[0]['username'] == 'TestUser'
+    assert rooms.rooms['nature'].players[0]['x'] == 50
+
+
+def test_serve_rooms_have_own_players(
+    rooms, mock_player, mock_hello_connection
+):
+    for room in ('lobby', 'nature', 'lobby'):
+        with pytest.raises(InterruptedError):
+            rooms.serve(
+                mock_hello_connection(room, end=InterruptedError), None
+            )
+
+    assert list(rooms.rooms['lobby'].players) == [0, 1]
+    assert list(rooms.rooms['nature'].players) == [0]
+
+
+def test_serve_unknown_room(rooms, mock_hello_connection):
+    conn = mock_hello_connection('not_a_map')
+    rooms.serve(conn, None)
+
+    assert rooms.rooms == {}
+    assert conn.close.called
+
+
+def test_serve_room_full(rooms, mock_hello_connection):
+    rooms.get('lobby').sessions.end_id = 0
+    conn = mock_hello_connection('lobby')
+    rooms.serve(conn, None)
+
+    assert rooms.rooms['lobby'].players == {}
+    assert conn.close.called
+
+
+def test_serve_disconnected_before_joining(rooms, mock_recv_into):
+    with patch('socket.socket') as conn:
+        conn.recv_into.side_effect = mock_recv_into()
+        rooms.serve(conn, None)
+
+    assert rooms.rooms == {}
+    assert conn.close.called
+
+
+HELLO = codec.encode_hello('TestUser', 'lobby')
+MALFORMED_HELLOS = [HELLO[:4], HELLO.replace(b'TestUser', b'TestUse\xff')]
+
+
+@pytest.mark.parametrize('hello', MALFORMED_HELLOS, ids=['truncated', 'utf-8'])
+def test_serve_malformed_hello(rooms, mock_recv_into, hello):
+    with patch('socket.socket') as conn:
+        conn.recv_into.side_effect = mock_recv_into(hello)
+        rooms.serve(conn, None)
+
+    assert rooms.rooms == {}
+    assert conn.close.called
+
+
+def test_serve_hello_timeout(rooms):
+    with patch('socket.socket') as conn:
+        conn.recv_into.side_effect = socket.timeout
+        rooms.serve(conn, None)
+
+    conn.settimeout.assert_called_once_with(HELLO_TIMEOUT)
+    assert rooms.rooms == {}
+    assert conn.close.called
+
+
+def test_async_serve_hello_timeout(rooms):
+    async def never(n_bytes):
+        await asyncio.Event().wait()
+
+    reader = Mock()
+    reader.readexactly = AsyncMock(side_effect=never)
+    writer = Mock()
+
+    with patch('server.rooms.HELLO_TIMEOUT', 0.01):
+        asyncio.run(rooms.async_serve(reader, writer))
+
+    assert rooms.rooms == {}
+    assert writer.close.called
+
+
+def test_async_serve_joins_room(rooms):
+    hello = codec.encode_hello('TestUser', 'lobby')
+    reader = Mock()
+    reader.readexactly = AsyncMock(side_effect=[
+        HEADER.pack(len(hello)), hello, asyncio.IncompleteReadError(b'', 4)
+    ])
+    writer = Mock()
+
+    with patch('server.server.Server._handle_disconnect'):
+        asyncio.run(rooms.async_serve(reader, writer))
+
+    assert rooms.rooms['lobby'].players[0]['username'] == 'TestUser'
+    assert writer.close.called
+
+
+def test_supervisor_spreads_rooms(mock_os_config):
+    with patch('server.rooms.SPAWN'):
+        supervisor = Supervisor(workers=2)
+
+    lobby = supervisor.worker_for('lobby')
+    nature = supervisor.worker_for('nature')
+
+    assert lobby is not nature
+    assert supervisor.worker_for('lobby') is lobby
+    assert supervisor.room_counts == [1, 1]
+
+
+def test_supervisor_dispatch(mock_os_config, mock_hello_connection):
+    with patch('server.rooms.SPAWN'):
+        supervisor = Supervisor(workers=1)
+    conn = mock_hello_connection('lobby')
+    conn.fileno.return_value = 7
+
+    with patch('socket.send_fds') as send_fds:
+        supervisor.dispatch(conn, None)
+
+    send_fds.assert_called_once_with(
+        supervisor.workers[0][1],
+        [codec.encode_hello('TestUser', 'lobby')],
+        [7]
+    )
+
+
+def test_supervisor_dispatch_unknown_room(
+    mock_os_config, mock_hello_connection
+):
+    with patch('server.rooms.SPAWN'):
+        supervisor = Supervisor(workers=1)
+
+    with patch('socket.send_fds') as send_fds:
+        supervisor.dispatch(mock_hello_connection('not_a_map'), None)
+
+    assert not send_fds.called
+    assert supervisor.rooms == {}
+
+
+@pytest.mark.parametrize('hello', MALFORMED_HELLOS, ids=['truncated', 'utf-8'])
+def test_supervisor_dispatch_malformed_hello(
+    mock_os_config, mock_recv_into, hello
+):
+    with patch('server.rooms.SPAWN'):
+        supervisor = Supervisor(workers=1)
+
+    with patch('socket.socket') as conn, patch('socket.send_fds') as send_fds:
+        conn.recv_into.side_effect = mock_recv_into(hello)
+        supervisor.dispatch(conn, None)
+
+    assert not send_fds.called
+    assert conn.__exit__.called
+
+
+def test_worker_serves_handed_over_socket(mock_os_config):
+    control, worker_control = socket.socketpair(
+        socket.AF_UNIX, socket.SOCK_SEQPACKET
+    )
+    worker = threading.Thread(target=run_worker, args=(worker_control,))
+    worker.start()
+
+    client, server_side = socket.socketpair()
+    hello = codec.encode_hello('TestUser', 'lobby')
+    socket.send_fds(control, [hello], [server_side.fileno()])
+    server_side.close()
+
+    with client:
+        client.settimeout(5)
+        frames = FrameReader(client)
+        assert codec.decode_welcome(frames.read())[0] == 0
+        send_frame(client, codec.encode_state(
+            0, codec.fields_to_attributes(0, (10, 20, 0, 0, 'TestUser'))
+        ))
+
+    control.close()
+    worker.join(timeout=5)
+    worker_control.close()
+    assert not worker.is_alive()
@@ -1,47 +1,90 @@
-import pickle
+import asyncio
+import json
 
 import pytest
 
-from unittest.mock import patch, Mock
-from server.server import Server
+from network import codec, compression
+from network.compression import Decompressor
+from network.framing import HEADER, FrameReader
+from network.snapshots import SnapshotHistory
+from unittest.mock import AsyncMock, patch, Mock
+from server.connection import Connection
+from server.server import HEARTBEAT_INTERVAL, RESUME_GRACE, Server
 
 
 @pytest.fixture
-def mock_connection_interrupt(mock_player):
-    def _mock_connection_interrupt(*args, **kwargs):
+def mock_connection_interrupt(mock_player, mock_recv_into):
+    def _mock_connection_interrupt(*args, ack=0, **kwargs):
         with patch('socket.socket') as mock_socket:
-            mock_socket.recv.return_value = pickle.dumps(
-                mock_player(*args, **kwargs).attributes
-            )
-            # Interrupt infinite loop at end of first iteration.
-            mock_socket.sendall.side_effect = Mock(
-                side_effect=InterruptedError
+            player = mock_player(*args, **kwargs)
+            # Interrupt the infinite loop once the updates are read.
+            mock_socket.recv_into.side_effect = mock_recv_into(
+                codec.encode_state(ack, player.attributes),
+                end=InterruptedError
             )
             return mock_socket
     return _mock_connection_interrupt
 
 
 @pytest.fixture
-def mock_connection():
-    with patch('socket.socket') as mock_socket:
-        mock_socket.recv.return_value = pickle.dumps('test')
-        yield mock_socket
+def mock_connections(mock_os_config, mock_other_players_attributes):
+    """A server with a mocked connection for each player."""
+    server = Server()
+    _add_players(server, mock_other_players_attributes)
+    for player_id in server.players:
+        server._add_connection(
+            Connection(player_id, Mock(), server.snapshot_cache, Mock())
+        )
+    return server
 
 
-@pytest.fixture
-def mock_delete_disconnected_players_interrupt():
-    with patch.object(Server, '_delete_disconnected_players') as mock_method:
-        mock_method.side_effect = Mock(side_effect=InterruptedError)
-        yield mock_method
+def _tick(server):
+    """Tick and send out what was queued, as the sender threads do."""
+    server.tick()
+    for connection in server.connections.values():
+        connection.flush()
+
+
+def _expire_sessions(server):
+    """Tick until the sessions of the dropped connections expire."""
+    for _ in range(server._ticks(RESUME_GRACE) + 1):
+        server.tick()
+
+
+def _add_players(server, players):
+    for player_id, attributes in players.items():
+        server._add_player(player_id, attributes['username'])
+        server._update_player(player_id, attributes)
 
 
 @pytest.fixture
-def mock_connection_no_data():
+def mock_connection_no_data(mock_recv_into):
     with patch('socket.socket') as mock_socket:
-        mock_socket.recv.return_value = b''
+        mock_socket.recv_into.side_effect = mock_recv_into()
         yield mock_socket
 
 
+@pytest.fixture
+def mock_stream(mock_player):
+    def _mock_stream(*messages):
+        reads = []
+        for payload in messages:
+            reads += [HEADER.pack(len(payload)), payload]
+
+        reader = Mock()
+        reader.readexactly = AsyncMock(
+            side_effect=reads + [asyncio.IncompleteReadError(b'', 4)]
+        )
+        writer = Mock()
+        writer.drain = AsyncMock()
+        return reader, writer
+    return _mock_stream
+
+
+def _client(server, conn, player_id, username='TestUser'):
+    server.client(conn, player_id, username, FrameReader(conn))
+
+
 def test_init(mock_os_config):
     host, port = mock_os_config
     Server()
@@ -55,13 +98,13 @@ def test_client_adds_player_attributes(
 ):
     server = Server()
     with pytest.raises(InterruptedError):
-        server.client(mock_connection_interrupt(), 0)
+        _client(server, mock_connection_interrupt(), 0)
 
     with pytest.raises(InterruptedError):
-        server.client(mock_connection_interrupt(), 1)
+        _client(server, mock_connection_interrupt(), 1)
 
     with pytest.raises(InterruptedError):
-        server.client(mock_connection_interrupt(), 2)
+        _client(server, mock_connection_interrupt(), 2)
 
     assert len(server.players) == 3
 
@@ -78,69 +121,660 @@ def test_client_updates_player_attributes(
     player_id, username, x, y = test_user
 
     with pytest.raises(InterruptedError):
-        server.client(mock_connection_interrupt(*test_user), player_id)
+        _client(
+            server,
+            mock_connection_interrupt(*test_user),
+            player_id,
+            username
+        )
 
     assert server.players[player_id]['username'] == username
     assert server.players[player_id]['x'] == x
     assert server.players[player_id]['y'] == y
 
 
-def test_client_player_disconnected(mock_os_config, mock_connection_no_data):
+def test_client_player_disconnected(
+    mock_os_config, mock_connection_no_data
+):
     server = Server()
-    server.client(mock_connection_no_data, 0)
+    _client(server, mock_connection_no_data, 0)
+
+    assert server.players[0]['standing']
+    assert server.connections == {}
+    _expire_sessions(server)
+    assert server.players == {}
+    player_id, token, resumed = codec.decode_welcome(
+        mock_connection_no_data.sendall.call_args.args[0][HEADER.size:]
+    )
+    assert player_id == 0
+    assert token
+    assert not resumed
 
 
-def test_server_has_disconnected_players(
-    mock_os_config,
-    mock_connection,
-    mock_delete_disconnected_players_interrupt
+def test_client_registers_connection(
+    mock_os_config, mock_connection_interrupt
 ):
     server = Server()
-    server.disconnected_player_ids = [4, 2]
     with pytest.raises(InterruptedError):
-        server.client(mock_connection, 0)
+        _client(server, mock_connection_interrupt(ack=3), 0)
+
+    assert server.connections[0].player_id == 0
+    assert server.connections[0].deltas.ack == 3
+
+
+def test_client_disconnect_removes_connection(
+    mock_os_config, mock_player, mock_recv_into
+):
+    server = Server()
+    _add_players(server, {1: mock_player(player_id=1).attributes})
+    with patch('socket.socket') as mock_socket:
+        mock_socket.recv_into.side_effect = mock_recv_into(
+            codec.encode_state(0, mock_player().attributes)
+        )
+        _client(server, mock_socket, 0)
+
+    assert 0 not in server.connections
+    assert server.players[0]['standing']
+    assert server.sessions.away == {0}
+
+
+@pytest.mark.parametrize('payload', [
+    # An unknown codec version.
+    bytes([codec.VERSION + 1]) + codec.encode_heartbeat()[1:],
+    # A header cut short.
+    codec.encode_heartbeat()[:1],
+    # Chat which is not UTF-8.
+    codec.encode_say('"hello"')[:-1] + b'\xff',
+], ids=['version', 'truncated', 'utf-8'])
+def test_client_protocol_violation_disconnects(
+    mock_os_config, mock_recv_into, payload
+):
+    server = Server()
+    with patch('socket.socket') as mock_socket:
+        mock_socket.recv_into.side_effect = mock_recv_into(
+            payload, end=InterruptedError
+        )
+        _client(server, mock_socket, 0)
+
+    assert 0 not in server.connections
+    assert server.sessions.away == {0}
+
+
+def test_client_oversized_frame_disconnects(mock_os_config):
+    server = Server()
+    with patch('socket.socket') as mock_socket:
+        mock_socket.recv_into.side_effect = lambda buffer, n_bytes=0: (
+            HEADER.pack_into(buffer, 0, 2 ** 31 - 1) or HEADER.size
+        )
+        _client(server, mock_socket, 0)
+
+    assert 0 not in server.connections
+    assert server.sessions.away == {0}
+
+
+def test_tick_pushes_snapshot_to_every_client(mock_connections):
+    server = mock_connections
+    _tick(server)
+
+    for connection in server.connections.values():
+        history = SnapshotHistory()
+        connection.send.assert_called_once()
+        codec.decode_snapshot(
+            connection.send.call_args.args[0][HEADER.size:], history
+        )
+        assert history.latest == codec.snapshot_fields(server.players)
+
+
+def test_tick_serializes_snapshot_once(mock_connections):
+    server = mock_connections
+    _tick(server)
+
+    sent = {
+        id(connection.send.call_args.args[0])
+        for connection in server.connections.values()
+    }
+    assert len(sent) == 1
+    assert server.snapshot_cache.misses == 1
+    assert server.snapshot_cache.hits == len(server.connections) - 1
+
+
+def test_tick_sends_players_in_area_of_interest(mock_connections):
+    server = mock_connections
+    server.interest.radius = 5
+    server._update_player(1, {'x': 1000, 'y': 1000})
+    _tick(server)
+
+    far, near = SnapshotHistory(), SnapshotHistory()
+    codec.decode_snapshot(
+        server.connections[1].send.call_args.args[0][HEADER.size:], far
+    )
+    codec.decode_snapshot(
+        server.connections[2].send.call_args.args[0][HEADER.size:], near
+    )
+    assert list(far.latest) == [1]
+    assert 1 not in near.latest
+    assert len(near.latest) == len(server.players) - 1
+
+
+def test_tick_player_leaves_area_of_interest(mock_connections):
+    server = mock_connections
+    server.interest.radius = 5
+    _tick(server)
+    connection = server.connections[2]
+    connection.deltas.acknowledge(server.snapshots.seq)
+
+    server._update_player(1, {'x': 1000, 'y': 1000})
+    _tick(server)
+
+    history = SnapshotHistory()
+    history.put(1, server.snapshots.get(1))
+    codec.decode_snapshot(
+        connection.send.call_args.args[0][HEADER.size:], history
+    )
+    assert 1 not in history.latest
+
+
+def test_tick_far_away_changes_not_sent(mock_connections):
+    server = mock_connections
+    server.interest.radius = 5
+    server._update_player(1, {'x': 1000, 'y': 1000})
+    _tick(server)
+    connection = server.connections[2]
+    connection.deltas.acknowledge(server.snapshots.seq)
+
+    server._update_player(1, {'x': 1010})
+    _tick(server)
+
+    assert connection.send.call_count == 1
+    assert server.connections[1].send.call_count == 2
+
+
+def test_tick_nothing_changed(mock_connections):
+    server = mock_connections
+    _tick(server)
+    _tick(server)
+
+    for connection in server.connections.values():
+        assert connection.send.call_count == 1
+
+
+def test_tick_pushes_changes(mock_connections):
+    server = mock_connections
+    _tick(server)
+    for connection in server.connections.values():
+        connection.deltas.acknowledge(server.snapshots.seq)
+
+    server._update_player(2, {'x': 200})
+    _tick(server)
+
+    for connection in server.connections.values():
+        history = SnapshotHistory()
+        history.put(1, server.snapshots.get(1))
+        assert connection.send.call_count == 2
+        codec.decode_snapshot(
+            connection.send.call_args.args[0][HEADER.size:], history
+        )
+        assert history.latest[2][0] == 200
+
+
+def test_tick_does_not_wait_on_clients(mock_connections):
+    server = mock_connections
+    server.tick()
+    server._update_player(2, {'x': 200})
+    server.tick()
+
+    for connection in server.connections.values():
+        connection.send.assert_not_called()
+        assert connection.outbox.queued == 2
+        # The first snapshot was never sent, only the latest is.
+        assert connection.outbox.dropped == 1
+
+
+def test_tick_evicts_slow_clients(mock_connections):
+    server = mock_connections
+    server.tick()
+    slow = server.connections[1]
+    slow.outbox.pending_since -= 10
+
+    server._update_player(2, {'x': 200})
+    with patch('server.server.SLOW_CONSUMER_TIMEOUT', 5):
+        server.tick()
+
+    slow.abort.assert_called_once()
+    assert slow.closed
+    for connection in server.connections.values():
+        if connection is not slow:
+            connection.abort.assert_not_called()
+
+    # Evicted once, the receiving thread handles the disconnect.
+    server.tick()
+    slow.abort.assert_called_once()
+
+
+def test_connection_stats(mock_connections):
+    server = mock_connections
+    _tick(server)
+
+    stats = server.connection_stats()
+    assert set(stats) == set(server.connections)
+    assert stats[1]['sent'] == 1
+    assert stats[1]['depth'] == 0
+
+
+def test_receive_heartbeat(mock_connections):
+    server = mock_connections
+    connection = server.connections[1]
+    connection.last_received = 0
+    players = server.players
+    server._receive(connection, codec.encode_heartbeat())
+
+    assert connection.last_received > 0
+    assert server.players is players
+
+
+@pytest.mark.parametrize('offered, method', [
+    ((99, compression.ZLIB), compression.ZLIB),
+    ((99,), None),
+    ((), None),
+])
+def test_receive_compression(mock_connections, offered, method):
+    server = mock_connections
+    connection = server.connections[1]
+    server._receive(connection, codec.encode_compression(offered))
+
+    if method is None:
+        assert connection.compressor is None
+    else:
+        assert connection.compressor.method == method
+
+
+def test_tick_sends_compressed(mock_connections):
+    server = mock_connections
+    connection = server.connections[1]
+    server._receive(
+        connection, codec.encode_compression(compression.METHODS)
+    )
+    connection.compressor.threshold = 0
+    _tick(server)
+
+    data = connection.send.call_args.args[0][HEADER.size:]
+    method, payload = codec.decode_compressed(data)
+    snapshot = Decompressor(method).decompress(payload)
+    assert codec.message_type(snapshot) == codec.SNAPSHOT
+    assert len(data) < len(snapshot)
+    uncompressed = server.connections[2].send.call_args.args[0]
+    assert codec.message_type(uncompressed[HEADER.size:]) == codec.SNAPSHOT
+
+
+def _message(**fields):
+    """A chat message as the chat box says it."""
+    rect = {'x': 0, 'y': 0, 'width': 40, 'height': 20}
+    return {
+        'username': 'user', 'text': 'hello',
+        'username_rect': rect, 'text_rect': rect, **fields
+    }
+
+
+def test_receive_say(mock_connections):
+    server = mock_connections
+    server.chat_store = Mock()
+    server._receive(
+        server.connections[1],
+        codec.encode_say(json.dumps(_message(player_id=4)))
+    )
+
+    sent = set()
+    for connection in server.connections.values():
+        connection.flush()
+        data = connection.send.call_args.args[0][HEADER.size:]
+        message_id, text = codec.decode_chat(data)
+        sent.add((message_id, text))
+    assert sent == {(message_id, json.dumps(_message(player_id=1)))}
+    server.chat_store.save.assert_called_once_with(
+        message_id, _message(player_id=1)
+    )
+
+
+@pytest.mark.parametrize('text', [
+    'not json',
+    '["text"]',
+    '{"text": "hello"}',
+    json.dumps(_message(text_rect={'x': 0, 'y': 0, 'width': 40})),
+    json.dumps(_message(text_rect={'x': 0, 'y': 0, 'width': 40,
+                                   'height': '20'})),
+    json.dumps(_message(username=None)),
+    # Too long once the player id is added.
+    json.dumps(_message(text='a' * (2 ** 16 - 160)))
+])
+def test_receive_say_malformed(mock_connections, text):
+    server = mock_connections
+    server.chat_store = Mock()
+    server._receive(server.connections[1], codec.encode_say(text))
+
+    assert not server.connections[1].outbox.depth
+    server.chat_store.save.assert_not_called()
+
+
+def test_tick_reaps_idle_clients(mock_connections):
+    server = mock_connections
+    idle = server.connections[1]
+    idle.last_received -= 60
+    for _ in range(server._ticks(HEARTBEAT_INTERVAL)):
+        server.tick()
+
+    idle.abort.assert_called_once()
+    assert idle.closed
+    for connection in server.connections.values():
+        if connection is not idle:
+            connection.abort.assert_not_called()
+    # The receiving thread then cleans up as on any disconnect.
+    server._handle_disconnect(1)
+    _expire_sessions(server)
+    assert 1 not in server.players
+
+
+def test_tick_reaps_closed_clients(mock_connections):
+    server = mock_connections
+    closed = server.connections[1]
+    closed.close()
+    for _ in range(server._ticks(HEARTBEAT_INTERVAL)):
+        server.tick()
+
+    assert 1 not in server.connections
+    assert server.sessions.away == {1}
+    _expire_sessions(server)
+    assert 1 not in server.players
+
+
+def test_tick_sends_heartbeats_when_quiet(mock_connections):
+    server = mock_connections
+    _tick(server)
+    connection = server.connections[1]
+    connection.outbox.last_put -= HEARTBEAT_INTERVAL
+    for _ in range(server._ticks(HEARTBEAT_INTERVAL)):
+        _tick(server)
+
+    assert codec.message_type(
+        connection.send.call_args.args[0][HEADER.size:]
+    ) == codec.HEARTBEAT
+    assert server.connections[2].send.call_count == 1
+
+
+def test_timers_bounded_under_churn(mock_connections):
+    server = mock_connections
+    for player_id in range(10, 110):
+        server._add_player(player_id, 'Churn')
+        server._add_connection(
+            Connection(player_id, Mock(), server.snapshot_cache)
+        )
+        server.tick()
+        server._handle_disconnect(player_id)
+    _expire_sessions(server)
+
+    assert len(server.timers) == len(server.connections)
+    assert len(server.players) == len(server.connections)
+
+
+def test_tick_deletes_disconnected_players(mock_connections):
+    server = mock_connections
+    server._handle_disconnect(4)
+    _expire_sessions(server)
+
+    assert 4 not in server.players
+    assert 4 not in server.snapshots.latest
+    assert server.sessions.disconnected == set()
+
+
+def test_tick_loop(mock_os_config):
+    server = Server(tick_rate=50)
+    with patch.object(Server, 'tick') as tick, patch('time.sleep') as sleep:
+        sleep.side_effect = [None, InterruptedError]
+        with pytest.raises(InterruptedError):
+            server.tick_loop()
+
+    assert tick.call_count == 2
+    assert 0 < sleep.call_args_list[0].args[0] <= 0.02
+
+
+def test_next_tick_skips_missed_ticks(mock_os_config):
+    server = Server(tick_rate=10)
+
+    assert server._next_tick(1.0, 1.05) == pytest.approx(1.1)
+    assert server._next_tick(1.0, 5.0) == 5.0
+
+
+def test_async_client_updates_player_attributes(
+    mock_os_config, mock_player, mock_stream
+):
+    server = Server()
+    other_player = mock_player(player_id=1, username='OTHER_USER')
+    _add_players(server, {1: other_player.attributes})
+    player = mock_player(player_id=0, username='TEST_USER', x=50, y=100)
+    reader, writer = mock_stream(codec.encode_state(0, player.attributes))
+
+    with patch.object(Server, '_handle_disconnect') as handle_disconnect:
+        asyncio.run(server.async_client(reader, writer, 0, player.username))
+
+    handle_disconnect.assert_called_once_with(0, server.connections[0])
+    assert server.players[0]['username'] == 'TEST_USER'
+    assert server.players[0]['x'] == 50
+    assert server.players[0]['y'] == 100
+    assert writer.close.called
+
+
+def test_async_client_pushes_snapshots(
+    mock_os_config, mock_player, mock_stream
+):
+    server = Server()
+    reader, writer = mock_stream()
+    with patch.object(Server, '_handle_disconnect'):
+        asyncio.run(server.async_client(reader, writer, 0, 'TEST_USER'))
+
+    server.tick()
+
+    history = SnapshotHistory()
+    codec.decode_snapshot(
+        server.connections[0].outbox.pending[HEADER.size:], history
+    )
+    assert history.latest[0][-1] == 'TEST_USER'
+
+
+def test_async_client_player_disconnected(mock_os_config, mock_stream):
+    server = Server()
+    reader, writer = mock_stream()
+
+    asyncio.run(server.async_client(reader, writer, 0, 'TEST_USER'))
+    _expire_sessions(server)
+
+    assert server.players == {}
+    assert codec.decode_welcome(
+        writer.write.call_args.args[0][HEADER.size:]
+    )[0] == 0
+    assert writer.close.called
+
+
+def test_async_client_protocol_violation_disconnects(
+    mock_os_config, mock_stream
+):
+    server = Server()
+    reader, writer = mock_stream(codec.encode_heartbeat()[:1])
+    # The stream would end with an error if the client read on.
+    reader.readexactly.side_effect = list(
+        reader.readexactly.side_effect
+    )[:2] + [AssertionError]
+
+    asyncio.run(server.async_client(reader, writer, 0, 'TEST_USER'))
+
+    assert 0 not in server.connections
+    assert server.sessions.away == {0}
+    assert writer.close.called
+
+
+def test_handle_disconnect_suspends_player(mock_connections):
+    server = mock_connections
+    server._handle_disconnect(2)
+
+    assert server.players[2]['standing']
+    assert 2 in server.sessions.away
+    assert 2 not in server.connections
+    server.tick()
+    assert 2 in server.players
+
+
+def test_session_expires_after_grace(mock_connections):
+    server = mock_connections
+    token = server.sessions.issue_token(2)
+    server._handle_disconnect(2)
+    for _ in range(server._ticks(RESUME_GRACE) - 1):
+        server.tick()
+    assert 2 in server.players
+
+    server.tick()
+    server.tick()
+    assert 2 not in server.players
+    assert server.resume(token) is None
+
+
+def test_resume_keeps_player(mock_connections):
+    server = mock_connections
+    token = server.sessions.issue_token(2)
+    x = server.players[2]['x']
+    server._handle_disconnect(2)
+    server.tick()
+
+    assert server.resume(token) == 2
+    server._join(
+        Connection(2, Mock(), server.snapshot_cache), 'TestUser', True
+    )
+    _expire_sessions(server)
+
+    assert server.players[2]['x'] == x
+    assert 2 in server.connections
+    assert server.sessions.away == set()
+
+
+def test_resume_then_drop_gets_full_grace(mock_connections):
+    server = mock_connections
+    token = server.sessions.issue_token(2)
+    server._handle_disconnect(2)
+    for _ in range(server._ticks(RESUME_GRACE) // 2):
+        server.tick()
+    server.resume(token)
+    connection = server._join(
+        Connection(2, Mock(), server.snapshot_cache), 'TestUser', True
+    )
+    server._handle_disconnect(2, connection)
+    # Past the end of the grace period of the first drop.
+    for _ in range(server._ticks(RESUME_GRACE) // 2 + 2):
+        server.tick()
+
+    assert 2 in server.players
+    assert server.sessions.away == {2}
+    _expire_sessions(server)
+    assert 2 not in server.players
+
+
+def test_resume_takes_over_open_connection(mock_connections):
+    server = mock_connections
+    previous = server.connections[2]
+    token = server.sessions.issue_token(2)
+
+    assert server.resume(token) == 2
+    connection = server._join(
+        Connection(2, Mock(), server.snapshot_cache), 'TestUser', True
+    )
+    previous.abort.assert_called_once()
+    # The old connection's thread then sees its socket close.
+    server._handle_disconnect(2, previous)
+
+    assert server.connections[2] is connection
+    assert 2 not in server.sessions.away
+
+
+def test_tick_error_does_not_stop_tick_loop(mock_os_config):
+    server = Server()
+    ticks = []
+
+    def tick():
+        ticks.append(len(ticks))
+        if len(ticks) == 1:
+            raise ValueError('bad update')
+        raise SystemExit
+
+    server.tick = tick
+    with patch('server.server.time.sleep'), pytest.raises(SystemExit):
+        server.tick_loop()
+
+    assert ticks == [0, 1]
+
+
+def test_input_moves_player_on_tick(mock_connections):
+    server = mock_connections
+    x = server.players[2]['x']
+    server._receive(
+        server.connections[2],
+        codec.encode_input(0, 1, [(codec.RIGHT_KEY, 50)] * 2)
+    )
+    _tick(server)
+
+    assert server.players[2]['x'] > x
+    assert server.players[2]['right']
+    fields = server.snapshots.latest[2]
+    assert fields[0] == server.players[2]['x']
+    # Acknowledged ahead of the snapshot.
+    sent = server.connections[2].send.call_args_list[0].args[0]
+    assert sent[HEADER.size:] == codec.encode_input_ack(2, fields)
 
+    server._handle_disconnect(2)
+    server.tick()
+    assert 2 not in server.simulation.slots
 
-def test_disconnect_player(mock_os_config, mock_other_players_attributes):
+
+def test_resume_unknown_token(mock_os_config):
     server = Server()
-    server.players = mock_other_players_attributes
-    id_to_disconnect = 2
-    server._disconnect_player(player_id=id_to_disconnect)
 
-    assert server.players[id_to_disconnect]['x'] is None
-    assert id_to_disconnect in server.disconnected_player_ids
+    assert server.resume('') is None
+    assert server.resume('not a token') is None
 
 
 def test_delete_disconnected_players(
     mock_os_config, mock_other_players_attributes
 ):
     server = Server()
-    server.players = mock_other_players_attributes
-    server.disconnected_player_ids = list(mock_other_players_attributes.keys())
+    _add_players(server, mock_other_players_attributes)
+    for player_id in mock_other_players_attributes:
+        server.sessions.disconnect(player_id)
     server._delete_disconnected_players()
 
     assert server.players == {}
-    assert server.disconnected_player_ids == []
+    assert server.sessions.disconnected == set()
 
 
-def test_delete_disconnected_players_player_not_found(
-    mock_os_config, mock_player
-):
+def test_next_player_id(mock_os_config):
     server = Server()
-    test_player = {1: mock_player().attributes}
-    server.players = test_player
-    server.disconnected_player_ids = [4, 8]
-    server._delete_disconnected_players()
 
-    assert server.players == test_player
-    assert server.disconnected_player_ids == []
+    assert [server.next_player_id() for _ in range(3)] == [0, 1, 2]
 
 
-def test_reset_players(mock_os_config, mock_other_players_attributes):
+def test_next_player_id_reuses_deleted(mock_os_config):
     server = Server()
-    server.players = mock_other_players_attributes
-    Server.current_player_id = 99
-    server._reset_players()
+    for player_id in range(3):
+        server._add_player(server.next_player_id(), 'TestUser')
+    server.sessions.disconnect(1)
+    server._delete_disconnected_players()
 
-    assert server.players == {}
-    assert Server.current_player_id == 0
+    assert server.next_player_id() == 1
+    assert server.next_player_id() == 3
+
+
+def test_tick_records_history(mock_connections):
+    server = mock_connections
+    x, y = server.players[2]['x'], server.players[2]['y']
+    server.tick()
+    ticked = server.history.times[0]
+    server._update_player(2, {'x': x + 10})
+    server.tick()
+
+    assert server.history.size == 2
+    assert server.history.rewind(2, ticked) == (x, y)
+    assert server.history.rewind(2, ticked + 60) == (x + 10, y)
@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+from game.errors import ServerError
+from server.sessions import SessionRegistry, TimedLock
+
+
+def test_allocate_reuses_freed_ids():
+    sessions = SessionRegistry(first_id=1000)
+    for _ in range(4):
+        sessions.add(sessions.allocate(), 'TestUser')
+    sessions.disconnect(1002)
+    sessions.disconnect(1000)
+    sessions.remove_disconnected()
+
+    assert sorted(sessions.allocate() for _ in range(3)) == [1000, 1002, 1004]
+
+
+def test_allocate_within_block():
+    sessions = SessionRegistry(first_id=1000, max_ids=2)
+    for _ in range(2):
+        sessions.add(sessions.allocate(), 'TestUser')
+
+    with pytest.raises(ServerError):
+        sessions.allocate()
+    sessions.disconnect(1001)
+    sessions.remove_disconnected()
+    assert sessions.allocate() == 1001
+
+
+def test_allocate_within_player_id_range():
+    sessions = SessionRegistry(first_id=65535, max_ids=1000)
+    assert sessions.allocate() == 65535
+    with pytest.raises(ServerError):
+        sessions.allocate()
+
+
+def test_allocate_from_threads():
+    sessions = SessionRegistry()
+    ids = []
+
+    def allocate():
+        for _ in range(1000):
+            ids.append(sessions.allocate())
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(ids) == list(range(8000))
+
+
+def test_update():
+    sessions = SessionRegistry()
+    sessions.add(0, 'TestUser')
+    sessions.update(0, {'x': 50, 'id': 3})
+
+    assert sessions.snapshot()[0]['x'] == 50
+    assert sessions.snapshot()[0]['id'] == 0
+    assert sessions.snapshot()[0]['username'] == 'TestUser'
+
+
+def test_disconnect_and_remove():
+    sessions = SessionRegistry()
+    sessions.add(0, 'first')
+    sessions.add(1, 'second')
+
+    assert sessions.disconnect(0) == 'first'
+    assert sessions.snapshot()[0]['x'] is None
+    assert sessions.remove_disconnected() == [0]
+    assert list(sessions.snapshot()) == [1]
+    assert sessions.disconnected == set()
+
+
+def test_suspend_and_resume():
+    sessions = SessionRegistry()
+    sessions.add(0, 'TestUser')
+    token = sessions.issue_token(0)
+    sessions.suspend(0)
+
+    assert sessions.snapshot()[0]['standing']
+    assert sessions.away == {0}
+    assert sessions.resume(token) == 0
+    assert sessions.away == set()
+    assert sessions.expire(0) is None
+    assert 0 not in sessions.disconnected
+
+
+def test_expire():
+    sessions = SessionRegistry()
+    sessions.add(0, 'TestUser')
+    token = sessions.issue_token(0)
+    sessions.suspend(0)
+
+    assert sessions.expire(0) == 'TestUser'
+    assert sessions.resume(token) is None
+    sessions.remove_disconnected()
+    assert sessions.tokens == {}
+    assert sessions.resume('not a token') is None
+
+
+def test_expire_earlier_suspension():
+    sessions = SessionRegistry()
+    sessions.add(0, 'TestUser')
+    token = sessions.issue_token(0)
+    suspension = sessions.suspend(0)
+    sessions.resume(token)
+    latest = sessions.suspend(0)
+
+    assert sessions.expire(0, suspension) is None
+    assert sessions.away == {0}
+    assert sessions.expire(0, latest) == 'TestUser'
+
+
+def test_snapshot_is_copy_on_write():
+    sessions = SessionRegistry()
+    sessions.add(0, 'TestUser')
+    snapshot = sessions.snapshot()
+    attributes = snapshot[0]
+
+    sessions.update(0, {'x': 50})
+    sessions.add(1, 'other')
+
+    assert list(snapshot) == [0]
+    assert attributes['x'] == 0
+    assert sessions.snapshot()[0]['x'] == 50
+    assert len(sessions) == 2
+
+
+def test_snapshot_not_copied_without_writes():
+    sessions = SessionRegistry()
+    sessions.add(0, 'TestUser')
+
+    assert sessions.snapshot() is sessions.snapshot()
+
+
+def test_timed_lock():
+    lock = TimedLock()
+    for _ in range(3):
+        with lock:
+            pass
+
+    assert lock.acquisitions == 3
+    assert lock.stats['max_hold_us'] >= lock.stats['mean_hold_us'] > 0
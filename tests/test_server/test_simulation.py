@@ -0,0 +1,195 @@
+import numpy as np
+import pytest
+
+from network import codec
+from server.simulation import (
+    INPUT_BUDGET,
+    MAX_X,
+    PLAYER_VEL,
+    Simulation,
+    Terrain,
+    _sync_with_grid
+)
+from game.utils import sync_value_with_grid
+
+
+@pytest.fixture
+def state(mock_player):
+    return dict(mock_player(x=100, y=100).attributes)
+
+
+def _step(state, keys, terrain=None, seconds=0.05):
+    """Step a player once, dt being 0.5 at the default seconds."""
+    simulation = Simulation(terrain)
+    simulation.input(0, 1, [(keys, seconds * 1000)])
+    state.update(simulation.step({0: state}, seconds).get(0, {}))
+
+
+def test_walk(state):
+    _step(state, codec.LEFT_KEY)
+
+    assert state['x'] == 100 - PLAYER_VEL * 0.5
+    assert state['left'] and not state['down']
+    assert not state['standing']
+    assert state['_current_step'] == 0.5
+
+
+def test_strafe_keeps_facing(state):
+    _step(state, codec.RIGHT_KEY | codec.STRAFE_KEY)
+
+    assert state['x'] > 100
+    assert state['down'] and not state['right']
+
+
+def test_no_keys_stands(state):
+    simulation = Simulation()
+    simulation.input(0, 1, [(codec.UP_KEY, 50)])
+    state.update(simulation.step({0: state}, 0.05)[0])
+    simulation.input(0, 2, [(codec.BIKE_KEY, 50)])
+    state.update(simulation.step({0: state}, 0.05)[0])
+
+    assert state['standing']
+    assert state['_current_step'] == 0
+    assert state['bike']
+    assert simulation.seqs[simulation.slots[0]] == 2
+
+
+def test_slow_area(state):
+    _step(state, codec.DOWN_KEY, Terrain(reduced_speed_nodes={(100, 110): 6}))
+
+    assert state['in_slow_area']
+    assert state['y'] == 100 + (PLAYER_VEL - 6) * 0.5
+
+
+def test_backs_off_blocked_cell(state):
+    state.update(standing=False, down=False, right=True)
+    _step(state, codec.RIGHT_KEY, Terrain(blocked_nodes={(100, 110)}))
+
+    assert state['x'] == 100 - PLAYER_VEL * 0.5
+
+
+def test_stays_on_screen(state):
+    state['x'] = MAX_X + 1
+    _step(state, 0)
+
+    assert state['x'] == MAX_X + 1 - PLAYER_VEL * 0.5
+
+
+def test_stays_on_screen_on_both_axes(state):
+    state['x'], state['y'] = -2000, -2040
+    for _ in range(10):
+        _step(state, codec.UP_KEY)
+
+    # Pushed back on y too, rather than walking off further up.
+    assert state['y'] == -2040
+    assert state['x'] == -2000 + 10 * PLAYER_VEL * 0.5
+
+
+def test_sync_with_grid():
+    values = np.array([-7.5, -5, 0, 4.9, 5, 14.99, 15, 123.4])
+
+    assert _sync_with_grid(values).tolist() == [
+        sync_value_with_grid(value) for value in values
+    ]
+
+
+def test_terrain_load():
+    terrain = Terrain.load('lobby')
+
+    assert terrain.nodes
+    assert not terrain.nodes & terrain.blocked_nodes
+    blocked, _, _ = terrain.lookup(
+        *np.array(sorted(terrain.blocked_nodes)).T
+    )
+    assert blocked.all()
+
+
+def test_terrain_lookup_off_map():
+    terrain = Terrain(blocked_nodes={(0, 0)}, reduced_speed_nodes={(10, 0): 4})
+
+    blocked, slow, reduced_speed = terrain.lookup(
+        np.array([0, 10, -10, 500]), np.array([0, 0, 0, 0])
+    )
+
+    assert blocked.tolist() == [True, False, False, False]
+    assert slow.tolist() == [False, True, False, False]
+    assert reduced_speed.tolist() == [0, 4, 0, 0]
+
+
+def test_simulation_moves_players_with_inputs(state):
+    simulation = Simulation()
+    simulation.input(0, 1, [(codec.LEFT_KEY, 50)])
+    simulation.input(2, 1, [(codec.LEFT_KEY, 50)])
+
+    moved = simulation.step({0: state, 1: state, 2: {'x': None}}, 0.05)
+
+    assert list(moved) == [0]
+    assert moved[0]['x'] < 100
+    assert state['x'] == 100
+    simulation.remove(0)
+    assert simulation.step({0: state}, 0.05) == {}
+    assert len(simulation) == 0
+
+
+def test_simulation_grows_and_frees_slots(mock_player):
+    players = {
+        player_id: dict(mock_player(player_id, x=player_id, y=100).attributes)
+        for player_id in range(100)
+    }
+    simulation = Simulation(capacity=4)
+    for player_id in players:
+        simulation.input(player_id, 1, [(codec.DOWN_KEY, 50)])
+    simulation.step(players, 0.05)
+    for player_id in range(100):
+        if player_id % 2:
+            simulation.input(player_id, 2, [(codec.DOWN_KEY, 50)])
+        else:
+            simulation.remove(player_id)
+
+    moved = simulation.step(players, 0.05)
+
+    assert sorted(moved) == list(range(1, 100, 2))
+    assert all(moved[i]['x'] == i for i in moved)
+    assert all(moved[i]['y'] == 100 + PLAYER_VEL for i in moved)
+
+
+def test_commands_applied_in_order(state):
+    simulation = Simulation()
+    simulation.input(0, 7, [(codec.RIGHT_KEY, 50), (codec.DOWN_KEY, 50)])
+    simulation.input(0, 9, [(0, 50)])
+    simulation.input(1, 3, [(codec.LEFT_KEY, 50)])
+    moved = simulation.step({0: state, 1: dict(state)}, 0.05)
+
+    assert moved[0]['x'] == 100 + PLAYER_VEL * 0.5
+    assert moved[0]['y'] == 100 + PLAYER_VEL * 0.5
+    assert moved[0]['standing'] and moved[0]['down']
+    assert moved[1]['x'] == 100 - PLAYER_VEL * 0.5
+    assert simulation.acked == {0: 9, 1: 3}
+    assert simulation.step({}, 0.05) == {}
+    assert simulation.acked == {}
+
+
+def test_commands_limited_to_time_gone_by(state):
+    simulation = Simulation()
+    simulation.input(0, 1, [(codec.RIGHT_KEY, 250)] * 4)
+    moved = simulation.step({0: state}, 0.05)
+
+    # Half a second of budget, however much was sent.
+    assert moved[0]['x'] == pytest.approx(
+        100 + PLAYER_VEL * INPUT_BUDGET * 10
+    )
+    simulation.input(0, 5, [(codec.RIGHT_KEY, 250)])
+    moved = simulation.step({0: state}, 0.05)
+
+    assert moved[0]['x'] == pytest.approx(
+        100 + PLAYER_VEL * (INPUT_BUDGET + 0.05) * 10
+    )
+
+
+def test_removed_after_input(state):
+    simulation = Simulation()
+    simulation.input(0, 1, [(codec.LEFT_KEY, 50)])
+    simulation.remove(0)
+
+    assert simulation.step({0: state}, 0.05) == {}
+    assert len(simulation) == 0
@@ -0,0 +1,62 @@
+import pytest
+
+from server.timers import TimerWheel
+
+
+def _advance(wheel, ticks):
+    """Return the tick each key expired on."""
+    expired = {}
+    for _ in range(ticks):
+        for key in wheel.advance():
+            expired[key] = wheel.now
+    return expired
+
+
+@pytest.mark.parametrize('delay', [1, 3, 4, 5, 16, 17, 63])
+def test_expires_on_time(delay):
+    wheel = TimerWheel(slots=4, levels=3)
+    wheel.schedule('a', delay)
+
+    assert _advance(wheel, 70) == {'a': delay}
+    assert len(wheel) == 0
+
+
+def test_expires_past_range():
+    wheel = TimerWheel(slots=4, levels=2)
+    wheel.schedule('a', 40)
+
+    assert _advance(wheel, 50) == {'a': 40}
+
+
+def test_expires_in_order():
+    wheel = TimerWheel(slots=4, levels=3)
+    for delay in (9, 2, 30, 5):
+        wheel.schedule(delay, delay)
+
+    assert _advance(wheel, 40) == {2: 2, 5: 5, 9: 9, 30: 30}
+
+
+def test_schedule_replaces_timer():
+    wheel = TimerWheel(slots=4, levels=3)
+    wheel.schedule('a', 2)
+    wheel.schedule('a', 20)
+
+    assert len(wheel) == 1
+    assert _advance(wheel, 30) == {'a': 20}
+
+
+def test_cancel():
+    wheel = TimerWheel(slots=4, levels=3)
+    wheel.schedule('a', 20)
+    wheel.cancel('a')
+    wheel.cancel('b')
+
+    assert 'a' not in wheel
+    assert _advance(wheel, 30) == {}
+
+
+def test_schedule_at_least_a_tick():
+    wheel = TimerWheel()
+    wheel.schedule('a', 0)
+
+    assert wheel.advance() == ['a']